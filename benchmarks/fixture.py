@@ -0,0 +1,117 @@
+"""
+This script generates a synthetic RuWordNet XML dump of any size, for the benchmarks.
+
+The dump has the same files and structure as the real one (see data/rwn-2021), and it is reproducible:
+the same scale and seed always give the same files. The hypernymy hierarchy is a random DAG
+with a few multiple inheritances, about as deep as the real one.
+"""
+import argparse
+import os
+import random
+from typing import List, Tuple
+from xml.sax.saxutils import quoteattr
+
+PARTS = 'NVA'
+LETTERS = 'АБВГДЕЖЗИКЛМНОПРСТУФХЦЧШЭЮЯ'
+EN_WORDS = ['potential', 'cat', 'dog', 'walk', 'house', 'green', 'castle', 'lock', 'vegetable', 'plant']
+# the relations that are written with a given probability for each synset, besides the hypernyms
+OTHER_RELATIONS = ['domain', 'related', 'antonym', 'POS-synonymy', 'part holonym', 'instance hypernym',
+                   'entailment', 'cause']
+
+
+def write_fixture(directory: str, scale: int = 10000, seed: int = 0) -> str:
+    """ Write the XML files with `scale` synsets for each part of speech into the directory, and return it """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    all_senses = []
+    for part in PARTS:
+        ids = [f'{i}-{part}' for i in range(1, scale + 1)]
+        senses = _write_synsets(rng, os.path.join(directory, f'synsets.{part}.xml'), ids, part)
+        _write_senses(os.path.join(directory, f'senses.{part}.xml'), senses)
+        _write_relations(rng, os.path.join(directory, f'synset_relations.{part}.xml'), ids)
+        all_senses.extend(senses)
+    _write_ili(rng, os.path.join(directory, 'ili.xml'), [f'{i}-N' for i in range(1, scale // 2 + 1)])
+    _write_sense_relations(rng, os.path.join(directory, 'composed_of.xml'), all_senses, 'composed_of')
+    _write_sense_relations(rng, os.path.join(directory, 'derived_from.xml'), all_senses, 'derived_from')
+    return directory
+
+
+def _word(rng: random.Random) -> str:
+    return ''.join(rng.choice(LETTERS) for _ in range(rng.randint(2, 5)))
+
+
+def _write_synsets(rng: random.Random, filename: str, ids: List[str], part: str) -> List[Tuple[str, str, str]]:
+    """ Write the synsets and return their (sense id, synset id, lemma) triples """
+    senses = []
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<synsets>\n')
+        for i, synset_id in enumerate(ids):
+            title, definition = f'{_word(rng)} {_word(rng)}', f'{_word(rng)} {_word(rng)} {_word(rng)}'
+            f.write(f'  <synset id="{synset_id}" ruthes_name={quoteattr(title)} definition={quoteattr(definition)} '
+                    f'part_of_speech="{part}">\n')
+            for j in range(rng.randint(1, 4)):
+                lemma = _word(rng) if rng.random() < 0.8 else f'{_word(rng)} {_word(rng)}'
+                sense_id = f'{synset_id}-{i * 10 + j}'
+                senses.append((sense_id, synset_id, lemma))
+                f.write(f'    <sense id="{sense_id}">{lemma}</sense>\n')
+            f.write('  </synset>\n')
+        f.write('</synsets>\n')
+    return senses
+
+
+def _write_senses(filename: str, senses: List[Tuple[str, str, str]]):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<senses>\n')
+        for sense_id, synset_id, lemma in senses:
+            f.write(f'  <sense id="{sense_id}" synset_id="{synset_id}" name={quoteattr(lemma)} '
+                    f'lemma={quoteattr(lemma)} main_word="" synt_type="" poses="" meaning="1"/>\n')
+        f.write('</senses>\n')
+
+
+def _write_relations(rng: random.Random, filename: str, ids: List[str]):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<relations>\n')
+        for i, synset_id in enumerate(ids[1:], 1):
+            # the parents are taken among the preceding synsets, mostly the close ones, so the depth grows slowly
+            parents = {ids[int(i * rng.uniform(0.3, 1))] for _ in range(rng.choice([1, 1, 1, 2]))}
+            for parent in sorted(parents):
+                f.write(f'  <relation name="hypernym" parent_id="{synset_id}" child_id="{parent}"/>\n')
+                f.write(f'  <relation name="hyponym" parent_id="{parent}" child_id="{synset_id}"/>\n')
+            for name in OTHER_RELATIONS:
+                if rng.random() < 0.05:
+                    f.write(f'  <relation name="{name}" parent_id="{synset_id}" child_id="{rng.choice(ids)}"/>\n')
+        f.write('</relations>\n')
+
+
+def _write_ili(rng: random.Random, filename: str, ids: List[str]):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<ili>\n')
+        for k, synset_id in enumerate(ids):
+            f.write(f'  <match>\n    <rwn-synset id="{synset_id}"/>\n')
+            wn_id = f'{10000000 + k:08d}-n'
+            f.write(f'    <wn-synset id="{wn_id}" definition={quoteattr("the definition of " + wn_id)}>\n')
+            for j in range(rng.randint(1, 3)):
+                name = f'{rng.choice(EN_WORDS)}_{k}_{j}'
+                f.write(f'      <lemma key="{name}%1:00:00::" name="{name}"/>\n')
+            f.write('    </wn-synset>\n  </match>\n')
+        f.write('</ili>\n')
+
+
+def _write_sense_relations(rng: random.Random, filename: str, senses: List[Tuple[str, str, str]], tag: str):
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<senses>\n')
+        for sense_id, _, lemma in rng.sample(senses, len(senses) // 10):
+            f.write(f'  <sense id="{sense_id}" name={quoteattr(lemma)}>\n    <{tag}>\n')
+            for other_id, _, other_lemma in rng.sample(senses, rng.randint(1, 2)):
+                f.write(f'      <sense id="{other_id}" name={quoteattr(other_lemma)}/>\n')
+            f.write(f'    </{tag}>\n  </sense>\n')
+        f.write('</senses>\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic RuWordNet XML dump')
+    parser.add_argument('destination', help='the directory for the xml files')
+    parser.add_argument('-n', '--scale', type=int, default=10000, help='the number of synsets per part of speech')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the random generator')
+    args = parser.parse_args()
+    write_fixture(args.destination, scale=args.scale, seed=args.seed)
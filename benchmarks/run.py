@@ -0,0 +1,267 @@
+"""
+This script measures the performance of the library on a fixture database and writes the results as JSON,
+so that the results of different commits can be compared.
+
+The fixture database is converted from the XML files (a real dump, or a synthetic one from `fixture.py`),
+so the conversion is measured as well. The measurements that depend on the state of the process
+(the cold imports and the peak memory) run in separate Python processes.
+
+Usage (from the root of the repository):
+    python -m benchmarks.run --scale 10000 --output results.json
+    python -m benchmarks.run --source data/rwn-2021 --output results.json
+    python -m benchmarks.run --compare old.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List
+
+from benchmarks.fixture import write_fixture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ('orm', 'sqlite')
+# the number of keys used for measuring the latency of each lookup
+SAMPLE_SIZE = 1000
+# the number of the deepest synsets whose hypernyms are traversed
+TRAVERSAL_SIZE = 100
+# the changes smaller than this (relative) are not reported as regressions by --compare
+DEFAULT_THRESHOLD = 0.1
+
+CONVERSION_CODE = '''
+import json, resource, sqlite3, sys, time
+from conversion import load_from_xml
+from ruwordnet.models import Base
+start = time.perf_counter()
+load_from_xml(root=sys.argv[1], file_name=sys.argv[2], jobs=int(sys.argv[3]))
+seconds = time.perf_counter() - start
+connection = sqlite3.connect(sys.argv[2])
+rows = sum(connection.execute(f'SELECT COUNT(*) FROM {name}').fetchone()[0] for name in Base.metadata.tables)
+print(json.dumps({'seconds': seconds, 'rows': rows, 'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+'''
+
+OPEN_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+from ruwordnet import RuWordNet
+imported = time.perf_counter()
+wn = RuWordNet(sys.argv[1], backend=sys.argv[2])
+opened = time.perf_counter()
+wn.get_senses(sys.argv[3])
+queried = time.perf_counter()
+print(json.dumps({'import': imported - start, 'open': opened - imported, 'first_query': queried - opened}))
+'''
+
+
+class Results:
+    """ The measured values, each with its unit and whether the lower or the higher values are better """
+    def __init__(self):
+        self.values: Dict[str, dict] = {}
+
+    def add(self, name: str, value: float, unit: str, better: str = 'lower'):
+        self.values[name] = {'value': round(value, 3), 'unit': unit, 'better': better}
+        print(f'{name:<45} {value:>12.3f} {unit}')
+
+
+def run_python(code: str, *args) -> dict:
+    """ Run the code in a new Python process and parse the JSON from the last line of its output """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    output = subprocess.run(
+        [sys.executable, '-c', code, *map(str, args)], cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def latencies(function: Callable, keys: Iterable) -> List[float]:
+    """ Call the function with each key and return the durations of the calls in microseconds """
+    result = []
+    for key in keys:
+        start = time.perf_counter_ns()
+        function(key)
+        result.append((time.perf_counter_ns() - start) / 1000)
+    return result
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def add_latencies(results: Results, name: str, values: List[float]):
+    results.add(f'{name}.p50', percentile(values, 0.5), 'us')
+    results.add(f'{name}.p99', percentile(values, 0.99), 'us')
+
+
+def missing(function: Callable) -> Callable:
+    """ Ignore the KeyError raised for the missing keys """
+    def wrapper(key):
+        try:
+            function(key)
+        except KeyError:
+            pass
+    return wrapper
+
+
+def deepest_synsets(filename: str, limit: int) -> List[str]:
+    """ The ids of the synsets with the longest chains of hypernyms """
+    connection = sqlite3.connect(filename)
+    hypernyms = {}
+    for hyponym, hypernym in connection.execute('SELECT hyponym_id, hypernym_id FROM hypernym_relation'):
+        hypernyms.setdefault(hyponym, []).append(hypernym)
+    depths = {}
+    for start in hypernyms:
+        stack = [start]
+        while stack:
+            synset = stack[-1]
+            pending = [parent for parent in hypernyms.get(synset, []) if parent not in depths and parent not in stack]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            depths[synset] = 1 + max((depths.get(parent, 0) for parent in hypernyms.get(synset, [])), default=0)
+    return sorted(depths, key=lambda synset: (-depths[synset], synset))[:limit]
+
+
+def traverse_hypernyms(synset) -> int:
+    """ Visit all the transitive hypernyms of a synset through its relationship attributes """
+    seen, frontier = set(), [synset]
+    while frontier:
+        frontier = [hypernym for current in frontier for hypernym in current.hypernyms if hypernym.id not in seen]
+        seen.update(hypernym.id for hypernym in frontier)
+    return len(seen)
+
+
+def measure_conversion(results: Results, source: str, filename: str, jobs: int):
+    conversion = run_python(CONVERSION_CODE, source, filename, jobs)
+    results.add('conversion.seconds', conversion['seconds'], 's')
+    results.add('conversion.rows_per_second', conversion['rows'] / conversion['seconds'], 'rows/s', better='higher')
+    # the maximal resident set size is reported in kilobytes on Linux, but in bytes on macOS
+    max_rss = conversion['max_rss'] / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    results.add('conversion.peak_rss', max_rss, 'MiB')
+
+
+def measure_cold_start(results: Results, filename: str, backend: str, lemma: str, repeat: int):
+    runs = [run_python(OPEN_CODE, filename, backend, lemma) for _ in range(repeat)]
+    for stage in ['import', 'open', 'first_query']:
+        results.add(f'{backend}.cold.{stage}', statistics.median(run[stage] for run in runs) * 1000, 'ms')
+
+
+def measure_lookups(results: Results, filename: str, backend: str, rng: random.Random):
+    from ruwordnet import RuWordNet
+    connection = sqlite3.connect(filename)
+    lemmas = [lemma for lemma, in connection.execute('SELECT DISTINCT lemma FROM sense')]
+    synset_ids = [id for id, in connection.execute('SELECT id FROM synset')]
+    sense_ids = [id for id, in connection.execute('SELECT id FROM sense')]
+    hits = rng.sample(lemmas, min(SAMPLE_SIZE, len(lemmas)))
+    misses = [f'НЕТ ТАКОГО СЛОВА {i}' for i in range(SAMPLE_SIZE)]
+    ids = rng.sample(synset_ids, min(SAMPLE_SIZE // 2, len(synset_ids))) + \
+        rng.sample(sense_ids, min(SAMPLE_SIZE // 2, len(sense_ids)))
+    missing_ids = [f'{i}-X' for i in range(SAMPLE_SIZE)]
+
+    wn = RuWordNet(filename, backend=backend)
+    add_latencies(results, f'{backend}.get_senses.hit', latencies(wn.get_senses, hits))
+    add_latencies(results, f'{backend}.get_senses.miss', latencies(wn.get_senses, misses))
+    add_latencies(results, f'{backend}.getitem.hit', latencies(wn.__getitem__, ids))
+    add_latencies(results, f'{backend}.getitem.miss', latencies(missing(wn.__getitem__), missing_ids))
+
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        wn.get_synsets_many(hits)
+        durations.append(time.perf_counter() - start)
+    results.add(f'{backend}.get_synsets_many.throughput', len(hits) / min(durations), 'lemmas/s', better='higher')
+
+    deepest = deepest_synsets(filename, TRAVERSAL_SIZE)
+    wn = RuWordNet(filename, backend=backend)
+    synsets = [wn.get_synset_by_id(id) for id in deepest]
+    add_latencies(results, f'{backend}.hypernym_traversal', latencies(traverse_hypernyms, synsets))
+
+    for attribute in ['synsets', 'senses']:
+        wn = RuWordNet(filename, backend=backend)
+        start = time.perf_counter()
+        getattr(wn, attribute)
+        results.add(f'{backend}.scan.{attribute}', (time.perf_counter() - start) * 1000, 'ms')
+
+
+def run(args) -> dict:
+    results = Results()
+    with tempfile.TemporaryDirectory() as directory:
+        source = args.source or write_fixture(os.path.join(directory, 'xml'), scale=args.scale, seed=args.seed)
+        filename = os.path.join(directory, 'ruwordnet.db')
+        measure_conversion(results, source, filename, args.jobs)
+        lemma = sqlite3.connect(filename).execute('SELECT lemma FROM sense LIMIT 1').fetchone()[0]
+        for backend in args.backends:
+            measure_cold_start(results, filename, backend, lemma, args.repeat)
+            measure_lookups(results, filename, backend, random.Random(args.seed))
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fixture': args.source or f'synthetic, scale={args.scale}, seed={args.seed}',
+        },
+        'results': results.values,
+    }
+
+
+def compare(old_filename: str, new_filename: str, threshold: float) -> bool:
+    """ Print the changes of all the values and return whether any of them is a regression beyond the threshold """
+    with open(old_filename, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_filename, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f'{"":<45} {old["meta"]["commit"] or "old":>12} {new["meta"]["commit"] or "new":>12}')
+    regressed = False
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            print(f'{name:<45} {"":>12} {result["value"]:>12.3f} {result["unit"]}')
+            continue
+        before, after = old['results'][name]['value'], result['value']
+        change = (after - before) / before if before else 0.0
+        worse = change > threshold if result['better'] == 'lower' else change < -threshold
+        regressed = regressed or worse
+        mark = ' REGRESSION' if worse else ''
+        print(f'{name:<45} {before:>12.3f} {after:>12.3f} {result["unit"]} ({change:+.1%}){mark}')
+    return regressed
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark RuWordNet on a fixture database')
+    parser.add_argument('-s', '--source', default=None,
+                        help='the directory with the source xml files (by default, a synthetic dump is generated)')
+    parser.add_argument('-n', '--scale', type=int, default=10000,
+                        help='the number of synsets per part of speech in the synthetic dump')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the synthetic dump and of the samples')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes for parsing the xml files')
+    parser.add_argument('-b', '--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='the number of cold starts to measure')
+    parser.add_argument('-o', '--output', default=None, help='the file for the results (by default, stdout only)')
+    parser.add_argument('-c', '--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='the relative change that is reported as a regression by --compare')
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -1,220 +1,389 @@
 """
 This script converts the raw XML thesaurus data to the sqlite format.
-Requires xmltodict and tqdm packages.
+The XML files are parsed incrementally and the rows are inserted in large batches within one transaction,
+so the memory usage does not depend on the size of the input. Only SQLAlchemy is required.
 """
 import argparse
+import json
+import multiprocessing
 import os
-from collections import OrderedDict, defaultdict
+import queue
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from xml.etree.ElementTree import Element, iterparse
 
-from tqdm.auto import tqdm
-import xmltodict
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, MetaData, Table, and_, create_engine, literal, or_, select
+from sqlalchemy.schema import CreateTable
 
-from ruwordnet.models import Sense, Synset, Base, hypernymy_table, domains_table, meronymy_table, pos_synonymy_table, \
-    antonymy_table, composition_table, entailment_table, cause_table, derivation_table, instances_table, related_table
-from ruwordnet.models import WNSynset, WNSense, ili_table
+from ruwordnet.models import SCHEMA_VERSION, Base, KeyIndex, hypernymy_table, domains_table, meronymy_table, \
+    pos_synonymy_table, antonymy_table, entailment_table, cause_table, instances_table, related_table
+from ruwordnet.schema import migrate
+from ruwordnet.utils import build_definition_index, build_key_index
 
+# the number of rows inserted with one `executemany` call
+BATCH_SIZE = 10000
 
-def load_from_xml(root='.', parts='NVA', file_name='ruwordnet/static/ruwordnet.db'):
-    dirname = os.path.dirname(file_name)
-    if not os.path.exists(dirname):
-        os.makedirs(dirname)
+# relation name in synset_relations.*.xml => (table, column for parent_id, column for child_id)
+SYNSET_RELATIONS = {
+    'hypernym': (hypernymy_table, 'hyponym_id', 'hypernym_id'),
+    'instance hypernym': (instances_table, 'instance_id', 'class_id'),
+    'domain': (domains_table, 'domain_item_id', 'domain_id'),
+    'part holonym': (meronymy_table, 'meronym_id', 'holonym_id'),
+    # synonyms and antonyms are already duplicated in the data
+    'POS-synonymy': (pos_synonymy_table, 'left_id', 'right_id'),
+    'antonym': (antonymy_table, 'left_id', 'right_id'),
+    'entailment': (entailment_table, 'premise_id', 'conclusion_id'),
+    'cause': (cause_table, 'cause_id', 'effect_id'),
+    'related': (related_table, 'left_id', 'right_id'),
+}
+# these relations are the inverse of the ones above, so they are already covered by the same tables
+INVERSE_RELATIONS = {'hyponym', 'instance hyponym', 'part meronym'}
 
-    if os.path.exists(file_name):
-        os.remove(file_name)
-    engine = create_engine(f'sqlite:///{file_name}', echo=False)
-    Base.metadata.create_all(engine)
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA locking_mode = EXCLUSIVE',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+]
+# these PRAGMAs keep the transaction atomic, so they are safe for updating a database in place;
+# the new release is loaded into temporary tables, which are kept on the disk to bound the memory
+UPDATE_PRAGMAS = [
+    'PRAGMA temp_store = FILE',
+    'PRAGMA cache_size = -262144',
+]
+
+Record = Tuple[str, dict]
+
+
+def iter_elements(filename: str) -> Iterator[Element]:
+    """ Iterate over the children of the root element of an XML file, freeing each one after it is processed """
+    context = iterparse(filename, events=('start', 'end'))
+    _, root = next(context)
+    depth = 0
+    for event, element in context:
+        if event == 'start':
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            yield element
+            root.clear()
+
+
+def parse_senses(filename: str) -> Iterator[Record]:
+    for sense in iter_elements(filename):
+        yield 'sense', dict(
+            id=sense.get('id'),
+            synset_id=sense.get('synset_id'),
+            name=sense.get('name'),
+            lemma=sense.get('lemma'),
+            # todo: add other keys
+        )
+
+
+def parse_synsets(filename: str) -> Iterator[Record]:
+    for synset in iter_elements(filename):
+        yield 'synset', dict(
+            id=synset.get('id'),
+            title=synset.get('ruthes_name'),
+            definition=synset.get('definition'),
+            part_of_speech=synset.get('part_of_speech'),
+        )
+
+
+def parse_ili(filename: str) -> Iterator[Record]:
+    """ Parse the English synsets and senses and their links to RuWordNet.
+    An English synset may occur in several matches; only its first occurrence is used. """
+    already = set()
+    for match in iter_elements(filename):
+        ruwn_id = match.find('rwn-synset').get('id')
+        for wn_synset in match.findall('wn-synset'):
+            yield 'interlingual_index_relation', dict(ruwn_id=ruwn_id, wn_id=wn_synset.get('id'))
+            if wn_synset.get('id') in already:
+                continue
+            already.add(wn_synset.get('id'))
+            for lemma in wn_synset.findall('lemma'):
+                yield 'wn_sense', dict(name=lemma.get('name'), key=lemma.get('key'), synset_id=wn_synset.get('id'))
+            yield 'wn_synset', dict(id=wn_synset.get('id'), definition=wn_synset.get('definition'))
+
+
+def parse_synset_relations(filename: str) -> Iterator[Record]:
+    unknown = set()
+    for relation in iter_elements(filename):
+        name = relation.get('name')
+        if name in SYNSET_RELATIONS:
+            table, parent_column, child_column = SYNSET_RELATIONS[name]
+            yield table.name, {parent_column: relation.get('parent_id'), child_column: relation.get('child_id')}
+        elif name not in INVERSE_RELATIONS and name not in unknown:
+            unknown.add(name)
+            print('unknown relation name', name)
 
-    Session = sessionmaker()
-    Session.configure(bind=engine)
-    session = Session()
 
-    # load senses
+def parse_compositions(filename: str) -> Iterator[Record]:
+    for phrase in iter_elements(filename):
+        for word in phrase.find('composed_of').findall('sense'):
+            yield 'composition_relation', dict(word_id=word.get('id'), phrase_id=phrase.get('id'))
+
+
+def parse_derivations(filename: str) -> Iterator[Record]:
+    for source in iter_elements(filename):
+        for derivative in source.find('derived_from').findall('sense'):
+            yield 'derivation_relation', dict(source_id=source.get('id'), derivative_id=derivative.get('id'))
+
+
+def get_stages(root: str, parts: str) -> List[Tuple[str, Callable[[str], Iterator[Record]], str]]:
+    """ List the (description, parser, filename) triples for all the files to load, in the loading order """
+    stages = []
     for part in parts:
-        print('loading senses:', part)
-        fn = os.path.join(root, f'senses.{part}.xml')
-        with open(fn, 'r', encoding='utf-8') as f:
-            senses = xmltodict.parse(f.read(), process_namespaces=True)
-        for sense_raw in tqdm(senses['senses']['sense']):
-            sense = Sense(
-                id=sense_raw['@id'],
-                synset_id=sense_raw['@synset_id'],
-                name=sense_raw['@name'],
-                lemma=sense_raw['@lemma'],
-                # todo: add other keys
-            )
-            session.add(sense)
-    session.commit()
-
-    # load synsets
+        stages.append((f'senses {part}', parse_senses, os.path.join(root, f'senses.{part}.xml')))
     for part in parts:
-        print('loading synsets:', part)
-        fn = os.path.join(root, f'synsets.{part}.xml')
-        with open(fn, 'r', encoding='utf-8') as f:
-            synsets = xmltodict.parse(f.read(), process_namespaces=True)
-        for data in tqdm(synsets['synsets']['synset']):
-            synset = Synset(
-                id=data['@id'],
-                title=data['@ruthes_name'],
-                definition=data['@definition'],
-                part_of_speech=data['@part_of_speech'],
-            )
-            session.add(synset)
-
-    session.commit()
-
-    # load interlingual index
-    fn = os.path.join(root, f'ili.xml')
+        stages.append((f'synsets {part}', parse_synsets, os.path.join(root, f'synsets.{part}.xml')))
+    fn = os.path.join(root, 'ili.xml')
     if os.path.exists(fn):
-        print('creating foreign Wordnet...')
-        with open(fn, 'r', encoding='utf-8') as f:
-            ili_raw = xmltodict.parse(f.read(), process_namespaces=True)
-        pairs_to_insert = set()
-        already = set()
-        for match in tqdm(ili_raw['ili']['match']):
-            wn_synsets = match['wn-synset']
-            if isinstance(wn_synsets, OrderedDict):
-                wn_synsets = [wn_synsets]
-            for wnss in wn_synsets:
-                pairs_to_insert.add((match['rwn-synset']['@id'], wnss['@id']))
-                if wnss['@id'] in already:
-                    continue
-                already.add(wnss['@id'])
-                lemmas = wnss['lemma']
-                if isinstance(lemmas, OrderedDict):
-                    lemmas = [lemmas]
-                for s in lemmas:
-                    if s['@key'] in already:
-                        continue
-                    already.add(s['@key'])
-                    wn_sense = WNSense(name=s['@name'], key=s['@key'], synset_id=wnss['@id'])
-                    session.add(wn_sense)
-                wn_synset = WNSynset(
-                    id=wnss['@id'],
-                    definition=wnss['@definition'],
-                )
-                session.add(wn_synset)
-        session.commit()
-        print('connecting synsets with foreign Wordnet...')
-        conn = engine.connect()
-        conn.execute(ili_table.insert(), [dict(ruwn_id=id1, wn_id=id2) for id1, id2 in pairs_to_insert])
+        stages.append(('interlingual index', parse_ili, fn))
     else:
         print('interlingual index does not exist; skipping it!')
+    for part in parts:
+        stages.append((f'relations {part}', parse_synset_relations, os.path.join(root, f'synset_relations.{part}.xml')))
+    stages.append(('phrases', parse_compositions, os.path.join(root, 'composed_of.xml')))
+    stages.append(('derivations', parse_derivations, os.path.join(root, 'derived_from.xml')))
+    return stages
 
-    conn = engine.connect()
 
-    # load synset relations
-    for part in parts:
-        print('loading relations:', part)
-        fn = os.path.join(root, f'synset_relations.{part}.xml')
-        with open(fn, 'r', encoding='utf-8') as f:
-            relations = xmltodict.parse(f.read(), process_namespaces=True)
-        rel2values = defaultdict(set)
-        for relation in tqdm(relations['relations']['relation']):
-            parent_id = relation['@parent_id']
-            child_id = relation['@child_id']
-            # parent = session.query(Synset).filter_by(id=parent_id).first()
-            # child = session.query(Synset).filter_by(id=child_id).first()
-            rel2values[relation['@name']].add((parent_id, child_id))
-
-            # ['hypernym', 'related', 'POS-synonymy', 'hyponym', 'domain', 'part holonym', 'instance hypernym',
-            #   'instance hyponym', 'part meronym', 'antonym'])
-            # ['hypernym', 'entailment', 'domain', 'POS-synonymy', 'hyponym', 'cause', 'antonym']
-            # ['POS-synonymy', 'domain', 'hypernym', 'hyponym', 'antonym']
-            # uncovered: related, hyponym, instance hyponym, part meronym
-        for relation_name, pairs in rel2values.items():
-            if relation_name == 'hypernym':
-                conn.execute(
-                    hypernymy_table.insert(),
-                    [dict(hyponym_id=parent_id, hypernym_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'instance hypernym':
-                conn.execute(
-                    instances_table.insert(),
-                    [dict(instance_id=parent_id, class_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'domain':
-                conn.execute(
-                    domains_table.insert(),
-                    [dict(domain_item_id=parent_id, domain_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'part holonym':
-                conn.execute(
-                    meronymy_table.insert(),
-                    [dict(meronym_id=parent_id, holonym_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'POS-synonymy':
-                conn.execute(
-                    pos_synonymy_table.insert(),
-                    [dict(left_id=parent_id, right_id=child_id) for parent_id, child_id in pairs]
-                )
-                # synonyms are already duplicated in the data
-                # insert = pos_synonymy_table.insert().values(right_id=parent_id, left_id=child_id)
-                # conn.execute(insert)
-            elif relation_name == 'antonym':
-                conn.execute(
-                    antonymy_table.insert(),
-                    [dict(left_id=parent_id, right_id=child_id) for parent_id, child_id in pairs]
-                )
-                # antonyms are already duplicated in the data
-                # insert = antonymy_table.insert().values(right_id=parent_id, left_id=child_id)
-                # conn.execute(insert)
-            elif relation_name == 'entailment':
-                conn.execute(
-                    entailment_table.insert(),
-                    [dict(premise_id=parent_id, conclusion_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'cause':
-                conn.execute(
-                    cause_table.insert(),
-                    [dict(cause_id=parent_id, effect_id=child_id) for parent_id, child_id in pairs]
-                )
-            elif relation_name == 'related':
-                conn.execute(
-                    related_table.insert(),
-                    [dict(left_id=parent_id, right_id=child_id) for parent_id, child_id in pairs]
-                )
+def write_records(connection, records: Iterable[Record], tables: Dict[str, object]) -> Dict[str, int]:
+    """ Insert the records into the tables in batches, ignoring duplicate keys.
+    Return the number of processed rows for each table. """
+    batches = defaultdict(list)
+    counts = defaultdict(int)
+
+    def flush(table_name):
+        connection.execute(tables[table_name].insert().prefix_with('OR IGNORE'), batches[table_name])
+        counts[table_name] += len(batches[table_name])
+        batches[table_name] = []
+
+    for table_name, row in records:
+        batches[table_name].append(row)
+        if len(batches[table_name]) >= BATCH_SIZE:
+            flush(table_name)
+    for table_name, batch in list(batches.items()):
+        if batch:
+            flush(table_name)
+    return dict(counts)
+
+
+def report(description: str, counts: Dict[str, int], start_time: float):
+    elapsed = time.time() - start_time
+    rows = sum(counts.values())
+    details = ', '.join(f'{table}: {count}' for table, count in sorted(counts.items()))
+    print(f'loaded {description}: {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):.0f} rows/s) [{details}]')
+
+
+def create_schema(connection):
+    """ Create the tables without their secondary indexes, which are cheaper to build after the data is loaded """
+    for table in Base.metadata.sorted_tables:
+        connection.execute(CreateTable(table))
+
+
+def create_indexes(connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection)
+
+
+_worker_queue = None
+
+
+def _init_worker(records_queue):
+    global _worker_queue
+    _worker_queue = records_queue
+
+
+def _parse_in_worker(stage_number: int, parser: Callable[[str], Iterator[Record]], filename: str):
+    """ Parse one file in a worker process, sending its records to the writer in batches and then a None """
+    batch = []
+    for record in parser(filename):
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            _worker_queue.put((stage_number, batch))
+            batch = []
+    if batch:
+        _worker_queue.put((stage_number, batch))
+    _worker_queue.put((stage_number, None))
+
+
+def write_in_parallel(connection, stages, tables, jobs: int):
+    """ Parse the files in `jobs` worker processes, and write all their records through this single connection.
+    The files are written in the order of the stages (the batches of the files parsed ahead of their turn wait
+    in memory), so the result, including the rowids, is the same as with serial loading.
+    Raise RuntimeError if a worker process dies, e.g. is killed for lack of memory. """
+    records_queue = multiprocessing.Queue(maxsize=jobs * 4)
+    counts = [defaultdict(int) for _ in stages]
+    pending = [[] for _ in stages]
+    finished = [False] * len(stages)
+    current = 0
+    start = time.time()
+    others = {process.pid for process in multiprocessing.active_children()}
+    with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(records_queue,)) as pool:
+        # the pool replaces a dead worker, but its task is lost and never completes
+        workers = {process.pid for process in multiprocessing.active_children()} - others
+        results = [
+            pool.apply_async(_parse_in_worker, (i, parser, filename))
+            for i, (_, parser, filename) in enumerate(stages)
+        ]
+        while current < len(stages):
+            try:
+                stage_number, batch = records_queue.get(timeout=1)
+            except queue.Empty:
+                for result in results:
+                    if result.ready() and not result.successful():
+                        result.get()
+                if not workers <= {process.pid for process in multiprocessing.active_children()}:
+                    raise RuntimeError('A worker process has died; please retry or load the files serially.')
+                continue
+            if batch is None:
+                finished[stage_number] = True
             else:
-                print('unknown relation name', relation_name)
-        print('relation types', rel2values.keys())
-
-    print('loading phrases')
-    fn = os.path.join(root, 'composed_of.xml')
-    with open(fn, 'r', encoding='utf-8') as f:
-        relations = xmltodict.parse(f.read(), process_namespaces=True)
-    pairs_to_insert = set()
-    for relation in tqdm(relations['senses']['sense']):
-        phrase_id = relation['@id']
-        words = relation['composed_of']['sense']
-        if not isinstance(words, list):
-            words = [words]
-        for word in words:
-            word_id = word['@id']
-            pairs_to_insert.add((word_id, phrase_id))
-    conn.execute(
-        composition_table.insert(),
-        [dict(word_id=word_id, phrase_id=phrase_id) for word_id, phrase_id in pairs_to_insert]
-    )
+                pending[stage_number].append(batch)
+            while current < len(stages):
+                for batch in pending[current]:
+                    for table_name, count in write_records(connection, batch, tables).items():
+                        counts[current][table_name] += count
+                pending[current] = []
+                if not finished[current]:
+                    break
+                report(stages[current][0], counts[current], start)
+                current += 1
+
+
+def write_stages(connection, stages, tables, jobs: int = 1):
+    if jobs > 1:
+        write_in_parallel(connection, stages, tables, jobs=jobs)
+    else:
+        for description, parser, filename in stages:
+            start = time.time()
+            report(description, write_records(connection, parser(filename), tables), start)
+
+
+def load_from_xml(root='.', parts='NVA', file_name='ruwordnet/static/ruwordnet.db', jobs=1):
+    dirname = os.path.dirname(file_name)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+
+    if os.path.exists(file_name):
+        os.remove(file_name)
+    engine = create_engine(f'sqlite:///{file_name}', echo=False)
+    tables = Base.metadata.tables
 
-    print('loading derivations')
-    fn = os.path.join(root, 'derived_from.xml')
-    with open(fn, 'r', encoding='utf-8') as f:
-        relations = xmltodict.parse(f.read(), process_namespaces=True)
-    pairs_to_insert = set()
-    for relation in tqdm(relations['senses']['sense']):
-        source_id = relation['@id']
-        derivatives = relation['derived_from']['sense']
-        if not isinstance(derivatives, list):
-            derivatives = [derivatives]
-        for derivative in derivatives:
-            derivative_id = derivative['@id']
-            pairs_to_insert.add((source_id, derivative_id))
-    conn.execute(
-        derivation_table.insert(),
-        [dict(source_id=source_id, derivative_id=derivative_id) for source_id, derivative_id in pairs_to_insert]
+    total_start = time.time()
+    with engine.begin() as connection:
+        for pragma in BULK_LOAD_PRAGMAS:
+            connection.exec_driver_sql(pragma)
+        create_schema(connection)
+        connection.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+        write_stages(connection, get_stages(root, parts), tables, jobs=jobs)
+
+        start = time.time()
+        create_indexes(connection)
+        print(f'created indexes in {time.time() - start:.2f}s')
+
+        start = time.time()
+        build_key_index(connection)
+        print(f'built the key index in {time.time() - start:.2f}s')
+
+        start = time.time()
+        build_definition_index(connection)
+        print(f'built the full-text index in {time.time() - start:.2f}s')
+    engine.dispose()
+    print(f'All loaded successfully in {time.time() - total_start:.2f}s!')
+
+
+def diff_and_apply(connection, table: Table, new_table: Table) -> Dict[str, list]:
+    """ Make the table equal to the new one, changing only the rows that differ. Return their primary keys. """
+    key_columns = [column.name for column in table.primary_key.columns]
+    value_columns = [column.name for column in table.columns if not column.primary_key]
+    same_key = and_(*[new_table.c[name] == table.c[name] for name in key_columns])
+    exists_in_new = select(literal(1)).where(same_key).exists()
+    exists_in_old = select(literal(1)).select_from(table).where(same_key).exists()
+
+    def keys(query):
+        return [row[0] if len(row) == 1 else list(row) for row in connection.execute(query)]
+
+    changes = dict(
+        added=keys(select(*[new_table.c[name] for name in key_columns]).where(~exists_in_old)),
+        removed=keys(select(*[table.c[name] for name in key_columns]).where(~exists_in_new)),
+        modified=[],
     )
-    print('All loaded successfully!')
+    if value_columns:
+        differs = or_(*[new_table.c[name].isnot(table.c[name]) for name in value_columns])
+        modified = select(literal(1)).where(and_(same_key, differs)).exists()
+        changes['modified'] = keys(select(*[table.c[name] for name in key_columns]).where(modified))
+        if changes['modified']:
+            connection.execute(table.update().where(modified).values({
+                name: select(new_table.c[name]).where(same_key).scalar_subquery() for name in value_columns
+            }))
+    if changes['removed']:
+        connection.execute(table.delete().where(~exists_in_new))
+    if changes['added']:
+        columns = [column.name for column in table.columns]
+        connection.execute(table.insert().from_select(
+            columns, select(*[new_table.c[name] for name in columns]).where(~exists_in_old)
+        ))
+    return changes
+
+
+def update_from_xml(root='.', parts='NVA', file_name='ruwordnet/static/ruwordnet.db', jobs=1, changelog_file=None):
+    """ Update an existing database to a newer XML release, inserting, deleting and updating only the changed rows.
+    Everything happens in one transaction. Return the change log: the added, removed and modified keys by table. """
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f'The database {file_name} does not exist; please use load_from_xml to create it.')
+    engine = create_engine(f'sqlite:///{file_name}', echo=False)
+    Base.metadata.create_all(engine)
+    # the derived tables are rebuilt from scratch after the update
+    tables = [table for table in Base.metadata.sorted_tables if table is not KeyIndex.__table__]
+    new_metadata = MetaData()
+    new_tables = {
+        table.name: Table(
+            f'new_{table.name}',
+            new_metadata,
+            *[Column(column.name, column.type, primary_key=column.primary_key) for column in table.columns],
+            prefixes=['TEMPORARY'],
+        )
+        for table in tables
+    }
+
+    total_start = time.time()
+    changelog = {}
+    with engine.begin() as connection:
+        for pragma in UPDATE_PRAGMAS:
+            connection.exec_driver_sql(pragma)
+        migrate(connection)
+        new_metadata.create_all(connection)
+        write_stages(connection, get_stages(root, parts), new_tables, jobs=jobs)
+
+        for table in tables:
+            start = time.time()
+            changelog[table.name] = diff_and_apply(connection, table, new_tables[table.name])
+            summary = ', '.join(f'{len(keys)} {kind}' for kind, keys in changelog[table.name].items())
+            print(f'updated {table.name}: {summary} in {time.time() - start:.2f}s')
+
+        start = time.time()
+        build_key_index(connection)
+        print(f'rebuilt the key index in {time.time() - start:.2f}s')
+        start = time.time()
+        build_definition_index(connection)
+        print(f'rebuilt the full-text index in {time.time() - start:.2f}s')
+        new_metadata.drop_all(connection)
+    engine.dispose()
+
+    if changelog_file:
+        with open(changelog_file, 'w', encoding='utf-8') as f:
+            json.dump(changelog, f, ensure_ascii=False, indent=1)
+        print('the change log is written to', changelog_file)
+    print(f'Updated successfully in {time.time() - total_start:.2f}s!')
+    return changelog
 
 
 if __name__ == '__main__':
@@ -224,5 +393,18 @@ if __name__ == '__main__':
     )
     parser.add_argument('-d', '--destination', default='ruwordnet/static/ruwordnet-2021.db',
                         help='destination database filename')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes for parsing the xml files')
+    parser.add_argument('-u', '--update', action='store_true',
+                        help='update the existing destination database with only the changed rows')
+    parser.add_argument('-c', '--changelog', default=None,
+                        help='where to write the change log of the update (default: next to the database)')
     args = parser.parse_args()
-    load_from_xml(root=args.source, file_name=args.destination)
+    if args.update:
+        update_from_xml(
+            root=args.source,
+            file_name=args.destination,
+            jobs=args.jobs,
+            changelog_file=args.changelog or f'{args.destination}.changelog.json',
+        )
+    else:
+        load_from_xml(root=args.source, file_name=args.destination, jobs=args.jobs)
@@ -1,2 +1,19 @@
-from . import models, ruwordnet
+from . import aio, compiled, lite, ruwordnet
+from .aio import AsyncRuWordNet
+from .compiled import CompiledRuWordNet
+from .lite import LiteRuWordNet
 from .ruwordnet import RuWordNet
+
+
+def __getattr__(name):
+    # these modules import SQLAlchemy, which is slow, so they are loaded only when they are needed
+    if name in {'graph', 'models', 'orm', 'utils'}:
+        import importlib
+        return importlib.import_module(f'.{name}', __name__)
+    if name == 'RuWordNetGraph':
+        from .graph import RuWordNetGraph
+        return RuWordNetGraph
+    if name == 'OrmRuWordNet':
+        from .orm import OrmRuWordNet
+        return OrmRuWordNet
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
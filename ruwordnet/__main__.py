@@ -1,27 +1,102 @@
 import argparse
-import os
-import urllib.request
+import sys
 
+from .download import DEFAULT_VERSION, RELEASES, install_release
 
-URLS = {
-    '2020': 'https://github.com/avidale/python-ruwordnet/releases/download/0.0.2/ruwordnet.db',
-    '2021': 'https://github.com/avidale/python-ruwordnet/releases/download/0.0.4/ruwordnet-2021.db',
-}
+URLS = {version: release.url for version, release in RELEASES.items()}
 
 
 def main():
     parser = argparse.ArgumentParser(description='Tools for RuWordNet')
     subparsers = parser.add_subparsers(dest='subparser')
     download = subparsers.add_parser('download', help='Download the model')
-    download.add_argument('-u', '--url', default=URLS['2021'], help='url of the model to download')
+    download.add_argument('-v', '--version', default=DEFAULT_VERSION, choices=list(RELEASES),
+                          help='the version of the thesaurus, which also determines the name of the installed file')
+    download.add_argument('-u', '--url', default=None,
+                          help='url of the model to download (possibly compressed with xz or zstd)')
+    download.add_argument('-f', '--file', default=None, help='install the model from a local (compressed) file')
+    download.add_argument('-m', '--mirror', default=None,
+                          help='a directory or a base url with the models named as in the releases')
+    download.add_argument('-o', '--output', default=None, help='the installed file (by default, in the package)')
+    download.add_argument('--sha256', default=None, help='the expected SHA-256 of the (decompressed) model')
+    download.add_argument('-r', '--retries', type=int, default=5, help='the number of attempts to resume the download')
+    ic = subparsers.add_parser('ic', help='Compute the information content of the synsets from a corpus')
+    ic.add_argument('corpus', help='a text file with a tokenised (and preferably lemmatized) document on each line')
+    ic.add_argument('-d', '--database', default=None, help='the database file (the downloaded one by default)')
+    ic.add_argument('-o', '--output', default=None, help='the output file (by default, the one next to the database)')
+    ic.add_argument('-j', '--jobs', type=int, default=1, help='the number of processes counting the synsets')
+    ic.add_argument('--smoothing', type=float, default=1.0, help='the count added to each synset')
+    compile_ = subparsers.add_parser('compile', help='Compile the database into a memory-mapped read-only file')
+    compile_.add_argument('-d', '--database', default=None, help='the database file (the downloaded one by default)')
+    compile_.add_argument('-o', '--output', default=None,
+                          help='the output file (by default, the one next to the database with the .rwnc extension)')
+    migrate = subparsers.add_parser('migrate', help='Upgrade the schema of the database to the current version')
+    migrate.add_argument('-d', '--database', default=None, help='the database file (the downloaded one by default)')
+    check = subparsers.add_parser('check', help='Find the relationship queries that scan whole tables')
+    check.add_argument('-d', '--database', default=None, help='the database file (the downloaded one by default)')
+    check.add_argument('-v', '--verbose', action='store_true', help='print the plans of all the queries')
     args = parser.parse_args()
     if args.subparser == 'download':
-        dirname = os.path.join(os.path.dirname(__file__), 'static')
-        if not os.path.exists(dirname):
-            os.makedirs(dirname, exist_ok=True)
-        destination = os.path.join(dirname, 'ruwordnet.db')
-        print('downloading a ruwordnet model from', args.url)
-        urllib.request.urlretrieve(args.url, destination)
+        install_release(
+            args.version, destination=args.output, url=args.url, file=args.file, mirror=args.mirror,
+            sha256=args.sha256, retries=args.retries,
+        )
+    elif args.subparser == 'ic':
+        compute_information_content(args.corpus, args.database, args.output, args.jobs, args.smoothing)
+    elif args.subparser == 'compile':
+        from .compiled import compile_database
+        print('saved the compiled thesaurus to', compile_database(args.database, args.output))
+    elif args.subparser == 'migrate':
+        migrate_database(args.database)
+    elif args.subparser == 'check':
+        if not check_database(args.database, args.verbose):
+            sys.exit(1)
+
+
+def compute_information_content(corpus, database=None, output=None, jobs=1, smoothing=1.0):
+    from .information_content import InformationContent, count_synsets, default_filename
+    from .ruwordnet import RuWordNet
+
+    wn = RuWordNet(database)
+    taxonomy = wn.snapshot().taxonomy()
+    with open(corpus, encoding='utf-8') as f:
+        counts = count_synsets(f, wn.annotator(), processes=jobs)
+    output = output or default_filename(database)
+    InformationContent.from_counts(taxonomy, counts, smoothing=smoothing).save(output)
+    print('saved the information content of', len(counts), 'synsets seen in the corpus to', output)
+
+
+def migrate_database(database=None):
+    from .schema import migrate
+    from .utils import get_default_engine
+
+    engine = get_default_engine(database)
+    with engine.begin() as connection:
+        migrate(connection)
+    engine.dispose()
+
+
+def check_database(database=None, verbose=False) -> bool:
+    """ Print the relationship queries whose plans scan whole tables, and return whether there are none """
+    from .schema import check_query_plans, get_version
+    from .models import SCHEMA_VERSION
+    from .utils import get_default_session
+
+    session = get_default_session(database, read_only=True)
+    version = get_version(session.connection())
+    if version < SCHEMA_VERSION:
+        print(f'the schema version is {version}, but the current one is {SCHEMA_VERSION}; run `ruwordnet migrate`')
+    plans = check_query_plans(session)
+    session.close()
+    for plan in plans:
+        if plan.full_scans or verbose:
+            print(f'{"FULL SCAN" if plan.full_scans else "ok"}: {plan.backend} {plan.relationship}')
+            print('   ', ' '.join(plan.statement.split()))
+            for step in plan.plan:
+                print('    ->', step)
+    scans = sum(bool(plan.full_scans) for plan in plans)
+    print(f'checked {len(plans)} queries: {scans} with full scans')
+    return scans == 0
 
 
 if __name__ == '__main__':
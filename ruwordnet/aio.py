@@ -0,0 +1,130 @@
+"""
+An asyncio interface to the thesaurus.
+
+The queries are run by the lightweight sqlite3 backend in a bounded pool of threads (each with its own connection),
+so they never block the event loop. Identical requests that are running at the same time are coalesced:
+the query is executed once, and all the callers get the same result.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .lite import LiteRuWordNet, Record, Sense, Synset, WNSense, WNSynset
+
+DEFAULT_POOL_SIZE = 4
+
+
+class AsyncRuWordNet:
+    def __init__(
+            self, filename: Optional[str] = None, pool_size: int = DEFAULT_POOL_SIZE,
+            cache_size: Optional[int] = None, cache_ttl: Optional[float] = None, read_only: bool = False,
+    ):
+        """ Open the thesaurus from a database file (the downloaded one by default).
+        pool_size: the maximal number of threads, and therefore database connections, used for the queries.
+        cache_size, cache_ttl: the parameters of the LRU cache of the lookups (see `RuWordNet`).
+        read_only: open the file as an immutable database, which needs no locks (see `LiteRuWordNet`). """
+        self.wordnet = LiteRuWordNet(filename, cache_size=cache_size, cache_ttl=cache_ttl, read_only=read_only)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='ruwordnet')
+        self._running: Dict[tuple, asyncio.Future] = {}
+
+    async def _call(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        key = (loop, method, args)
+        future = self._running.get(key)
+        if future is None:
+            future = loop.run_in_executor(self._executor, partial(getattr(self.wordnet, method), *args))
+            self._running[key] = future
+            future.add_done_callback(lambda _: self._running.pop(key, None))
+        # one of the callers may be cancelled, but the others still need the result;
+        # each of them gets its own copy, so that changing it does not affect the others
+        return _copy(await asyncio.shield(future))
+
+    def close(self):
+        """ Wait for the running queries, stop the threads and close their connections.
+        It blocks, so in a coroutine use `await wn.aclose()` instead. """
+        self._executor.shutdown(wait=True)
+        self.wordnet.close_all()
+
+    async def aclose(self):
+        """ The same as `close`, without blocking the event loop """
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def __getitem__(self, item: str):
+        """ Retrieve sense or synset by its id or name (first try Russian, then English); use as `await wn[item]`.
+        Raise KeyError if nothing is found. """
+        return self._call('__getitem__', item)
+
+    async def get_senses(self, lemma: str) -> List[Sense]:
+        """ Retrieve a list of senses by a given lemma """
+        return await self._call('get_senses', lemma)
+
+    async def get_synsets(self, lemma: str) -> List[Synset]:
+        """ Retrieve a list of synsets by a given lemma """
+        return await self._call('get_synsets', lemma)
+
+    async def get_synset_by_id(self, id: str) -> Optional[Synset]:
+        """ Retrieve a synset by id or return None """
+        return await self._call('get_synset_by_id', id)
+
+    async def get_en_synset_by_id(self, id: str) -> Optional[WNSynset]:
+        """ Retrieve a synset by id or return None (English WordNet) """
+        return await self._call('get_en_synset_by_id', id)
+
+    async def get_en_senses(self, lemma: str) -> List[WNSense]:
+        """ Retrieve a list of senses by a given lemma (English WordNet) """
+        return await self._call('get_en_senses', lemma)
+
+    async def get_en_synsets(self, lemma: str) -> List[WNSynset]:
+        """ Retrieve a list of synsets by a given lemma (English WordNet) """
+        return await self._call('get_en_synsets', lemma)
+
+    async def get_related(self, record: Record, relation: str) -> Union[Record, List[Record], None]:
+        """ Load a relation of a record without blocking the loop, e.g. `await wn.get_related(synset, 'hypernyms')`.
+        Accessing the relation as an attribute also works, but it runs the query in the current thread. """
+        return await self._call('get_related', record, relation)
+
+    async def search_definitions(
+            self, query: str, limit: int = 10, pos: Optional[str] = None, lang: Optional[str] = None,
+    ) -> List[Tuple[Union[Synset, WNSynset], float]]:
+        """ Find the synsets by the words of their titles or definitions (see `RuWordNet.search_definitions`) """
+        return await self._call('search_definitions', query, limit, pos, lang)
+
+    async def get_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[Sense]]:
+        """ Retrieve lists of senses for many lemmas at once """
+        return await self._call('get_senses_many', tuple(lemmas))
+
+    async def get_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[Synset]]:
+        """ Retrieve lists of synsets for many lemmas at once """
+        return await self._call('get_synsets_many', tuple(lemmas))
+
+    async def get_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[Synset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None """
+        return await self._call('get_synsets_by_ids', tuple(ids))
+
+    async def get_en_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSense]]:
+        """ Retrieve lists of senses for many lemmas at once (English WordNet) """
+        return await self._call('get_en_senses_many', tuple(lemmas))
+
+    async def get_en_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSynset]]:
+        """ Retrieve lists of synsets for many lemmas at once (English WordNet) """
+        return await self._call('get_en_synsets_many', tuple(lemmas))
+
+    async def get_en_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[WNSynset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None (English WordNet) """
+        return await self._call('get_en_synsets_by_ids', tuple(ids))
+
+
+def _copy(result):
+    """ Copy the lists and dicts of a result; the records themselves are read-only, so they are shared """
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return {key: _copy(value) for key, value in result.items()}
+    return result
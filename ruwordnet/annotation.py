@@ -0,0 +1,116 @@
+"""
+Finding the thesaurus entries, including multiword expressions, in running text.
+
+The lemmas of all senses are split into tokens and put into a trie, and the text is matched against it
+from left to right, taking the longest entry at each position, so each token is looked at a bounded number of times.
+"""
+import multiprocessing
+import re
+from collections import deque
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+TOKEN = re.compile(r'\w+')
+# the key of the trie nodes that marks the end of a lemma; it cannot be a token
+_END = ''
+
+
+class Span(NamedTuple):
+    """ An occurrence of a thesaurus lemma in a text; the ids can be resolved with `get_synsets_by_ids` etc. """
+    start: int
+    end: int
+    text: str
+    lemma: str
+    sense_ids: Tuple[str, ...]
+    synset_ids: Tuple[str, ...]
+
+
+class Annotator:
+    """ Finds the longest thesaurus lemmas in texts; it can be pickled, so it works in other processes as well """
+    def __init__(self, entries: Iterable[Tuple[str, str, str]], lemmatize: Optional[Callable[[str], str]] = None):
+        """ entries: (lemma, sense id, synset id) triples.
+        lemmatize: an optional function that converts a word of the text into its lemma (e.g. with pymorphy2);
+            it must be picklable to be used with several processes. Without it, the words are matched as they are. """
+        self.lemmatize = lemmatize
+        self._trie: Dict[str, dict] = {}
+        senses: Dict[str, List[Tuple[str, str]]] = {}
+        for lemma, sense_id, synset_id in entries:
+            senses.setdefault(lemma, []).append((sense_id, synset_id))
+        for lemma, ids in senses.items():
+            tokens = TOKEN.findall(lemma.upper())
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            sense_ids, synset_ids = zip(*ids)
+            node[_END] = (lemma, sense_ids, tuple(dict.fromkeys(synset_ids)))
+
+    def _normalize(self, word: str) -> str:
+        if self.lemmatize is not None:
+            word = self.lemmatize(word)
+        return word.upper()
+
+    def annotate(self, text: str) -> List[Span]:
+        """ Find the non-overlapping occurrences of the lemmas in a text, preferring the longest ones """
+        matches = list(TOKEN.finditer(text))
+        tokens = [self._normalize(match.group()) for match in matches]
+        spans = []
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            found, found_end = None, i
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if _END in node:
+                    found, found_end = node[_END], j + 1
+            if found is None:
+                i += 1
+                continue
+            start, end = matches[i].start(), matches[found_end - 1].end()
+            spans.append(Span(start, end, text[start:end], *found))
+            i = found_end
+        return spans
+
+    def annotate_documents(
+            self, documents: Iterable[str], processes: int = 1, chunksize: int = 100,
+    ) -> Iterator[List[Span]]:
+        """ Lazily annotate a stream of documents, yielding the spans of each document in the original order.
+        With processes > 1, the documents are annotated in a pool of processes, in chunks of `chunksize` documents;
+        only a few chunks per process are read ahead, so the memory use does not depend on the size of the corpus. """
+        if processes <= 1:
+            for document in documents:
+                yield self.annotate(document)
+            return
+        for spans in map_chunks(self, _annotate_in_worker, documents, processes, chunksize):
+            yield from spans
+
+
+def map_chunks(annotator: Annotator, function: Callable[[List[str]], object], documents: Iterable[str],
+               processes: int, chunksize: int) -> Iterator:
+    """ Apply a function to the chunks of documents in a pool of processes, in which the annotator is available
+    as `_worker_annotator`, and yield the results in the original order, keeping at most two chunks per process
+    in memory """
+    documents = iter(documents)
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(annotator,)) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < processes * 2:
+                chunk = list(islice(documents, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.apply_async(function, (chunk,)))
+            if not pending:
+                break
+            yield pending.popleft().get()
+
+
+def _init_worker(annotator: Annotator):
+    global _worker_annotator
+    _worker_annotator = annotator
+
+
+def _annotate_in_worker(documents: List[str]) -> List[List[Span]]:
+    return [_worker_annotator.annotate(document) for document in documents]
@@ -0,0 +1,144 @@
+"""
+A bounded LRU cache with an optional time-to-live, used in front of the lookup methods.
+
+Our lookups follow a Zipf distribution, so even a small cache serves most of them without SQL queries.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from typing import Callable, Hashable, Iterable, Optional
+
+from .utils import normalize_lemma
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize', 'evictions'])
+
+_MISSING = object()
+
+
+class LRUCache:
+    """ A thread-safe mapping that keeps at most `maxsize` most recently used items, each for at most `ttl` seconds.
+    `on_put` is called with each stored value, and `on_evict` with each value that was evicted, expired or replaced
+    (but not with the values removed by `clear`); both are called without holding the lock. """
+    def __init__(
+            self, maxsize: int, ttl: Optional[float] = None,
+            on_put: Optional[Callable[[object], None]] = None, on_evict: Optional[Callable[[object], None]] = None,
+    ):
+        if maxsize <= 0:
+            raise ValueError('The cache size must be positive.')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_put = on_put
+        self.on_evict = on_evict
+        self._items = OrderedDict()  # key -> (value, expiration time or None)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+                self.evictions += 1
+            self.misses += 1
+        if item is not None:
+            self._evicted([value])
+        return default
+
+    def put(self, key: Hashable, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        evicted = []
+        with self._lock:
+            if key in self._items:
+                evicted.append(self._items[key][0])
+            self._items[key] = (value, expires)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                evicted.append(self._items.popitem(last=False)[1][0])
+                self.evictions += 1
+        if self.on_put is not None:
+            self.on_put(value)
+        self._evicted(evicted)
+
+    def _evicted(self, values: list):
+        if self.on_evict is not None:
+            for value in values:
+                self.on_evict(value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """ Return the cached value, or compute and cache it; the computation runs without holding the lock """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """ Remove all the items and reset the statistics """
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._items), self.evictions)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def cached(normalize: Callable[[str], str] = None):
+    """ Serve a lookup method from `self._cache` (if it is enabled), using its first argument, normalized, as the key.
+    The cached lists are copied, so that the callers cannot modify them. """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, key, *args, **kwargs):
+            if self._cache is None:
+                return method(self, key, *args, **kwargs)
+            # the options passed as None mean the defaults, so they share the entries with the omitted ones
+            options = sorted((name, value) for name, value in kwargs.items() if value is not None)
+            cache_key = (method.__name__, normalize(key) if normalize else key, *args, *options)
+            value = self._cache.get_or_compute(cache_key, lambda: method(self, key, *args, **kwargs))
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorator
+
+
+class CachedLookups:
+    """ The cache management methods shared by RuWordNet and LiteRuWordNet """
+    _cache: Optional[LRUCache] = None
+    # whether `get_synsets` has its own cache entries, instead of being derived from the cached `get_senses`
+    _synsets_cached = False
+
+    def _create_cache(self, cache_size: Optional[int], cache_ttl: Optional[float]):
+        self._cache = LRUCache(cache_size, ttl=cache_ttl) if cache_size else None
+
+    def cache_info(self) -> CacheInfo:
+        """ The statistics of the lookup cache: hits, misses, maxsize, currsize and evictions """
+        if self._cache is None:
+            return CacheInfo(0, 0, 0, 0, 0)
+        return self._cache.info()
+
+    def cache_clear(self):
+        """ Remove everything from the lookup cache and reset its statistics """
+        if self._cache is not None:
+            self._cache.clear()
+
+    def prewarm(self, lemmas: Iterable[str]) -> int:
+        """ Load the senses and synsets of the given (e.g. the most frequent) lemmas into the cache with a few queries.
+        Return the number of lemmas that were found. """
+        if self._cache is None:
+            raise ValueError('The cache is disabled; please set cache_size to use it.')
+        lemmas = list(lemmas)
+        found = 0
+        for lemma, senses in self.get_senses_many(lemmas).items():
+            self._cache.put(('get_senses', normalize_lemma(lemma)), senses)
+            found += bool(senses)
+        if self._synsets_cached:
+            for lemma, synsets in self.get_synsets_many(lemmas).items():
+                self._cache.put(('get_synsets', normalize_lemma(lemma)), synsets)
+        return found
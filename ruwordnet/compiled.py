@@ -0,0 +1,443 @@
+"""
+A compiled read-only binary format of the thesaurus, which is memory-mapped instead of being loaded.
+
+The file contains a small JSON header followed by flat arrays: for each table, the strings of each column
+(concatenated UTF-8 bytes and their offsets), with the rows sorted by the primary key, so a row is found
+by bisection and numbered by its position; the rows sorted by lemma, for the lemma lookups;
+and each relation in the CSR format (offsets and targets), with the same numbers as in `RuWordNetGraph`.
+Opening the file parses only the header, and all the processes that open it share the same pages of memory.
+SQLAlchemy is only needed to compile the file, not to read it.
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections import deque
+from itertools import islice
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .annotation import Annotator
+from .cache import CachedLookups, cached
+from .completion import Completions
+from .ili import NORMALIZERS, Translation, check_direction, group_translations
+from .lite import (
+    SENSE_RELATIONS, SYNSET_RELATIONS, Record, Sense, Synset, WNSense, WNSynset, traversal_associations,
+)
+from .utils import MissingIndexError, normalize_lemma, normalize_en_lemma
+
+MAGIC = b'RUWNCMP1'
+VERSION = 1
+SUFFIX = '.rwnc'
+# the sections are aligned to this number of bytes
+_ALIGNMENT = 8
+# NULL is stored as this byte string, which cannot be a part of any text of the thesaurus
+_NULL = b'\x00'
+RECORDS = (Synset, Sense, WNSynset, WNSense)
+# record class => the column with the lemmas and the function that normalizes them
+LEMMA_COLUMNS = {Sense: ('lemma', normalize_lemma), WNSense: ('name', normalize_en_lemma)}
+
+
+def is_compiled(filename: str) -> bool:
+    """ Whether the file is a compiled thesaurus (and not a SQLite database) """
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def compile_database(filename: Optional[str] = None, output: Optional[str] = None) -> str:
+    """ Compile a database file (the downloaded one by default) into `output` (by default, next to it
+    with the .rwnc extension), and return the name of the compiled file """
+    from .graph import RuWordNetGraph
+    from .utils import get_default_filename, get_default_session
+
+    filename = get_default_filename(filename)
+    output = output or os.path.splitext(filename)[0] + SUFFIX
+    session = get_default_session(filename, read_only=True)
+    try:
+        graph = RuWordNetGraph.from_session(session)
+    finally:
+        session.close()
+
+    sections: Dict[str, Union[bytes, array]] = {}
+    counts = {}
+    for record_class in RECORDS:
+        model = _model(record_class)
+        columns = graph._columns[model]
+        keys = columns[record_class.columns[0]]
+        if any(a >= b for a, b in zip(keys, keys[1:])):
+            raise ValueError(f'The keys of the table {record_class.table} are not unique or not sorted.')
+        counts[record_class.table] = len(keys)
+        for column in record_class.columns:
+            offsets, data = _encode_strings(columns[column])
+            sections[f'{record_class.table}.{column}.offsets'] = offsets
+            sections[f'{record_class.table}.{column}.data'] = data
+        if record_class in LEMMA_COLUMNS:
+            lemmas = columns[LEMMA_COLUMNS[record_class][0]]
+            sections[f'{record_class.table}.lemma_order'] = array('i', sorted(
+                (i for i, lemma in enumerate(lemmas) if lemma is not None), key=lambda i: (lemmas[i], i),
+            ))
+        for relation in record_class.relations:
+            adjacency = graph.adjacency(relation, model)
+            sections[f'{record_class.table}.{relation}.offsets'] = adjacency.offsets
+            sections[f'{record_class.table}.{relation}.targets'] = adjacency.targets
+
+    header = {'version': VERSION, 'byteorder': sys.byteorder, 'counts': counts, 'sections': {}}
+    position = 0
+    for name, section in sections.items():
+        size = len(section) * section.itemsize if isinstance(section, array) else len(section)
+        typecode = section.typecode if isinstance(section, array) else 'B'
+        header['sections'][name] = [position, size, typecode]
+        position += _padded(size)
+    header_bytes = json.dumps(header).encode('utf-8')
+    start = _padded(len(MAGIC) + 4 + len(header_bytes))
+
+    temporary = output + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        f.write(b'\0' * (start - f.tell()))
+        for section in sections.values():
+            data = section.tobytes() if isinstance(section, array) else section
+            f.write(data)
+            f.write(b'\0' * (_padded(len(data)) - len(data)))
+    os.replace(temporary, output)
+    return output
+
+
+def _model(record_class):
+    from .models import Sense as SenseModel, Synset as SynsetModel, WNSense as WNSenseModel, WNSynset as WNSynsetModel
+    return {Synset: SynsetModel, Sense: SenseModel, WNSynset: WNSynsetModel, WNSense: WNSenseModel}[record_class]
+
+
+def _encode_strings(values: List[Optional[str]]) -> Tuple[array, bytes]:
+    offsets = array('I', [0])
+    chunks = []
+    for value in values:
+        chunk = _NULL if value is None else value.encode('utf-8')
+        chunks.append(chunk)
+        offsets.append(offsets[-1] + len(chunk))
+    return offsets, b''.join(chunks)
+
+
+def _padded(size: int) -> int:
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class _Strings:
+    """ A read-only sequence of the strings of a column, decoded when they are accessed """
+    __slots__ = ('offsets', 'data')
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        raw = bytes(self.data[self.offsets[index]:self.offsets[index + 1]])
+        return None if raw == _NULL else raw.decode('utf-8')
+
+
+class _Reordered:
+    """ A sequence of the values in the given order, for bisection """
+    __slots__ = ('values', 'order')
+
+    def __init__(self, values: _Strings, order: memoryview):
+        self.values = values
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index: int):
+        return self.values[self.order[index]]
+
+
+class CompiledRuWordNet(CachedLookups, Completions):
+    """ The same lookup methods as in LiteRuWordNet, over a memory-mapped compiled file (see `ruwordnet compile`).
+    The records and their attributes are also the same as in LiteRuWordNet. """
+    def __init__(self, filename: str, cache_size: Optional[int] = None, cache_ttl: Optional[float] = None):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'The file {filename} is not a compiled thesaurus.')
+        header_size = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 4], 'little')
+        header_end = len(MAGIC) + 4 + header_size
+        header = json.loads(self._mmap[len(MAGIC) + 4:header_end].decode('utf-8'))
+        if header['version'] != VERSION or header['byteorder'] != sys.byteorder:
+            raise ValueError(f'The file {filename} was compiled by another version or on another platform; '
+                             f'please compile it again.')
+        start = _padded(header_end)
+        buffer = memoryview(self._mmap)
+        self._sections = {
+            name: buffer[start + offset:start + offset + size].cast(typecode)
+            for name, (offset, size, typecode) in header['sections'].items()
+        }
+        self._columns = {
+            record_class: {
+                column: _Strings(
+                    self._sections[f'{record_class.table}.{column}.offsets'],
+                    self._sections[f'{record_class.table}.{column}.data'],
+                ) for column in record_class.columns
+            } for record_class in RECORDS
+        }
+        self._lemmas = {
+            record_class: _Reordered(
+                self._columns[record_class][column], self._sections[f'{record_class.table}.lemma_order'],
+            ) for record_class, (column, _) in LEMMA_COLUMNS.items()
+        }
+        self._create_cache(cache_size, cache_ttl)
+
+    def close(self):
+        """ Release the memory map; the records cannot be used after that """
+        self._sections.clear()
+        self._columns.clear()
+        self._lemmas.clear()
+        self._mmap.close()
+
+    def _record(self, record_class, index: int) -> Record:
+        columns = self._columns[record_class]
+        return record_class(self, *[columns[column][index] for column in record_class.columns])
+
+    def _index(self, record_class, key: str) -> Optional[int]:
+        keys = self._columns[record_class][record_class.columns[0]]
+        index = bisect_left(keys, key)
+        return index if index < len(keys) and keys[index] == key else None
+
+    def _get_by_key(self, record_class, key: str) -> Optional[Record]:
+        index = self._index(record_class, key)
+        return None if index is None else self._record(record_class, index)
+
+    def _get_by_lemma(self, record_class, lemma: str) -> List[Record]:
+        lemmas = self._lemmas[record_class]
+        start = bisect_left(lemmas, lemma)
+        stop = bisect_right(lemmas, lemma, start)
+        return [self._record(record_class, lemmas.order[i]) for i in range(start, stop)]
+
+    @property
+    def synsets(self) -> List[Synset]:
+        """ List of all available synsets """
+        return [self._record(Synset, i) for i in range(len(self._columns[Synset]['id']))]
+
+    @property
+    def senses(self) -> List[Sense]:
+        """ List of all available senses """
+        return [self._record(Sense, i) for i in range(len(self._columns[Sense]['id']))]
+
+    def annotator(self, lemmatize: Optional[Callable[[str], str]] = None) -> Annotator:
+        """ Create an annotator that finds the lemmas of all senses, including multiword ones, in texts """
+        columns = self._columns[Sense]
+        return Annotator(
+            ((columns['lemma'][i], columns['id'][i], columns['synset_id'][i]) for i in range(len(columns['id']))),
+            lemmatize,
+        )
+
+    def _lemma_counts(self, lang: str):
+        """ Pairs of a lemma and its number of senses, for the autocompletion """
+        lemmas = self._lemmas[Sense if lang == 'ru' else WNSense]
+        counts = {}
+        for i in range(len(lemmas)):
+            lemma = lemmas[i]
+            counts[lemma] = counts.get(lemma, 0) + 1
+        return list(counts.items())
+
+    @cached()
+    def get_related(self, record: Record, relation: str) -> Union[Record, List[Record], None]:
+        """ Load a relation of a record, e.g. get_related(synset, 'hypernyms') """
+        record_class = type(record)
+        _, target_class, _, uselist = record_class.relations[relation]
+        index = self._index(record_class, record._key)
+        offsets = self._sections[f'{record_class.table}.{relation}.offsets']
+        targets = self._sections[f'{record_class.table}.{relation}.targets']
+        related = [self._record(target_class, targets[i]) for i in range(offsets[index], offsets[index + 1])]
+        if uselist:
+            return related
+        return related[0] if related else None
+
+    @cached()
+    def __getitem__(self, item: str) -> Union[Synset, Sense, List[Sense], WNSynset, WNSense, List[WNSense]]:
+        """ Retrieve sense or synset by its id or name (first try Russian, then English).
+        Raise KeyError if nothing is found. """
+        result = (
+            self.get_synset_by_id(item)
+            or self._get_by_key(Sense, item)
+            or self.get_senses(item)
+            or self.get_en_synset_by_id(item)
+            or self._get_by_key(WNSense, item)
+            or self.get_en_senses(item)
+        )
+        if not result:
+            raise KeyError(item)
+        return result
+
+    @cached(normalize_lemma)
+    def get_senses(self, lemma: str) -> List[Sense]:
+        """ Retrieve a list of senses by a given lemma """
+        return self._get_by_lemma(Sense, normalize_lemma(lemma))
+
+    def get_synsets(self, lemma: str) -> List[Synset]:
+        """ Retrieve a list of synsets by a given lemma """
+        return [sense.synset for sense in self.get_senses(lemma) if sense.synset]
+
+    @cached()
+    def get_synset_by_id(self, id: str) -> Optional[Synset]:
+        """ Retrieve a synset by id or return None """
+        return self._get_by_key(Synset, id)
+
+    @cached()
+    def get_en_synset_by_id(self, id: str) -> Optional[WNSynset]:
+        """ Retrieve a synset by id or return None (English WordNet) """
+        return self._get_by_key(WNSynset, id)
+
+    @cached(normalize_en_lemma)
+    def get_en_senses(self, lemma: str) -> List[WNSense]:
+        """ Retrieve a list of senses by a given lemma (English WordNet) """
+        return self._get_by_lemma(WNSense, normalize_en_lemma(lemma))
+
+    def get_en_synsets(self, lemma: str) -> List[WNSynset]:
+        """ Retrieve a list of synsets by a given lemma (English WordNet) """
+        return [sense.synset for sense in self.get_en_senses(lemma) if sense.synset]
+
+    def get_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[Sense]]:
+        """ Retrieve lists of senses for many lemmas at once """
+        return {lemma: self._get_by_lemma(Sense, normalize_lemma(lemma)) for lemma in lemmas}
+
+    def get_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[Synset]]:
+        """ Retrieve lists of synsets for many lemmas at once """
+        return {
+            lemma: [sense.synset for sense in senses if sense.synset]
+            for lemma, senses in self.get_senses_many(lemmas).items()
+        }
+
+    def get_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[Synset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None """
+        return {id: self._get_by_key(Synset, id) for id in ids}
+
+    def get_en_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSense]]:
+        """ Retrieve lists of senses for many lemmas at once (English WordNet) """
+        return {lemma: self._get_by_lemma(WNSense, normalize_en_lemma(lemma)) for lemma in lemmas}
+
+    def get_en_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSynset]]:
+        """ Retrieve lists of synsets for many lemmas at once (English WordNet) """
+        return {
+            lemma: [sense.synset for sense in senses if sense.synset]
+            for lemma, senses in self.get_en_senses_many(lemmas).items()
+        }
+
+    def get_en_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[WNSynset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None (English WordNet) """
+        return {id: self._get_by_key(WNSynset, id) for id in ids}
+
+    def translate_many(self, lemmas: Iterable[str], src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate many lemmas at once through the interlingual index, from English to Russian (by default)
+        or from Russian to English: each lemma is mapped to the synsets of the other language matched
+        to its synsets, with the lemmas of their senses. """
+        check_direction(src, dst)
+        normalized = {lemma: NORMALIZERS[src](lemma) for lemma in lemmas}
+        order = self._lemmas[Sense if src == 'ru' else WNSense]
+        groups = []
+        for lemma in sorted(set(normalized.values())):
+            start = bisect_left(order, lemma)
+            groups.append((lemma, start, bisect_right(order, lemma, start)))
+        found = group_translations(self._translation_rows(groups, src))
+        return {lemma: list(found.get(value, [])) for lemma, value in normalized.items()}
+
+    def ili_mapping(self, src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate all the lemmas of the source language at once, e.g. to keep the whole mapping in memory """
+        check_direction(src, dst)
+        order = self._lemmas[Sense if src == 'ru' else WNSense]
+        groups = []
+        for i in range(len(order)):
+            lemma = order[i]
+            if groups and groups[-1][0] == lemma:
+                groups[-1][2] = i + 1
+            else:
+                groups.append([lemma, i, i + 1])
+        return group_translations(self._translation_rows(groups, src))
+
+    def _translation_rows(self, groups: Iterable[tuple], src: str) -> Iterator[Tuple[str, str, str, str]]:
+        """ The same rows as of `ili.translation_query`, in the same order, for the (lemma, start, stop) ranges
+        of the senses sorted by lemma """
+        if src == 'ru':
+            source_class, target_class, target_column = Sense, WNSense, 'name'
+        else:
+            source_class, target_class, target_column = WNSense, Sense, 'lemma'
+        synset_class, target_synset_class = source_class.relations['synset'][1], target_class.relations['synset'][1]
+        synset_offsets, synsets = self._csr(source_class, 'synset')
+        ili_offsets, ili = self._csr(synset_class, 'ili')
+        sense_offsets, senses = self._csr(target_synset_class, 'senses')
+        order = self._lemmas[source_class].order
+        synset_ids, target_ids = self._columns[synset_class]['id'], self._columns[target_synset_class]['id']
+        target_lemmas = self._columns[target_class][target_column]
+        for lemma, start, stop in groups:
+            # the indexes are numbered in the order of the ids, so the pairs are sorted as in the query
+            pairs = sorted({
+                (synset, target)
+                for sense in order[start:stop]
+                for synset in synsets[synset_offsets[sense]:synset_offsets[sense + 1]]
+                for target in ili[ili_offsets[synset]:ili_offsets[synset + 1]]
+            })
+            for synset, target in pairs:
+                for sense in senses[sense_offsets[target]:sense_offsets[target + 1]]:
+                    yield lemma, synset_ids[synset], target_ids[target], target_lemmas[sense]
+
+    def _csr(self, record_class, relation: str) -> Tuple[memoryview, memoryview]:
+        return (
+            self._sections[f'{record_class.table}.{relation}.offsets'],
+            self._sections[f'{record_class.table}.{relation}.targets'],
+        )
+
+    def traverse(
+            self, start: Union[Synset, str], relations: Iterable[str] = ('hypernyms',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Synset, int, Tuple[str, ...]]]:
+        """ Walk the relations of a synset (or of a synset id) transitively, as `RuWordNet.traverse` does """
+        return self._traverse(Synset, start, relations, direction, max_depth, max_nodes, unique)
+
+    def traverse_senses(
+            self, start: Union[Sense, str], relations: Iterable[str] = ('derivations',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Sense, int, Tuple[str, ...]]]:
+        """ The same as `traverse`, for the relations of senses, e.g. relations=['derivations'] """
+        return self._traverse(Sense, start, relations, direction, max_depth, max_nodes, unique)
+
+    def _traverse(self, record_class, start, relations, direction, max_depth, max_nodes, unique):
+        # the same walk as the recursive query of the other backends, over the CSR arrays
+        names = {association: name for name, association in
+                 (SYNSET_RELATIONS if record_class is Synset else SENSE_RELATIONS).items()}
+        arrays = [
+            self._csr(record_class, names[association])
+            for association in traversal_associations(record_class, relations, direction)
+        ]
+        return islice(self._walk(record_class, getattr(start, 'id', start), arrays, max_depth, unique), max_nodes)
+
+    def _walk(self, record_class, start: str, arrays, max_depth: Optional[int], unique: bool):
+        ids = self._columns[record_class]['id']
+        index = self._index(record_class, start)
+        queue = deque([(index, 0, (start,))] if index is not None else [])
+        reached = {index}
+        while queue:
+            index, depth, path = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for offsets, targets in arrays:
+                for target in targets[offsets[index]:offsets[index + 1]]:
+                    id = ids[target]
+                    if (target in reached) if unique else (id in path):
+                        continue
+                    reached.add(target)
+                    queue.append((target, depth + 1, path + (id,)))
+                    yield self._record(record_class, target), depth + 1, path + (id,)
+
+    def search_definitions(self, query: str, limit: int = 10, pos: Optional[str] = None, lang: Optional[str] = None):
+        """ The compiled format does not include the full-text index, so this always raises a MissingIndexError """
+        raise MissingIndexError(
+            'The compiled thesaurus has no full-text index; please open the SQLite database to search the definitions.'
+        )
@@ -0,0 +1,114 @@
+"""
+Autocompletion of Russian and English lemmas by their prefixes.
+
+The lemmas are kept in a sorted list, so the lemmas with a given prefix form a contiguous range found by bisection.
+The best completions of the prefixes that match many lemmas are computed in advance,
+so that each query ranks at most a few hundred lemmas.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# the number of the best completions stored for the prefixes that match many lemmas
+TOP_SIZE = 20
+# the completions of the prefixes that match more lemmas than this are computed in advance
+SCAN_LIMIT = 200
+# a character greater than any character of the lemmas, used as the upper bound of a prefix range
+_MAX_CHARACTER = '\U0010ffff'
+
+LANGUAGES = ('ru', 'en')
+
+
+def check_language(lang: str):
+    if lang not in LANGUAGES:
+        raise ValueError(f'Unknown language "{lang}"; please use one of {LANGUAGES}.')
+
+
+def normalize_prefix(prefix: str, lang: str = 'ru') -> str:
+    """ Bring a prefix to the form of the stored lemmas; the trailing spaces are kept, since they separate words """
+    check_language(lang)
+    if lang == 'ru':
+        return prefix.lstrip().upper()
+    return prefix.lstrip().lower().replace(' ', '_')
+
+
+class CompletionIndex:
+    """ A sorted index of lemmas, ranked by the number of their senses """
+    def __init__(self, counts: Iterable[Tuple[str, int]]):
+        items = sorted(counts)
+        self.lemmas: List[str] = [lemma for lemma, _ in items]
+        self.counts = array('i', [count for _, count in items])
+        self._top: Dict[str, List[str]] = {}
+        if len(self.lemmas) > SCAN_LIMIT:
+            self._top[''] = self._best(0, len(self.lemmas), TOP_SIZE)
+            self._precompute(0, len(self.lemmas), 1)
+
+    def _best(self, start: int, stop: int, limit: int) -> List[str]:
+        """ The most frequent lemmas in a range (and the first ones in the alphabetical order among equals) """
+        best = heapq.nsmallest(limit, range(start, stop), key=lambda i: (-self.counts[i], self.lemmas[i]))
+        return [self.lemmas[i] for i in best]
+
+    def _precompute(self, start: int, stop: int, length: int):
+        """ Store the best completions of all the prefixes of this length that match more than SCAN_LIMIT lemmas """
+        i = start
+        while i < stop:
+            if len(self.lemmas[i]) < length:
+                i += 1
+                continue
+            prefix = self.lemmas[i][:length]
+            end = bisect_left(self.lemmas, prefix + _MAX_CHARACTER, i, stop)
+            if end - i > SCAN_LIMIT:
+                self._top[prefix] = self._best(i, end, TOP_SIZE)
+                self._precompute(i, end, length + 1)
+            i = end
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """ Find up to `limit` lemmas that start with an already normalized prefix, the most frequent first """
+        start = bisect_left(self.lemmas, prefix)
+        stop = bisect_left(self.lemmas, prefix + _MAX_CHARACTER, start)
+        if stop - start > SCAN_LIMIT and limit <= TOP_SIZE:
+            return self._top[prefix][:limit]
+        return self._best(start, stop, limit)
+
+    def __len__(self):
+        return len(self.lemmas)
+
+    def save(self, filename: str):
+        """ Write the index into a text file with a lemma and its number of senses on each line """
+        with open(filename, 'w', encoding='utf-8') as f:
+            for lemma, count in zip(self.lemmas, self.counts):
+                f.write(f'{lemma}\t{count}\n')
+
+    @classmethod
+    def load(cls, filename: str) -> 'CompletionIndex':
+        """ Read an index written by `save` """
+        with open(filename, encoding='utf-8') as f:
+            rows = [line.rstrip('\n').split('\t') for line in f]
+        return cls((lemma, int(count)) for lemma, count in rows)
+
+
+class Completions:
+    """ The autocompletion methods shared by RuWordNet and LiteRuWordNet; they rely on `_lemma_counts(lang)` """
+    _completion_indexes: Optional[Dict[str, CompletionIndex]] = None
+
+    def completion_index(self, lang: str = 'ru') -> CompletionIndex:
+        """ The index of Russian or English lemmas; it is built from the database on the first use """
+        check_language(lang)
+        if self._completion_indexes is None:
+            self._completion_indexes = {}
+        if lang not in self._completion_indexes:
+            self._completion_indexes[lang] = CompletionIndex(self._lemma_counts(lang))
+        return self._completion_indexes[lang]
+
+    def load_completion_index(self, filename: str, lang: str = 'ru'):
+        """ Use an index saved earlier with `completion_index(lang).save(filename)` instead of building it """
+        check_language(lang)
+        if self._completion_indexes is None:
+            self._completion_indexes = {}
+        self._completion_indexes[lang] = CompletionIndex.load(filename)
+
+    def complete(self, prefix: str, limit: int = 10, lang: str = 'ru') -> List[str]:
+        """ Suggest up to `limit` Russian or English lemmas that start with the prefix, the ones with more senses first;
+        e.g. complete('зам') or complete('elec', lang='en') """
+        return self.completion_index(lang).complete(normalize_prefix(prefix, lang), limit)
@@ -0,0 +1,229 @@
+"""
+Download and installation of the thesaurus database.
+
+The artifact may be compressed with xz or zstd (by the extension of its name); it is decompressed on the fly
+into a temporary file next to the destination, which replaces the destination atomically only after
+its SHA-256 (if it is known) is verified. The compressed bytes are also kept in a .part file,
+so an interrupted transfer is resumed with an HTTP Range request instead of starting over.
+"""
+import hashlib
+import lzma
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.client import HTTPException
+from typing import NamedTuple, Optional
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+CHUNK_SIZE = 1 << 16
+DEFAULT_RETRIES = 5
+# the extensions of the artifacts looked for in a mirror directory, in the order of preference
+EXTENSIONS = ('.zst', '.xz', '')
+
+
+class Release(NamedTuple):
+    url: str
+    # the name of the installed file, which `utils.get_default_filename` looks for
+    filename: str
+    # the SHA-256 of the decompressed database, if it is published
+    sha256: Optional[str] = None
+
+
+# the releases publish only the uncompressed databases, with no checksums, so by default the downloads
+# are not verified; the compressed artifacts and the SHA-256 can be passed explicitly (see `install_release`)
+RELEASES = {
+    '2020': Release('https://github.com/avidale/python-ruwordnet/releases/download/0.0.2/ruwordnet.db', 'ruwordnet.db'),
+    '2021': Release(
+        'https://github.com/avidale/python-ruwordnet/releases/download/0.0.4/ruwordnet-2021.db', 'ruwordnet-2021.db',
+    ),
+}
+DEFAULT_VERSION = '2021'
+
+
+class ChecksumError(ValueError):
+    pass
+
+
+class _Decompressor:
+    """ Decompresses the chunks of an artifact (by the extension of its name) into a file,
+    and computes the SHA-256 of the result """
+    def __init__(self, name: str, output):
+        self.name = name
+        self.output = output
+        self.reset()
+
+    def reset(self):
+        self.output.seek(0)
+        self.output.truncate()
+        self.hash = hashlib.sha256()
+        if self.name.endswith('.xz'):
+            self._decompressor = lzma.LZMADecompressor()
+        elif self.name.endswith('.zst'):
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError(
+                    'zstandard is required for the .zst files; please install it with `pip install zstandard`.'
+                )
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self._decompressor = None
+
+    def write(self, chunk: bytes):
+        if self._decompressor is not None:
+            if self._decompressor.eof:
+                if not chunk:
+                    return
+                raise ValueError(f'The compressed file {self.name} has extra data after its end.')
+            chunk = self._decompressor.decompress(chunk)
+        self.output.write(chunk)
+        self.hash.update(chunk)
+
+    def finish(self) -> str:
+        """ Flush the file to the disk and return the SHA-256 of the decompressed data """
+        # both decompressors just wait for more data after a truncated stream, so its end is checked here
+        if self._decompressor is not None and not self._decompressor.eof:
+            raise ValueError(f'The compressed file {self.name} is truncated.')
+        if self._decompressor is not None and self._decompressor.unused_data:
+            raise ValueError(f'The compressed file {self.name} has extra data after its end.')
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        return self.hash.hexdigest()
+
+
+def default_destination(version: str = DEFAULT_VERSION) -> str:
+    return os.path.join(STATIC_DIR, RELEASES[version].filename)
+
+
+def install_release(
+        version: str = DEFAULT_VERSION, destination: Optional[str] = None, url: Optional[str] = None,
+        file: Optional[str] = None, mirror: Optional[str] = None, sha256: Optional[str] = None, **kwargs,
+) -> str:
+    """ Install a version of the database from its release url (or another `url`), from a local `file`,
+    or from a `mirror` (a directory or a base url with the artifacts named as in the releases, possibly
+    compressed). Return the name of the installed file. The other arguments are passed to `download`. """
+    release = RELEASES[version]
+    destination = destination or default_destination(version)
+    sha256 = sha256 or release.sha256
+    if file is None and mirror is not None:
+        basename = os.path.basename(urllib.parse.urlparse(release.url).path)
+        if urllib.parse.urlparse(mirror).scheme in {'http', 'https', 'ftp'}:
+            url = f'{mirror.rstrip("/")}/{basename}'
+        else:
+            candidates = [os.path.join(mirror, basename + extension) for extension in EXTENSIONS]
+            file = next((candidate for candidate in candidates if os.path.exists(candidate)), None)
+            if file is None:
+                raise FileNotFoundError(f'None of {candidates} was found in the mirror.')
+    if file is not None:
+        digest = install(file, destination, sha256=sha256)
+    else:
+        digest = download(url or release.url, destination, sha256=sha256, **kwargs)
+    print('installed the database to', destination, 'with SHA-256', digest)
+    return destination
+
+
+def install(source: str, destination: str, sha256: Optional[str] = None) -> str:
+    """ Decompress and verify a local artifact, then atomically replace the destination with it.
+    Return the SHA-256 of the database. """
+    def copy(decompressor):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                decompressor.write(chunk)
+    return _install(copy, source, destination, sha256)
+
+
+def download(
+        url: str, destination: str, sha256: Optional[str] = None, retries: int = DEFAULT_RETRIES,
+        timeout: float = 60, progress: bool = True,
+) -> str:
+    """ Download a (possibly compressed) database to the destination, resuming the interrupted transfers,
+    and return the SHA-256 of the database. With `sha256`, a mismatching file is discarded with a ChecksumError;
+    after the other errors, the downloaded part is kept, and the next call resumes it. """
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    part = f'{destination}.part'
+
+    def fetch(decompressor):
+        for attempt in range(retries + 1):
+            try:
+                _fetch(url, part, decompressor, timeout, progress)
+                return
+            except (OSError, HTTPException) as error:
+                if (isinstance(error, urllib.error.HTTPError) and error.code < 500) or attempt == retries:
+                    raise
+                print(f'\nthe download was interrupted ({error}); resuming in {2 ** attempt}s', file=sys.stderr)
+                time.sleep(2 ** attempt)
+
+    try:
+        digest = _install(fetch, urllib.parse.urlparse(url).path, destination, sha256)
+    except (ValueError, lzma.LZMAError):
+        # the artifact itself is wrong (e.g. its checksum does not match), so it is not worth resuming
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    os.remove(part)
+    return digest
+
+
+def _install(write, name: str, destination: str, sha256: Optional[str]) -> str:
+    temporary = f'{destination}.tmp'
+    try:
+        with open(temporary, 'wb') as output:
+            decompressor = _Decompressor(name, output)
+            write(decompressor)
+            digest = decompressor.finish()
+        if sha256 is not None and digest != sha256.lower():
+            raise ChecksumError(f'The SHA-256 of the database is {digest}, but {sha256} was expected.')
+        os.replace(temporary, destination)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return digest
+
+
+def _fetch(url: str, part: str, decompressor: _Decompressor, timeout: float, progress: bool):
+    """ Download the rest of the artifact after the bytes already saved in the .part file,
+    and pass all the bytes to the decompressor """
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    request = urllib.request.Request(url, headers={'Range': f'bytes={offset}-'} if offset else {})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as error:
+        if error.code != 416 or not offset:
+            raise
+        # the range starts at the end of the artifact, so it has been downloaded completely
+        response = None
+    decompressor.reset()
+    if response is None or response.status == 206:
+        with open(part, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                decompressor.write(chunk)
+    else:
+        # the server ignored the range, so the artifact is downloaded from the start
+        offset = 0
+    if response is None:
+        return
+    with response, open(part, 'ab' if offset else 'wb') as f:
+        length = response.headers.get('Content-Length')
+        total = offset + int(length) if length is not None else None
+        received = offset
+        for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+            f.write(chunk)
+            decompressor.write(chunk)
+            received += len(chunk)
+            if progress:
+                _report(received, total)
+        if progress:
+            print(file=sys.stderr)
+        if total is not None and received < total:
+            raise ConnectionError(f'The connection was closed after {received} of {total} bytes.')
+
+
+def _report(received: int, total: Optional[int]):
+    if total:
+        message = f'{received / 2 ** 20:.1f} of {total / 2 ** 20:.1f} MiB ({received / total:.0%})'
+    else:
+        message = f'{received / 2 ** 20:.1f} MiB'
+    print(f'\rdownloading: {message}', end='', file=sys.stderr)
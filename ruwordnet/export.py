@@ -0,0 +1,177 @@
+"""
+Bulk export of the relation graph for graph embeddings and analytics.
+
+The nodes and the association tables are read directly with a few bulk queries, in batches, without ORM objects.
+The nodes are numbered in the order of their ids, like in the in-memory snapshot.
+By default, each association table is exported once, so e.g. "hypernyms" are exported, but their inverse
+"hyponyms" are not; any relations can be requested explicitly by their names.
+"""
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, select
+
+from .models import Synset, relation_columns
+
+if TYPE_CHECKING:
+    import networkx
+    import pyarrow
+    import scipy.sparse
+
+BATCH_SIZE = 10000
+
+
+def node_ids(session, model=Synset) -> Dict[str, int]:
+    """ Map the id of each node to its index """
+    key = _primary_key(model)
+    ids = {}
+    for rows in _stream(session, select(key).order_by(key)):
+        for id, in rows:
+            ids[id] = len(ids)
+    return ids
+
+
+def edges(
+        session, model=Synset, relations: Optional[Sequence[str]] = None,
+) -> Iterator[Tuple[str, List[Tuple[str, str]]]]:
+    """ Stream the relations as (relation name, a batch of (source id, target id) pairs) """
+    for relation, (_, owner_column, related_column) in _relation_columns(model, relations).items():
+        for rows in _stream(session, select(owner_column, related_column)):
+            yield relation, rows
+
+
+def to_scipy(
+        session, model=Synset, relations: Optional[Sequence[str]] = None,
+) -> Tuple[Dict[str, 'scipy.sparse.csr_matrix'], Dict[str, int]]:
+    """ Export each relation as a square CSR adjacency matrix, and return them with the map of ids to indices """
+    numpy, sparse = _import_optional('numpy'), _import_optional('scipy.sparse', 'scipy')
+    ids = node_ids(session, model)
+    pairs = {relation: (array('i'), array('i')) for relation in _relation_columns(model, relations)}
+    for relation, rows in edges(session, model, relations):
+        sources, targets = pairs[relation]
+        for source, target in rows:
+            if source in ids and target in ids:
+                sources.append(ids[source])
+                targets.append(ids[target])
+    matrices = {}
+    for relation, (sources, targets) in pairs.items():
+        rows, columns = numpy.frombuffer(sources, dtype=numpy.int32), numpy.frombuffer(targets, dtype=numpy.int32)
+        matrices[relation] = sparse.csr_matrix(
+            (numpy.ones(len(rows), dtype=numpy.int8), (rows, columns)), shape=(len(ids), len(ids)),
+        )
+    return matrices, ids
+
+
+def to_networkx(session, model=Synset, relations: Optional[Sequence[str]] = None) -> 'networkx.DiGraph':
+    """ Export the nodes with their columns as attributes, and the edges with the name of their relation
+    (if two nodes are linked by several relations, the edge gets the last of them) """
+    networkx = _import_optional('networkx')
+    graph = networkx.DiGraph()
+    key = _primary_key(model).name
+    for rows in _stream(session, select(*model.__table__.columns).order_by(_primary_key(model))):
+        graph.add_nodes_from(
+            (row[key], {name: value for name, value in row._mapping.items() if name != key}) for row in rows
+        )
+    for relation, rows in edges(session, model, relations):
+        graph.add_edges_from(
+            (source, target, {'relation': relation}) for source, target in rows if source in graph and target in graph
+        )
+    return graph
+
+
+def to_arrow(
+        session, model=Synset, relations: Optional[Sequence[str]] = None,
+) -> Tuple['pyarrow.Table', 'pyarrow.Table']:
+    """ Export the table of the nodes (with all their columns), and the table of the edges
+    (with the columns "source", "target" and "relation") """
+    pyarrow = _import_optional('pyarrow')
+    node_schema, edge_schema = _node_schema(pyarrow, model), _edge_schema(pyarrow)
+    nodes = pyarrow.Table.from_batches(list(_node_batches(pyarrow, session, model)), schema=node_schema)
+    edge_table = pyarrow.Table.from_batches(list(_edge_batches(pyarrow, session, model, relations)), schema=edge_schema)
+    return nodes, edge_table
+
+
+def to_parquet(
+        session, nodes_filename: str, edges_filename: str, model=Synset, relations: Optional[Sequence[str]] = None,
+):
+    """ Write the tables of `to_arrow` into Parquet files batch by batch, without keeping them in memory """
+    pyarrow = _import_optional('pyarrow')
+    parquet = _import_optional('pyarrow.parquet', 'pyarrow')
+    with parquet.ParquetWriter(nodes_filename, _node_schema(pyarrow, model)) as writer:
+        for batch in _node_batches(pyarrow, session, model):
+            writer.write_batch(batch)
+    with parquet.ParquetWriter(edges_filename, _edge_schema(pyarrow)) as writer:
+        for batch in _edge_batches(pyarrow, session, model, relations):
+            writer.write_batch(batch)
+
+
+def _node_schema(pyarrow, model) -> 'pyarrow.Schema':
+    return pyarrow.schema([
+        (column.name, pyarrow.int64() if isinstance(column.type, Integer) else pyarrow.string())
+        for column in model.__table__.columns
+    ])
+
+
+def _edge_schema(pyarrow) -> 'pyarrow.Schema':
+    return pyarrow.schema([('source', pyarrow.string()), ('target', pyarrow.string()), ('relation', pyarrow.string())])
+
+
+def _node_batches(pyarrow, session, model) -> Iterator['pyarrow.RecordBatch']:
+    schema = _node_schema(pyarrow, model)
+    statement = select(*model.__table__.columns).order_by(_primary_key(model))
+    for rows in _stream(session, statement):
+        yield pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema,
+        )
+
+
+def _edge_batches(pyarrow, session, model, relations) -> Iterator['pyarrow.RecordBatch']:
+    schema = _edge_schema(pyarrow)
+    ids = node_ids(session, model)
+    for relation, rows in edges(session, model, relations):
+        rows = [(source, target) for source, target in rows if source in ids and target in ids]
+        if rows:
+            sources, targets = zip(*rows)
+            yield pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(sources), pyarrow.array(targets), pyarrow.array([relation] * len(rows))], schema=schema,
+            )
+
+
+def _relation_columns(model, relations: Optional[Sequence[str]]) -> dict:
+    """ The association tables of the relations between the nodes of the model (not e.g. the links to WordNet) """
+    columns = {
+        relation: value for relation, value in relation_columns(model).items()
+        if model.__mapper__.relationships[relation].mapper.class_ is model
+    }
+    if relations is not None:
+        unknown = [relation for relation in relations if relation not in columns]
+        if unknown:
+            raise ValueError(f'Unknown relations {unknown}; please use some of {list(columns)}.')
+        return {relation: columns[relation] for relation in relations}
+    result, tables = {}, set()
+    for relation, (table, owner_column, related_column) in columns.items():
+        if table not in tables:
+            tables.add(table)
+            result[relation] = (table, owner_column, related_column)
+    return result
+
+
+def _primary_key(model):
+    column, = model.__table__.primary_key.columns
+    return column
+
+
+def _stream(session, statement) -> Iterator[list]:
+    """ Execute a query and yield its rows in batches """
+    result = session.execute(statement.execution_options(stream_results=True))
+    for rows in result.partitions(BATCH_SIZE):
+        yield rows
+
+
+def _import_optional(name: str, package: Optional[str] = None):
+    import importlib
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        package = package or name
+        raise ImportError(f'{package} is required for this export; please install it with `pip install {package}`.')
@@ -0,0 +1,254 @@
+"""
+A read-only in-memory snapshot of the whole thesaurus.
+
+All synsets, senses and their relations are loaded with one query per table into integer-indexed arrays,
+and the relations are stored in the CSR format (offsets and targets), so neighbour lookups never touch the database.
+"""
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import MANYTOONE
+
+from .models import Sense, Synset, WNSense, WNSynset, relation_columns
+from .utils import normalize_lemma, normalize_en_lemma
+
+if TYPE_CHECKING:
+    from .taxonomy import Taxonomy
+
+
+MODELS = (Synset, Sense, WNSynset, WNSense)
+
+
+class Adjacency:
+    """ A relation in the CSR format: neighbours of the node i are targets[offsets[i]:offsets[i + 1]] """
+    __slots__ = ('offsets', 'targets', 'target_model')
+
+    def __init__(self, offsets: array, targets: array, target_model):
+        self.offsets = offsets
+        self.targets = targets
+        self.target_model = target_model
+
+    @classmethod
+    def from_pairs(cls, n_sources: int, pairs: Iterable[Tuple[int, int]], target_model) -> 'Adjacency':
+        """ Build the relation from (source index, target index) pairs, keeping their order for each source """
+        pairs = list(pairs)
+        offsets = array('i', [0]) * (n_sources + 1)
+        for source, _ in pairs:
+            offsets[source + 1] += 1
+        for i in range(n_sources):
+            offsets[i + 1] += offsets[i]
+        positions = offsets[:-1]
+        targets = array('i', [0]) * len(pairs)
+        for source, target in pairs:
+            targets[positions[source]] = target
+            positions[source] += 1
+        return cls(offsets=offsets, targets=targets, target_model=target_model)
+
+    def neighbours(self, index: int) -> array:
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+
+class RuWordNetGraph:
+    """ A snapshot of the thesaurus with the same lookup methods as RuWordNet, but without SQL queries """
+    def __init__(self, columns: Dict[type, Dict[str, list]], relations: Dict[Tuple[type, str], Adjacency]):
+        self._columns = columns
+        self._relations = relations
+        self._ids = {
+            model: {key: i for i, key in enumerate(columns[model][_primary_key(model)])}
+            for model in MODELS
+        }
+        self._lemmas = _group(columns[Sense]['lemma'])
+        self._en_lemmas = _group(columns[WNSense]['name'])
+
+    @classmethod
+    def from_session(cls, session) -> 'RuWordNetGraph':
+        """ Load all the tables of the thesaurus from the database """
+        columns = {}
+        for model in MODELS:
+            table = model.__table__
+            rows = session.execute(select(*table.columns).order_by(table.c[_primary_key(model)])).fetchall()
+            columns[model] = {column.name: [row[i] for row in rows] for i, column in enumerate(table.columns)}
+        ids = {model: {key: i for i, key in enumerate(columns[model][_primary_key(model)])} for model in MODELS}
+
+        relations = {}
+        for model in MODELS:
+            for relationship_property in model.__mapper__.relationships:
+                target = relationship_property.mapper.class_
+                (parent_column, child_column), = relationship_property.synchronize_pairs
+                if relationship_property.secondary is not None:
+                    _, owner_column, related_column = relation_columns(model)[relationship_property.key]
+                    pairs = session.execute(select(owner_column, related_column)).fetchall()
+                elif relationship_property.direction is MANYTOONE:
+                    pairs = zip(columns[model][_primary_key(model)], columns[model][child_column.name])
+                else:
+                    pairs = zip(columns[target][child_column.name], columns[target][_primary_key(target)])
+                relations[model, relationship_property.key] = Adjacency.from_pairs(
+                    n_sources=len(ids[model]),
+                    pairs=[
+                        (ids[model][source], ids[target][destination])
+                        for source, destination in pairs
+                        if source in ids[model] and destination in ids[target]
+                    ],
+                    target_model=target,
+                )
+        return cls(columns=columns, relations=relations)
+
+    def taxonomy(self, instances: bool = False) -> 'Taxonomy':
+        """ Build the reachability index of the hypernymy hierarchy, for fast is-a checks """
+        from .taxonomy import Taxonomy
+        return Taxonomy(self, instances=instances)
+
+    def adjacency(self, relation: str, model=Synset) -> Adjacency:
+        """ Get the raw CSR arrays of a relation, e.g. "hypernyms" """
+        return self._relations[model, relation]
+
+    def index_of(self, id: str, model=Synset) -> Optional[int]:
+        """ Get the integer index of an object by its id (or key for English senses) """
+        return self._ids[model].get(id)
+
+    def view(self, index: int, model=Synset) -> Union['SynsetView', 'SenseView', 'WNSynsetView', 'WNSenseView']:
+        """ Get a lightweight object by its integer index """
+        return VIEWS[model](self, index)
+
+    @property
+    def synsets(self) -> List['SynsetView']:
+        """ List of all available synsets """
+        return [SynsetView(self, i) for i in range(len(self._ids[Synset]))]
+
+    @property
+    def senses(self) -> List['SenseView']:
+        """ List of all available senses """
+        return [SenseView(self, i) for i in range(len(self._ids[Sense]))]
+
+    def __getitem__(self, item: str):
+        """ Retrieve sense or synset by its id or name (first try Russian, then English).
+        Raise KeyError if nothing is found. """
+        result = (
+            self.get_synset_by_id(item)
+            or self._get_by_id(item, Sense)
+            or self.get_senses(item)
+            or self.get_en_synset_by_id(item)
+            or self._get_by_id(item, WNSense)
+            or self.get_en_senses(item)
+        )
+        if not result:
+            raise KeyError(item)
+        return result
+
+    def get_senses(self, lemma: str) -> List['SenseView']:
+        """ Retrieve a list of senses by a given lemma """
+        return [SenseView(self, i) for i in self._lemmas.get(normalize_lemma(lemma), [])]
+
+    def get_synsets(self, lemma: str) -> List['SynsetView']:
+        """ Retrieve a list of synsets by a given lemma """
+        return [sense.synset for sense in self.get_senses(lemma) if sense.synset]
+
+    def get_synset_by_id(self, id: str) -> Optional['SynsetView']:
+        """ Retrieve a synset by id or return None """
+        return self._get_by_id(id, Synset)
+
+    def get_en_synset_by_id(self, id: str) -> Optional['WNSynsetView']:
+        """ Retrieve a synset by id or return None (English WordNet) """
+        return self._get_by_id(id, WNSynset)
+
+    def get_en_senses(self, lemma: str) -> List['WNSenseView']:
+        """ Retrieve a list of senses by a given lemma (English WordNet) """
+        return [WNSenseView(self, i) for i in self._en_lemmas.get(normalize_en_lemma(lemma), [])]
+
+    def get_en_synsets(self, lemma: str) -> List['WNSynsetView']:
+        """ Retrieve a list of synsets by a given lemma (English WordNet) """
+        return [sense.synset for sense in self.get_en_senses(lemma) if sense.synset]
+
+    def _get_by_id(self, id: str, model):
+        index = self._ids[model].get(id)
+        if index is None:
+            return None
+        return VIEWS[model](self, index)
+
+    def _related(self, model, relation: str, index: int, uselist: bool):
+        adjacency = self._relations[model, relation]
+        view = VIEWS[adjacency.target_model]
+        neighbours = adjacency.neighbours(index)
+        if uselist:
+            return [view(self, i) for i in neighbours]
+        return view(self, neighbours[0]) if neighbours else None
+
+
+class _View:
+    """ A read-only proxy for one row of the snapshot """
+    __slots__ = ('_graph', '_index')
+    model = None
+
+    def __init__(self, graph: RuWordNetGraph, index: int):
+        self._graph = graph
+        self._index = index
+
+    @property
+    def index(self) -> int:
+        """ The integer index of the object in the snapshot """
+        return self._index
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._graph is self._graph and other._index == self._index
+
+    def __hash__(self):
+        return hash((self.model, self._index))
+
+
+class SynsetView(_View):
+    __slots__ = ()
+    model = Synset
+    __repr__ = Synset.__repr__
+
+
+class SenseView(_View):
+    __slots__ = ()
+    model = Sense
+    __repr__ = Sense.__repr__
+
+
+class WNSynsetView(_View):
+    __slots__ = ()
+    model = WNSynset
+    __repr__ = WNSynset.__repr__
+
+
+class WNSenseView(_View):
+    __slots__ = ()
+    model = WNSense
+    __repr__ = WNSense.__repr__
+
+
+VIEWS = {Synset: SynsetView, Sense: SenseView, WNSynset: WNSynsetView, WNSense: WNSenseView}
+
+
+def _primary_key(model) -> str:
+    return model.__table__.primary_key.columns[0].name
+
+
+def _group(values: List[str]) -> Dict[str, array]:
+    groups = {}
+    for i, value in enumerate(values):
+        groups.setdefault(value, array('i')).append(i)
+    return groups
+
+
+def _column_property(name: str) -> property:
+    def getter(self):
+        return self._graph._columns[self.model][name][self._index]
+    return property(getter)
+
+
+def _relation_property(name: str, uselist: bool) -> property:
+    def getter(self):
+        return self._graph._related(self.model, name, self._index, uselist)
+    return property(getter)
+
+
+# the views expose the same attribute names as the ORM models
+for _model, _view in VIEWS.items():
+    for _column in _model.__table__.columns:
+        setattr(_view, _column.name, _column_property(_column.name))
+    for _relationship in _model.__mapper__.relationships:
+        setattr(_view, _relationship.key, _relation_property(_relationship.key, _relationship.uselist))
@@ -0,0 +1,71 @@
+"""
+Translation of lemmas between Russian and English through the interlingual index (ILI).
+
+The translations are resolved with one join of the senses, the index and the senses of the other language
+for a whole batch of lemmas, so that mapping many words takes a few queries instead of a lazy load at every hop.
+"""
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .utils import chunked, normalize_lemma, normalize_en_lemma
+
+# language => (table of the senses, column with the lemma, primary key, column of the ILI table)
+LANGUAGES = {
+    'ru': ('sense', 'lemma', 'id', 'ruwn_id'),
+    'en': ('wn_sense', 'name', 'key', 'wn_id'),
+}
+NORMALIZERS = {'ru': normalize_lemma, 'en': normalize_en_lemma}
+# the number of lemmas in one `IN (...)` clause; shorter chunks are padded, so that one prepared statement is reused
+BATCH_SIZE = 500
+
+
+class Translation(NamedTuple):
+    """ A synset of the target language matched to a synset of the source lemma, with the lemmas of its senses """
+    source_id: str
+    synset_id: str
+    lemmas: Tuple[str, ...]
+
+
+def check_direction(src: str, dst: str):
+    if src not in LANGUAGES or dst not in LANGUAGES or src == dst:
+        raise ValueError(f'Unknown translation direction "{src}" -> "{dst}"; please use "en" -> "ru" or "ru" -> "en".')
+
+
+def translation_query(src: str = 'en', dst: str = 'ru', size: Optional[int] = None) -> str:
+    """ The query of (source lemma, source synset id, target synset id, target lemma) rows for `size` lemmas
+    (the `?` parameters), or for all the lemmas if the size is None """
+    check_direction(src, dst)
+    src_table, src_lemma, _, src_column = LANGUAGES[src]
+    dst_table, dst_lemma, dst_key, dst_column = LANGUAGES[dst]
+    where = f'WHERE s.{src_lemma} IN ({", ".join(["?"] * size)}) ' if size else ''
+    return (
+        f'SELECT s.{src_lemma}, i.{src_column}, i.{dst_column}, t.{dst_lemma} FROM {src_table} AS s '
+        f'JOIN interlingual_index_relation AS i ON i.{src_column} = s.synset_id '
+        f'JOIN {dst_table} AS t ON t.synset_id = i.{dst_column} '
+        f'{where}ORDER BY 1, 2, 3, t.{dst_key}'
+    )
+
+
+def group_translations(rows: Iterable[Tuple[str, str, str, str]]) -> Dict[str, List[Translation]]:
+    """ Group the rows of a `translation_query` by the source lemma, and then by the pair of synsets """
+    grouped: Dict[str, Dict[Tuple[str, str], list]] = {}
+    for lemma, source_id, synset_id, target_lemma in rows:
+        lemmas = grouped.setdefault(lemma, {}).setdefault((source_id, synset_id), [])
+        if target_lemma not in lemmas:
+            lemmas.append(target_lemma)
+    return {
+        lemma: [Translation(source_id, synset_id, tuple(lemmas)) for (source_id, synset_id), lemmas in pairs.items()]
+        for lemma, pairs in grouped.items()
+    }
+
+
+def translate_many(
+        execute: Callable[[str, list], Iterable[tuple]], lemmas: Iterable[str], src: str = 'en', dst: str = 'ru',
+) -> Dict[str, List[Translation]]:
+    """ Translate the lemmas with a few batched queries run by `execute(query, parameters)`,
+    and map each original lemma to its translations """
+    query = translation_query(src, dst, BATCH_SIZE)
+    normalized = {lemma: NORMALIZERS[src](lemma) for lemma in lemmas}
+    found = {}
+    for chunk in chunked(sorted(set(normalized.values())), BATCH_SIZE):
+        found.update(group_translations(execute(query, chunk + [None] * (BATCH_SIZE - len(chunk)))))
+    return {lemma: list(found.get(value, [])) for lemma, value in normalized.items()}
@@ -0,0 +1,108 @@
+"""
+The information content of synsets, estimated from the frequencies of their lemmas in a corpus.
+
+The corpus is streamed in chunks (in parallel, if needed), its words are matched against the lemmas of the senses,
+and each occurrence is split equally between all the synsets of the matched lemma.
+Then each synset gets the counts of all its transitive hyponyms (each of them once, even if it is reachable
+through several paths), and the information content of a synset is -log(its frequency / the total count).
+"""
+import math
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from .annotation import Annotator, map_chunks
+from .utils import get_default_filename
+
+if TYPE_CHECKING:
+    from .taxonomy import Taxonomy
+
+# the information content of a database is looked for in a file with this suffix next to it
+SUFFIX = '.ic.tsv'
+_TOTAL = '#total'
+
+
+def default_filename(database_filename: Optional[str] = None) -> str:
+    """ The file of the information content that is loaded together with a database """
+    return get_default_filename(database_filename) + SUFFIX
+
+
+def count_synsets(
+        documents: Iterable[str], annotator: Annotator, processes: int = 1, chunksize: int = 1000,
+) -> Dict[str, float]:
+    """ Count the occurrences of the synsets in a stream of (tokenised) documents, e.g. the lines of a file.
+    With processes > 1, the chunks of `chunksize` documents are counted in a pool of processes;
+    only a few chunks are read ahead, and the counts take memory proportional to the number of synsets. """
+    if processes <= 1:
+        return _count(annotator, documents)
+    counts = {}
+    for chunk_counts in map_chunks(annotator, _count_in_worker, documents, processes, chunksize):
+        for synset_id, count in chunk_counts.items():
+            counts[synset_id] = counts.get(synset_id, 0.0) + count
+    return counts
+
+
+def _count(annotator: Annotator, documents: Iterable[str]) -> Dict[str, float]:
+    counts = {}
+    for document in documents:
+        for span in annotator.annotate(document):
+            share = 1 / len(span.synset_ids)
+            for synset_id in span.synset_ids:
+                counts[synset_id] = counts.get(synset_id, 0.0) + share
+    return counts
+
+
+def _count_in_worker(documents: List[str]) -> Dict[str, float]:
+    from .annotation import _worker_annotator
+    return _count(_worker_annotator, documents)
+
+
+class InformationContent:
+    """ The corpus frequencies of the synsets, each including the frequencies of all its hyponyms """
+    def __init__(self, frequencies: Dict[str, float], total: float):
+        if total <= 0:
+            raise ValueError('The total count must be positive; was the corpus empty?')
+        self.frequencies = frequencies
+        self.total = total
+
+    @classmethod
+    def from_counts(cls, taxonomy: 'Taxonomy', counts: Dict[str, float], smoothing: float = 1.0):
+        """ Propagate the counts of the synsets to their hypernyms, adding `smoothing` to the count of each synset,
+        so that the synsets absent from the corpus still get a finite information content """
+        graph = taxonomy.graph
+        own = [smoothing] * taxonomy.size
+        for synset_id, count in counts.items():
+            index = graph.index_of(synset_id)
+            if index is not None:
+                own[index] += count
+        propagated = list(own)
+        for index, count in enumerate(own):
+            if count:
+                for hypernym in taxonomy.ancestors(index)[0]:
+                    propagated[hypernym] += count
+        frequencies = {graph.view(index).id: count for index, count in enumerate(propagated) if count}
+        return cls(frequencies, sum(own))
+
+    def __getitem__(self, synset_id: str) -> float:
+        """ The information content of a synset; it is infinite for the synsets that have never been seen """
+        frequency = self.frequencies.get(synset_id, 0.0)
+        return -math.log(frequency / self.total) if frequency else math.inf
+
+    def save(self, filename: str):
+        """ Write the frequencies into a text file with a synset id and its frequency on each line """
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f'{_TOTAL}\t{self.total!r}\n')
+            for synset_id, frequency in sorted(self.frequencies.items()):
+                f.write(f'{synset_id}\t{frequency!r}\n')
+
+    @classmethod
+    def load(cls, filename: str) -> 'InformationContent':
+        """ Read the frequencies written by `save` """
+        frequencies = {}
+        total = 0.0
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                key, value = line.rstrip('\n').split('\t')
+                if key == _TOTAL:
+                    total = float(value)
+                else:
+                    frequencies[key] = float(value)
+        return cls(frequencies, total)
@@ -0,0 +1,265 @@
+"""
+Opt-in instrumentation of the SQL queries issued by RuWordNet.
+
+The engine events measure each statement and count the rows fetched from its cursor,
+and the session events tell which relationship is being loaded.
+Each query is attributed to the public method of RuWordNet that is running (the outermost one, if they are nested)
+and to the relationship that it loads, if any. The statements slower than a threshold are logged,
+and so are the N+1 patterns: the same statement repeated many times within one method call or one measured block.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import partial, wraps
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# the name under which the queries issued outside the public methods (e.g. by lazy relationships) are counted
+OUTSIDE = '(outside)'
+# the name under which the N+1 patterns within the blocks measured with `Instrumentation.measure` are reported
+BLOCK = '(block)'
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.1
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+# the number of the slowest queries kept in the statistics
+SLOW_QUERIES_SIZE = 100
+
+
+class Counts(NamedTuple):
+    calls: int
+    queries: int
+    rows: int
+    seconds: float
+
+
+class SlowQuery(NamedTuple):
+    method: str
+    statement: str
+    seconds: float
+
+
+class NPlusOne(NamedTuple):
+    """ A statement repeated `count` times within one call of a method or one measured block
+    (the largest count is kept) """
+    method: str
+    statement: str
+    count: int
+
+
+class Stats(NamedTuple):
+    total: Counts
+    methods: Dict[str, Counts]
+    relationships: Dict[str, Counts]
+    slow_queries: List[SlowQuery]
+    n_plus_one: List[NPlusOne]
+
+
+class _Collector:
+    """ Accumulates the statistics of the queries """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = [0, 0, 0, 0.0]
+        self.methods: Dict[str, list] = {}
+        self.relationships: Dict[str, list] = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERIES_SIZE)
+        self.n_plus_one: Dict[tuple, int] = {}
+
+    def add(self, method: str, relationship: Optional[str], calls=0, queries=0, rows=0, seconds=0.0):
+        with self._lock:
+            targets = [self.total, self.methods.setdefault(method, [0, 0, 0, 0.0])]
+            if relationship is not None:
+                targets.append(self.relationships.setdefault(relationship, [0, 0, 0, 0.0]))
+            for counts in targets:
+                counts[0] += calls
+                counts[1] += queries
+                counts[2] += rows
+                counts[3] += seconds
+
+    def add_slow_query(self, query: SlowQuery):
+        with self._lock:
+            self.slow_queries.append(query)
+
+    def add_repetitions(self, method: str, repetitions: Counter, threshold: int):
+        with self._lock:
+            for statement, count in repetitions.items():
+                if count >= threshold:
+                    key = method, statement
+                    self.n_plus_one[key] = max(self.n_plus_one.get(key, 0), count)
+
+    def stats(self) -> Stats:
+        with self._lock:
+            return Stats(
+                total=Counts(*self.total),
+                methods={name: Counts(*counts) for name, counts in self.methods.items()},
+                relationships={name: Counts(*counts) for name, counts in self.relationships.items()},
+                slow_queries=sorted(self.slow_queries, key=lambda query: -query.seconds),
+                n_plus_one=[NPlusOne(*key, count) for key, count in self.n_plus_one.items()],
+            )
+
+
+class Instrumentation:
+    """ Collects the statistics of the queries of the engines and sessions it is attached to """
+    def __init__(
+            self, slow_query_threshold: float = DEFAULT_SLOW_QUERY_THRESHOLD,
+            n_plus_one_threshold: int = DEFAULT_N_PLUS_ONE_THRESHOLD,
+    ):
+        """ slow_query_threshold: the statements that run longer than this number of seconds are logged.
+        n_plus_one_threshold: the statements repeated at least this number of times within one call are reported. """
+        self.slow_query_threshold = slow_query_threshold
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._collector = _Collector()
+        self._local = threading.local()
+
+    def attach(self, engine, session_or_factory):
+        """ Listen to the events of an engine, and of a session or a sessionmaker bound to it """
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(session_or_factory, 'do_orm_execute', self._do_orm_execute)
+
+    def stats(self) -> Stats:
+        """ The statistics collected since the creation or the last `reset` """
+        return self._collector.stats()
+
+    def reset(self):
+        self._collector = _Collector()
+
+    @contextmanager
+    def measure(self) -> Iterator['Measurement']:
+        """ Collect the statistics of the queries issued by the current thread within a block:
+        `with wn.measure() as measurement: ...`, and then `measurement.stats()` """
+        measurement = Measurement()
+        collectors = self._state('collectors', [])
+        collectors.append(measurement._collector)
+        try:
+            with self._scope(BLOCK):
+                yield measurement
+        finally:
+            collectors.remove(measurement._collector)
+
+    @contextmanager
+    def call(self, method: str):
+        """ Attribute the queries within the block to a method, unless it is called by another method """
+        if getattr(self._local, 'method', None) is not None:
+            yield
+            return
+        self._local.method = method
+        self._add(calls=1)
+        try:
+            with self._scope(method):
+                yield
+        finally:
+            self._local.method = None
+
+    @contextmanager
+    def _scope(self, name: str):
+        """ Look for the statements repeated within the block """
+        scopes = self._state('scopes', [])
+        statements = Counter()
+        scopes.append(statements)
+        try:
+            yield
+        finally:
+            scopes.pop()
+            for collector in self._collectors():
+                collector.add_repetitions(name, statements, self.n_plus_one_threshold)
+            for statement, count in statements.items():
+                if count >= self.n_plus_one_threshold:
+                    logger.warning('possible N+1 queries: %d identical statements in %s: %s', count, name, statement)
+
+    def _state(self, name: str, default):
+        if not hasattr(self._local, name):
+            setattr(self._local, name, default)
+        return getattr(self._local, name)
+
+    def _collectors(self) -> List[_Collector]:
+        return [self._collector, *self._state('collectors', [])]
+
+    def _add(self, **counts):
+        method = getattr(self._local, 'method', None) or OUTSIDE
+        relationship = getattr(self._local, 'relationship', None)
+        for collector in self._collectors():
+            collector.add(method, relationship, **counts)
+
+    def _before_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault('ruwordnet_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, connection, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - connection.info['ruwordnet_query_start'].pop()
+        self._add(queries=1, seconds=seconds)
+        if context is not None and cursor.description is not None:
+            # the rows are counted as they are fetched, by whichever result reads them (ORM or raw SQL),
+            # and attributed to the method and relationship that issued the statement
+            method = getattr(self._local, 'method', None) or OUTSIDE
+            relationship = getattr(self._local, 'relationship', None)
+            context.cursor = _CountingCursor(cursor, partial(self._add_rows, method, relationship, self._collectors()))
+        for statements in self._state('scopes', []):
+            statements[statement] += 1
+        if seconds > self.slow_query_threshold:
+            method = getattr(self._local, 'method', None) or OUTSIDE
+            logger.warning('slow query (%.3fs) in %s: %s', seconds, method, statement)
+            for collector in self._collectors():
+                collector.add_slow_query(SlowQuery(method, statement, seconds))
+
+    @staticmethod
+    def _add_rows(method: str, relationship: Optional[str], collectors: List[_Collector], rows: int):
+        for collector in collectors:
+            collector.add(method, relationship, rows=rows)
+
+    def _do_orm_execute(self, state):
+        previous = getattr(self._local, 'relationship', None)
+        if state.is_relationship_load:
+            self._local.relationship = str(state.loader_strategy_path[-1])
+        try:
+            return state.invoke_statement()
+        finally:
+            self._local.relationship = previous
+
+
+class _CountingCursor:
+    """ A DB-API cursor that reports the number of the rows fetched from it """
+    def __init__(self, cursor, add_rows: Callable[[int], object]):
+        self._cursor = cursor
+        self._add_rows = add_rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._add_rows(1)
+        return row
+
+    def fetchmany(self, *size):
+        rows = self._cursor.fetchmany(*size)
+        self._add_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._add_rows(len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Measurement:
+    """ The statistics of one block of code measured by `Instrumentation.measure` """
+    def __init__(self):
+        self._collector = _Collector()
+
+    def stats(self) -> Stats:
+        return self._collector.stats()
+
+
+def traced(method):
+    """ Attribute the queries of a public method to its name, if the instrumentation (`self._instrumentation`)
+    is enabled """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._instrumentation is None:
+            return method(self, *args, **kwargs)
+        with self._instrumentation.call(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
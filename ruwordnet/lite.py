@@ -0,0 +1,543 @@
+"""
+A lightweight backend that uses only the standard `sqlite3` module.
+
+It does not import SQLAlchemy, so it starts much faster, which matters for short-lived scripts.
+The results are plain read-only records with the same attribute names as the ORM models;
+their relations are loaded with precompiled SQL statements when they are accessed.
+"""
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import quote
+
+from .annotation import Annotator
+from .cache import CachedLookups, cached
+from .completion import Completions
+from .ili import Translation, group_translations, translate_many, translation_query
+from .utils import (
+    DEFINITION_INDEX, MissingIndexError, chunked, definition_search_query, get_default_filename, normalize_lemma,
+    normalize_en_lemma,
+)
+
+# the number of keys in one `IN (...)` clause; shorter chunks are padded, so that one prepared statement is reused
+BATCH_SIZE = 500
+
+# relation name => (association table, column referring to the owner, column referring to the related object)
+SYNSET_RELATIONS = {
+    'hypernyms': ('hypernym_relation', 'hyponym_id', 'hypernym_id'),
+    'hyponyms': ('hypernym_relation', 'hypernym_id', 'hyponym_id'),
+    'domains': ('domain_relation', 'domain_item_id', 'domain_id'),
+    'domain_items': ('domain_relation', 'domain_id', 'domain_item_id'),
+    'meronyms': ('meronymy_relation', 'holonym_id', 'meronym_id'),
+    'holonyms': ('meronymy_relation', 'meronym_id', 'holonym_id'),
+    'instances': ('instance_relation', 'class_id', 'instance_id'),
+    'classes': ('instance_relation', 'instance_id', 'class_id'),
+    'premises': ('entailment_relation', 'conclusion_id', 'premise_id'),
+    'conclusions': ('entailment_relation', 'premise_id', 'conclusion_id'),
+    'causes': ('cause_relation', 'effect_id', 'cause_id'),
+    'effects': ('cause_relation', 'cause_id', 'effect_id'),
+    'pos_synonyms': ('pos_synonymy_relation', 'right_id', 'left_id'),
+    'pos_synonyms_reverse': ('pos_synonymy_relation', 'left_id', 'right_id'),
+    'antonyms': ('antonymy_relation', 'right_id', 'left_id'),
+    'antonyms_reverse': ('antonymy_relation', 'left_id', 'right_id'),
+    'related': ('related_relation', 'right_id', 'left_id'),
+    'related_reverse': ('related_relation', 'left_id', 'right_id'),
+}
+SENSE_RELATIONS = {
+    'words': ('composition_relation', 'phrase_id', 'word_id'),
+    'phrases': ('composition_relation', 'word_id', 'phrase_id'),
+    'sources': ('derivation_relation', 'derivative_id', 'source_id'),
+    'derivations': ('derivation_relation', 'source_id', 'derivative_id'),
+}
+SYNSET_ILI = ('interlingual_index_relation', 'ruwn_id', 'wn_id')
+WN_SYNSET_ILI = ('interlingual_index_relation', 'wn_id', 'ruwn_id')
+
+
+class Record:
+    """ A read-only row of one of the tables of the thesaurus """
+    __slots__ = ('_wordnet',)
+    table = None
+    columns = ()
+    # relation name => (SQL query, record class, owner attribute passed to the query, whether the result is a list)
+    relations = {}
+
+    def __init__(self, wordnet: 'LiteRuWordNet', *values):
+        self._wordnet = wordnet
+        for column, value in zip(self.columns, values):
+            setattr(self, column, value)
+
+    @property
+    def _key(self):
+        return getattr(self, self.columns[0])
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._key == self._key
+
+    def __hash__(self):
+        return hash((self.table, self._key))
+
+
+class Sense(Record):
+    __slots__ = ('id', 'name', 'lemma', 'synset_id')
+    table = 'sense'
+    columns = __slots__
+
+    def __repr__(self):
+        return 'Sense(id="{}", name="{}")'.format(self.id, self.name)
+
+
+class Synset(Record):
+    __slots__ = ('id', 'title', 'definition', 'part_of_speech')
+    table = 'synset'
+    columns = __slots__
+
+    def __repr__(self):
+        return 'Synset(id="{}", title="{}")'.format(self.id, self.title)
+
+
+class WNSense(Record):
+    __slots__ = ('key', 'name', 'synset_id')
+    table = 'wn_sense'
+    columns = __slots__
+
+    def __repr__(self):
+        return 'WNSense(key="{}", name="{}")'.format(self.key, self.name)
+
+
+class WNSynset(Record):
+    __slots__ = ('id', 'definition')
+    table = 'wn_synset'
+    columns = __slots__
+
+    def __repr__(self):
+        return 'WNSynset(id="{}", definition="{}")'.format(self.id, self.definition)
+
+
+def _select(record_class, alias='t', *extra_columns) -> str:
+    columns = ', '.join([f'{alias}.{column}' for column in record_class.columns] + list(extra_columns))
+    return f'SELECT {columns} FROM {record_class.table} AS {alias}'
+
+
+def _select_related(record_class, association) -> str:
+    table, owner_column, related_column = association
+    return (
+        f'{_select(record_class)} JOIN {table} AS r ON t.{record_class.columns[0]} = r.{related_column} '
+        f'WHERE r.{owner_column} = ?'
+    )
+
+
+def _select_by_lemma(record_class, sense_table: str, lemma_column: str, condition: str) -> str:
+    """ Select the synsets of the senses whose lemma matches the condition, in the order of the senses,
+    together with the lemma """
+    return (
+        f'{_select(record_class, "s", f"t.{lemma_column}")} JOIN {sense_table} AS t ON s.id = t.synset_id '
+        f'WHERE t.{lemma_column} {condition} ORDER BY t.rowid'
+    )
+
+
+Sense.relations = dict(
+    synset=(f'{_select(Synset)} WHERE t.id = ?', Synset, 'synset_id', False),
+    **{name: (_select_related(Sense, association), Sense, 'id', True) for name, association in SENSE_RELATIONS.items()}
+)
+Synset.relations = dict(
+    senses=(f'{_select(Sense)} WHERE t.synset_id = ? ORDER BY t.id', Sense, 'id', True),
+    ili=(_select_related(WNSynset, SYNSET_ILI), WNSynset, 'id', True),
+    **{
+        name: (_select_related(Synset, association), Synset, 'id', True)
+        for name, association in SYNSET_RELATIONS.items()
+    }
+)
+WNSense.relations = dict(synset=(f'{_select(WNSynset)} WHERE t.id = ?', WNSynset, 'synset_id', False))
+WNSynset.relations = dict(
+    senses=(f'{_select(WNSense)} WHERE t.synset_id = ? ORDER BY t.key', WNSense, 'id', True),
+    ili=(_select_related(Synset, WN_SYNSET_ILI), Synset, 'id', True),
+)
+
+
+def _relation_property(name: str) -> property:
+    def getter(self):
+        return self._wordnet.get_related(self, name)
+    getter.__name__ = name
+    return property(getter)
+
+
+for _record_class in (Sense, Synset, WNSense, WNSynset):
+    for _name in _record_class.relations:
+        setattr(_record_class, _name, _relation_property(_name))
+
+
+DIRECTIONS = ('forward', 'backward')
+# a recursive query may walk several association tables at once only since SQLite 3.34
+MULTIPLE_RECURSIVE_SELECTS = sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def traversal_associations(record_class, relations: Iterable[str], direction: str = 'forward') -> List[tuple]:
+    """ The distinct association tables (with the columns of the owner and of the related record, in this order)
+    of the relations of Synset or Sense, walked in the given direction """
+    associations = SYNSET_RELATIONS if record_class is Synset else SENSE_RELATIONS
+    relations = list(relations)
+    unknown = [name for name in relations if name not in associations]
+    if unknown or not relations:
+        raise ValueError(f'Unknown relations {unknown}; please use some of {list(associations)}.')
+    if direction not in DIRECTIONS:
+        raise ValueError(f'Unknown direction "{direction}"; please use one of {list(DIRECTIONS)}.')
+    result = {associations[name] for name in relations}
+    if direction == 'backward':
+        result = {(table, related_column, owner_column) for table, owner_column, related_column in result}
+    return sorted(result)
+
+
+def recursive_traversal(associations: List[tuple], unique: bool) -> bool:
+    """ Whether a walk is done with one recursive `traversal_query`, rather than level by level with `walk_levels`:
+    the recursive query follows every simple path, so it cannot skip the records that were already reached """
+    return not unique and (MULTIPLE_RECURSIVE_SELECTS or len(associations) == 1)
+
+
+def traversal_query(record_class, relations: Iterable[str], direction: str = 'forward') -> str:
+    """ A recursive query that walks the relations (of Synset or Sense) from the :start id, breadth-first,
+    and selects the columns of the reached records with their depth and path (the ids separated by commas).
+    Each simple path is walked once, so the cycles end the walk instead of repeating it;
+    :max_depth (or NULL) limits the depth, and :max_nodes (or -1) the number of the results.
+    Walking several association tables at once needs SQLite 3.34 or newer. """
+    steps = [
+        f"SELECT r.{related_column}, w.depth + 1, w.path || r.{related_column} || ',' "
+        f"FROM walk AS w JOIN {table} AS r ON r.{owner_column} = w.id "
+        f"WHERE (:max_depth IS NULL OR w.depth < :max_depth) "
+        f"AND instr(w.path, ',' || r.{related_column} || ',') = 0"
+        for table, owner_column, related_column in traversal_associations(record_class, relations, direction)
+    ]
+    # the walk is ordered by depth, so it is breadth-first, and it is streamed: the results are computed
+    # only as far as they are fetched (the CROSS JOIN keeps SQLite from materializing the walk first)
+    columns = ', '.join(f't.{column}' for column in record_class.columns)
+    return (
+        f"WITH RECURSIVE walk(id, depth, path) AS (SELECT :start, 0, ',' || :start || ',' "
+        f"UNION ALL {' UNION ALL '.join(steps)} ORDER BY 2) "
+        f"SELECT {columns}, walk.depth, walk.path FROM walk CROSS JOIN {record_class.table} AS t "
+        f"ON t.{record_class.columns[0]} = walk.id WHERE walk.depth > 0 LIMIT :max_nodes"
+    )
+
+
+def traversal_results(rows: Iterable[Tuple[Record, int, str]]) -> Iterator[Tuple[Record, int, Tuple[str, ...]]]:
+    """ Convert the paths of the rows of a `traversal_query` into tuples of ids """
+    for record, depth, path in rows:
+        yield record, depth, tuple(path.strip(',').split(','))
+
+
+def traversal_edges_query(associations: List[tuple], size: int) -> str:
+    """ The query of the (owner id, related id) pairs of the association tables for `size` owner ids
+    (the `?` parameters, repeated for each table) """
+    parameters = ', '.join(['?'] * size)
+    return ' UNION ALL '.join(
+        f'SELECT r.{owner_column}, r.{related_column} FROM {table} AS r WHERE r.{owner_column} IN ({parameters})'
+        for table, owner_column, related_column in associations
+    )
+
+
+def walk_levels(
+        edges: Callable[[List[str]], Iterable[Tuple[str, str]]], records: Callable[[List[str]], Dict[str, Record]],
+        start: str, max_depth: Optional[int] = None, unique: bool = False,
+) -> Iterator[Tuple[Record, int, Tuple[str, ...]]]:
+    """ Walk the relations breadth-first, one level at a time: `edges(ids)` returns the (owner id, related id) pairs
+    of at most BATCH_SIZE ids, and `records(ids)` maps the ids to their records. With `unique`, each record is
+    reached once, by the first of its shortest paths; otherwise, every simple path is walked, as in `traversal_query`.
+    The records of a level are fetched in batches, as far as the results are consumed. """
+    frontier, reached, depth = [(start, (start,))], {start}, 0
+    while frontier and (max_depth is None or depth < max_depth):
+        depth += 1
+        related = defaultdict(list)
+        for chunk in chunked(sorted({id for id, _ in frontier}), BATCH_SIZE):
+            for owner_id, related_id in edges(chunk):
+                related[owner_id].append(related_id)
+        level = []
+        for id, path in frontier:
+            for related_id in related[id]:
+                if related_id in (reached if unique else path):
+                    continue
+                reached.add(related_id)
+                level.append((related_id, path + (related_id,)))
+        for chunk in chunked(level, BATCH_SIZE):
+            found = records(sorted({id for id, _ in chunk}))
+            for id, path in chunk:
+                if id in found:
+                    yield found[id], depth, path
+        frontier = level
+
+
+KEY_KINDS = [
+    # the kinds are numbered as in `models.KeyKind`
+    (Synset, 'id', None),
+    (Sense, 'id', None),
+    (Sense, 'lemma', normalize_lemma),
+    (WNSynset, 'id', None),
+    (WNSense, 'key', None),
+    (WNSense, 'name', normalize_en_lemma),
+]
+KEY_INDEX_QUERY = (
+    'SELECT kind FROM key_index WHERE (key = ? AND kind IN (0, 1, 3, 4)) OR (key = ? AND kind = 2) '
+    'OR (key = ? AND kind = 5) ORDER BY kind LIMIT 1'
+)
+
+
+class LiteRuWordNet(CachedLookups, Completions):
+    """ The same lookup methods as in RuWordNet, implemented with the standard sqlite3 module.
+    Each thread (and each process after a fork) gets its own read-only connection. """
+    _synsets_cached = True
+
+    def __init__(
+            self, filename: Optional[str] = None, cache_size: Optional[int] = None, cache_ttl: Optional[float] = None,
+            read_only: bool = False,
+    ):
+        """ cache_size and cache_ttl set up an LRU cache of the lookups and relations, shared by all threads.
+        read_only: open the file as an immutable SQLite database, which needs no locks, but must not be changed
+        while it is open (e.g. by `conversion.update_from_xml`); otherwise, the connections only read the file,
+        with the usual locking. """
+        self.filename = get_default_filename(filename)
+        self.read_only = read_only
+        self._local = threading.local()
+        # the connections of all threads with the process that opened them, to close them at once
+        self._connections: List[Tuple[int, sqlite3.Connection]] = []
+        self._connections_lock = threading.Lock()
+        self._has_key_index = None
+        self._has_definition_index = None
+        self._create_cache(cache_size, cache_ttl)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ The connection for the current thread """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            uri = f'file:{quote(os.path.abspath(self.filename))}?mode=ro{"&immutable=1" if self.read_only else ""}'
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            with self._connections_lock:
+                self._connections.append((self._local.pid, connection))
+        return connection
+
+    def close(self):
+        """ Close the connection of the current thread """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def close_all(self):
+        """ Close the connections of all threads; call it when the other threads no longer use the object """
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for pid, connection in connections:
+            # the connections inherited from the parent process are left to it
+            if pid == os.getpid():
+                connection.close()
+        self._local.connection = None
+
+    def _fetch(self, record_class, query: str, *parameters) -> list:
+        return [record_class(self, *row) for row in self.connection.execute(query, parameters)]
+
+    def _fetch_one(self, record_class, query: str, *parameters):
+        row = self.connection.execute(query, parameters).fetchone()
+        return record_class(self, *row) if row else None
+
+    @property
+    def synsets(self) -> List[Synset]:
+        """ List of all available synsets """
+        return self._fetch(Synset, _select(Synset))
+
+    @property
+    def senses(self) -> List[Sense]:
+        """ List of all available senses """
+        return self._fetch(Sense, _select(Sense))
+
+    def annotator(self, lemmatize: Optional[Callable[[str], str]] = None) -> Annotator:
+        """ Create an annotator that finds the lemmas of all senses, including multiword ones, in texts """
+        return Annotator(self.connection.execute('SELECT lemma, id, synset_id FROM sense ORDER BY id'), lemmatize)
+
+    def _lemma_counts(self, lang: str):
+        """ Pairs of a lemma and its number of senses, for the autocompletion """
+        table, column = ('sense', 'lemma') if lang == 'ru' else ('wn_sense', 'name')
+        return self.connection.execute(f'SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}').fetchall()
+
+    @cached()
+    def get_related(self, record: Record, relation: str) -> Union[Record, List[Record], None]:
+        """ Load a relation of a record, e.g. get_related(synset, 'hypernyms') """
+        query, record_class, attribute, uselist = type(record).relations[relation]
+        if uselist:
+            return self._fetch(record_class, query, getattr(record, attribute))
+        return self._fetch_one(record_class, query, getattr(record, attribute))
+
+    @cached()
+    def __getitem__(self, item: str) -> Union[Synset, Sense, List[Sense], WNSynset, WNSense, List[WNSense]]:
+        """ Retrieve sense or synset by its id or name (first try Russian, then English).
+        Raise KeyError if nothing is found. """
+        if self._has_key_index is None:
+            # the published databases have no `key_index` table, and a query of a missing table fails to prepare
+            self._has_key_index = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'key_index'"
+            ).fetchone() is not None and self.connection.execute(
+                'SELECT 1 FROM key_index LIMIT 1'
+            ).fetchone() is not None
+        if self._has_key_index:
+            row = self.connection.execute(
+                KEY_INDEX_QUERY, (item, normalize_lemma(item), normalize_en_lemma(item))
+            ).fetchone()
+            kinds = [row[0]] if row else []
+        else:
+            kinds = range(len(KEY_KINDS))
+        for kind in kinds:
+            record_class, column, normalize = KEY_KINDS[kind]
+            query = f'{_select(record_class)} WHERE t.{column} = ?'
+            if normalize:
+                result = self._fetch(record_class, query, normalize(item))
+            else:
+                result = self._fetch_one(record_class, query, item)
+            if result:
+                return result
+        raise KeyError(item)
+
+    @cached(normalize_lemma)
+    def get_senses(self, lemma: str) -> List[Sense]:
+        """ Retrieve a list of senses by a given lemma """
+        return self._fetch(Sense, f'{_select(Sense)} WHERE t.lemma = ?', normalize_lemma(lemma))
+
+    @cached(normalize_lemma)
+    def get_synsets(self, lemma: str) -> List[Synset]:
+        """ Retrieve a list of synsets by a given lemma """
+        return self._fetch(Synset, _select_by_lemma(Synset, 'sense', 'lemma', '= ?'), normalize_lemma(lemma))
+
+    @cached()
+    def get_synset_by_id(self, id: str) -> Optional[Synset]:
+        """ Retrieve a synset by id or return None """
+        return self._fetch_one(Synset, f'{_select(Synset)} WHERE t.id = ?', id)
+
+    @cached()
+    def get_en_synset_by_id(self, id: str) -> Optional[WNSynset]:
+        """ Retrieve a synset by id or return None (English WordNet) """
+        return self._fetch_one(WNSynset, f'{_select(WNSynset)} WHERE t.id = ?', id)
+
+    @cached(normalize_en_lemma)
+    def get_en_senses(self, lemma: str) -> List[WNSense]:
+        """ Retrieve a list of senses by a given lemma (English WordNet) """
+        return self._fetch(WNSense, f'{_select(WNSense)} WHERE t.name = ?', normalize_en_lemma(lemma))
+
+    @cached(normalize_en_lemma)
+    def get_en_synsets(self, lemma: str) -> List[WNSynset]:
+        """ Retrieve a list of synsets by a given lemma (English WordNet) """
+        return self._fetch(WNSynset, _select_by_lemma(WNSynset, 'wn_sense', 'name', '= ?'), normalize_en_lemma(lemma))
+
+    def get_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[Sense]]:
+        """ Retrieve lists of senses for many lemmas at once """
+        return self._get_many(
+            lemmas, normalize_lemma, Sense, f'{_select(Sense, "t", "t.lemma")} WHERE t.lemma IN ({{}})'
+        )
+
+    def get_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[Synset]]:
+        """ Retrieve lists of synsets for many lemmas at once """
+        return self._get_many(lemmas, normalize_lemma, Synset, _select_by_lemma(Synset, 'sense', 'lemma', 'IN ({})'))
+
+    def get_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[Synset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None """
+        found = self._get_many(ids, str, Synset, f'{_select(Synset, "t", "t.id")} WHERE t.id IN ({{}})')
+        return {id: synsets[0] if synsets else None for id, synsets in found.items()}
+
+    def get_en_senses_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSense]]:
+        """ Retrieve lists of senses for many lemmas at once (English WordNet) """
+        return self._get_many(
+            lemmas, normalize_en_lemma, WNSense, f'{_select(WNSense, "t", "t.name")} WHERE t.name IN ({{}})'
+        )
+
+    def get_en_synsets_many(self, lemmas: Iterable[str]) -> Dict[str, List[WNSynset]]:
+        """ Retrieve lists of synsets for many lemmas at once (English WordNet) """
+        return self._get_many(
+            lemmas, normalize_en_lemma, WNSynset, _select_by_lemma(WNSynset, 'wn_sense', 'name', 'IN ({})')
+        )
+
+    def get_en_synsets_by_ids(self, ids: Iterable[str]) -> Dict[str, Optional[WNSynset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None (English WordNet) """
+        found = self._get_many(ids, str, WNSynset, f'{_select(WNSynset, "t", "t.id")} WHERE t.id IN ({{}})')
+        return {id: synsets[0] if synsets else None for id, synsets in found.items()}
+
+    def translate_many(self, lemmas: Iterable[str], src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate many lemmas at once through the interlingual index, from English to Russian (by default)
+        or from Russian to English: each lemma is mapped to the synsets of the other language matched
+        to its synsets, with the lemmas of their senses. It takes a few queries for any number of lemmas. """
+        return translate_many(self.connection.execute, lemmas, src, dst)
+
+    def ili_mapping(self, src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate all the lemmas of the source language at once, e.g. to keep the whole mapping in memory """
+        return group_translations(self.connection.execute(translation_query(src, dst)))
+
+    def traverse(
+            self, start: Union[Synset, str], relations: Iterable[str] = ('hypernyms',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Synset, int, Tuple[str, ...]]]:
+        """ Walk the relations of a synset (or of a synset id) transitively with one recursive query,
+        e.g. relations=['hypernyms', 'classes'], and yield the reached synsets breadth-first,
+        with their depth and path (the ids from the start to the synset), as they are fetched.
+        direction="backward" follows the relations in reverse. Every simple path is yielded, so a synset
+        reachable in several ways is yielded several times; cycles are not followed. With `unique`, each synset
+        is yielded once, with the first of its shortest paths, and the walk goes level by level with batched queries,
+        so it never enumerates the paths. max_depth and max_nodes limit the depth of the walk and the number
+        of the results; the walk stops as soon as the results are no longer consumed. """
+        return self._traverse(Synset, start, relations, direction, max_depth, max_nodes, unique)
+
+    def traverse_senses(
+            self, start: Union[Sense, str], relations: Iterable[str] = ('derivations',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Sense, int, Tuple[str, ...]]]:
+        """ The same as `traverse`, for the relations of senses, e.g. relations=['derivations'] """
+        return self._traverse(Sense, start, relations, direction, max_depth, max_nodes, unique)
+
+    def _traverse(self, record_class, start, relations, direction, max_depth, max_nodes, unique):
+        start = getattr(start, 'id', start)
+        associations = traversal_associations(record_class, relations, direction)
+        if recursive_traversal(associations, unique):
+            parameters = dict(start=start, max_depth=max_depth, max_nodes=-1 if max_nodes is None else max_nodes)
+            rows = self.connection.execute(traversal_query(record_class, relations, direction), parameters)
+            return traversal_results((record_class(self, *row[:-2]), row[-2], row[-1]) for row in rows)
+
+        query = traversal_edges_query(associations, BATCH_SIZE)
+
+        def edges(ids):
+            return self.connection.execute(query, (ids + [None] * (BATCH_SIZE - len(ids))) * len(associations))
+
+        def records(ids):
+            found = self._get_many(ids, str, record_class, f'{_select(record_class, "t", "t.id")} WHERE t.id IN ({{}})')
+            return {id: items[0] for id, items in found.items() if items}
+        return islice(walk_levels(edges, records, start, max_depth, unique), max_nodes)
+
+    def search_definitions(
+            self, query: str, limit: int = 10, pos: Optional[str] = None, lang: Optional[str] = None,
+    ) -> List[Tuple[Union[Synset, WNSynset], float]]:
+        """ Find the synsets whose titles or definitions contain all the words of the query
+        (a word ending with * matches as a prefix), and return them with their BM25 scores, the most relevant first.
+        pos: the part of speech of Russian synsets, e.g. "N"; lang: "ru" or "en" to search in one language only. """
+        sql, parameters = definition_search_query(query, limit, pos=pos, lang=lang)
+        if not parameters['match']:
+            return []
+        if self._has_definition_index is None:
+            self._has_definition_index = self.connection.execute(
+                'SELECT 1 FROM sqlite_master WHERE name = ?', (DEFINITION_INDEX,)
+            ).fetchone() is not None
+        if not self._has_definition_index:
+            raise MissingIndexError(
+                'The database has no full-text index; please rebuild it with conversion.py '
+                'or create the index with ruwordnet.utils.build_definition_index.'
+            )
+        rows = self.connection.execute(sql, parameters).fetchall()
+        synsets = self.get_synsets_by_ids([id for id, lang, _ in rows if lang == 'ru'])
+        en_synsets = self.get_en_synsets_by_ids([id for id, lang, _ in rows if lang == 'en'])
+        return [((synsets if lang == 'ru' else en_synsets)[id], score) for id, lang, score in rows]
+
+    def _get_many(self, keys: Iterable[str], normalize: Callable[[str], str], record_class, query: str):
+        """ Run the query for chunks of the normalized keys, and group the results by the original keys.
+        The query must select the record columns and then the key. """
+        normalized = {key: normalize(key) for key in keys}
+        query = query.format(', '.join(['?'] * BATCH_SIZE))
+        found = defaultdict(list)
+        for chunk in chunked(sorted(set(normalized.values())), BATCH_SIZE):
+            for row in self.connection.execute(query, chunk + [None] * (BATCH_SIZE - len(chunk))):
+                found[row[-1]].append(record_class(self, *row[:-1]))
+        return {key: list(found.get(value, [])) for key, value in normalized.items()}
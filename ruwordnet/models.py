@@ -1,17 +1,24 @@
-from typing import List
+from enum import IntEnum
+from typing import Dict, List, Tuple
 
-from sqlalchemy import Column, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# the version of the schema, stored in `PRAGMA user_version`; older databases are upgraded by `schema.migrate`
+SCHEMA_VERSION = 1
 
+
+# The association tables are clustered by their primary key (WITHOUT ROWID), so the relations are looked up
+# by its first column without touching another b-tree, and the index on the second column covers the reverse ones.
 composition_table = Table(
     'composition_relation',
     Base.metadata,
     Column('word_id', String(), ForeignKey("sense.id"), primary_key=True),
-    Column('phrase_id', String(), ForeignKey("sense.id"), primary_key=True)
+    Column('phrase_id', String(), ForeignKey("sense.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -19,7 +26,8 @@ derivation_table = Table(
     'derivation_relation',
     Base.metadata,
     Column('source_id', String(), ForeignKey("sense.id"), primary_key=True),
-    Column('derivative_id', String(), ForeignKey("sense.id"), primary_key=True)
+    Column('derivative_id', String(), ForeignKey("sense.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -40,7 +48,7 @@ class Sense(Base):
     entry_id=None,
     """
 
-    synset_id: str = Column(String(), ForeignKey('synset.id'))
+    synset_id: str = Column(String(), ForeignKey('synset.id'), index=True)
     synset: 'Synset' = relationship("Synset", back_populates="senses")
 
     words: List['Sense'] = relationship(
@@ -81,7 +89,8 @@ hypernymy_table = Table(
     'hypernym_relation',
     Base.metadata,
     Column('hyponym_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('hypernym_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('hypernym_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -89,7 +98,8 @@ domains_table = Table(
     'domain_relation',
     Base.metadata,
     Column('domain_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('domain_item_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('domain_item_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -97,7 +107,8 @@ meronymy_table = Table(
     'meronymy_relation',
     Base.metadata,
     Column('meronym_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('holonym_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('holonym_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -105,7 +116,8 @@ instances_table = Table(
     'instance_relation',
     Base.metadata,
     Column('instance_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('class_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('class_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -113,7 +125,8 @@ entailment_table = Table(
     'entailment_relation',
     Base.metadata,
     Column('premise_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('conclusion_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('conclusion_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -121,7 +134,8 @@ cause_table = Table(
     'cause_relation',
     Base.metadata,
     Column('cause_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('effect_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('effect_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -129,7 +143,8 @@ pos_synonymy_table = Table(
     'pos_synonymy_relation',
     Base.metadata,
     Column('left_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -137,7 +152,8 @@ antonymy_table = Table(
     'antonymy_relation',
     Base.metadata,
     Column('left_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -145,7 +161,8 @@ related_table = Table(
     'related_relation',
     Base.metadata,
     Column('left_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True)
+    Column('right_id', String(), ForeignKey("synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -153,7 +170,8 @@ ili_table = Table(
     'interlingual_index_relation',
     Base.metadata,
     Column('ruwn_id', String(), ForeignKey("synset.id"), primary_key=True),
-    Column('wn_id', String(), ForeignKey("wn_synset.id"), primary_key=True)
+    Column('wn_id', String(), ForeignKey("wn_synset.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -318,7 +336,7 @@ class WNSense(Base):
     metadata = Base.metadata
     key: str = Column(String(), primary_key=True, index=True)
     name: str = Column(String(), index=True)
-    synset_id: str = Column(String(), ForeignKey('wn_synset.id'))
+    synset_id: str = Column(String(), ForeignKey('wn_synset.id'), index=True)
     synset: 'WNSynset' = relationship("WNSynset", back_populates="senses")
 
     def __repr__(self):
@@ -340,3 +358,37 @@ class WNSynset(Base):
 
     def __repr__(self):
         return 'WNSynset(id="{}", definition="{}")'.format(self.id, self.definition)
+
+
+class KeyKind(IntEnum):
+    """ Kinds of the keys that can be looked up with `RuWordNet.__getitem__`, in the order of priority """
+    SYNSET = 0
+    SENSE = 1
+    LEMMA = 2
+    EN_SYNSET = 3
+    EN_SENSE = 4
+    EN_LEMMA = 5
+
+
+class KeyIndex(Base):
+    """ Every synset id, sense id, normalized lemma and their English counterparts, with the kind of each key.
+    The key itself is the target of the lookup, so one indexed query tells which table to fetch it from. """
+    __tablename__ = 'key_index'
+    metadata = Base.metadata
+    key: str = Column(String(), primary_key=True)
+    kind: int = Column(Integer(), primary_key=True)
+
+    def __repr__(self):
+        return 'KeyIndex(key="{}", kind={})'.format(self.key, KeyKind(self.kind).name)
+
+
+def relation_columns(model) -> Dict[str, Tuple[Table, Column, Column]]:
+    """ Map each many-to-many relationship of a model to (association table, owner column, related column) """
+    result = {}
+    for relationship_property in model.__mapper__.relationships:
+        if relationship_property.secondary is None:
+            continue
+        (_, owner_column), = relationship_property.synchronize_pairs
+        (_, related_column), = relationship_property.secondary_synchronize_pairs
+        result[relationship_property.key] = (relationship_property.secondary, owner_column, related_column)
+    return result
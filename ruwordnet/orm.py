@@ -0,0 +1,469 @@
+"""
+The SQLAlchemy implementation of RuWordNet: the lookups return the ORM models, whose relationships are loaded
+lazily or with a loading profile. SQLAlchemy takes a while to import, so this module is imported only
+when the ORM backend is created.
+"""
+from __future__ import annotations
+
+import os
+from collections import defaultdict
+from itertools import islice
+from typing import TYPE_CHECKING, Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import Integer, String, and_, column, func, or_, select, text
+from sqlalchemy.orm import Session, joinedload, object_session, scoped_session, selectinload, sessionmaker
+
+from . import information_content, lite
+from .annotation import Annotator
+from .cache import CachedLookups, cached
+from .completion import Completions
+from .graph import RuWordNetGraph
+from .ili import Translation, group_translations, translate_many, translation_query
+from .instrumentation import Instrumentation, Measurement, Stats, traced
+from .lite import (
+    recursive_traversal, traversal_associations, traversal_edges_query, traversal_query, traversal_results,
+    walk_levels,
+)
+from .models import KeyIndex, KeyKind, Sense, Synset, WNSynset, WNSense
+from .ruwordnet import RuWordNet
+from .utils import (
+    DEFINITION_INDEX, MissingIndexError, chunked, definition_search_query, get_default_engine, normalize_lemma,
+    normalize_en_lemma,
+)
+
+if TYPE_CHECKING:
+    from .taxonomy import Taxonomy
+
+
+# the number of keys in one `IN (...)` clause; it is safely below the default SQLite limit on query parameters
+BATCH_SIZE = 500
+# the number of connections kept open in the "thread" concurrency mode, unless specified explicitly
+DEFAULT_POOL_SIZE = 5
+# loading profile => the relationships loaded together with the found objects (None means all of them)
+LOADING_PROFILES = {
+    'minimal': (),
+    'taxonomy': ('synset', 'senses', 'hypernyms', 'hyponyms'),
+    'full': None,
+}
+
+
+class OrmRuWordNet(RuWordNet, CachedLookups, Completions):
+    """ The thesaurus backed by the SQLAlchemy models; it is created by `RuWordNet(..., backend="orm")` """
+    _instrumentation: Optional[Instrumentation] = None
+
+    def __init__(
+            self, filename_or_session=None, concurrency=None, read_only=False, pool_size=None, backend='orm',
+            cache_size=None, cache_ttl=None, profile='minimal', instrument=False,
+    ):
+        """ Open the thesaurus with SQLAlchemy; see `RuWordNet` for the arguments """
+        if concurrency not in {None, 'thread'}:
+            raise ValueError(f'Unknown concurrency mode "{concurrency}"; please use None or "thread".')
+        if cache_size and concurrency == 'thread':
+            # the ORM objects belong to the session of one thread, so they cannot be shared through the cache
+            raise ValueError('The cache cannot be used in the "thread" mode; please use backend="sqlite" instead.')
+        if profile not in LOADING_PROFILES:
+            raise ValueError(f'Unknown loading profile "{profile}"; please use one of {list(LOADING_PROFILES)}.')
+        self.profile = profile
+        self._create_cache(cache_size, cache_ttl)
+        self._instrumentation = Instrumentation() if instrument is True else (instrument or None)
+        self._pid = None
+        self._engine = None
+        if filename_or_session is None or isinstance(filename_or_session, str):
+            self._filename = filename_or_session
+            self._concurrency = concurrency
+            self._read_only = read_only
+            self._pool_size = pool_size or (DEFAULT_POOL_SIZE if concurrency == 'thread' else None)
+            self._connect()
+        elif concurrency is not None:
+            raise ValueError('The concurrency mode can be set only if the database is opened from a file.')
+        else:
+            self._session = filename_or_session
+            if self._instrumentation is not None:
+                self._instrumentation.attach(filename_or_session.get_bind(), filename_or_session)
+        self._has_key_index = None
+        self._has_definition_index = None
+
+    def _create_cache(self, cache_size: Optional[int], cache_ttl: Optional[float]):
+        super()._create_cache(cache_size, cache_ttl)
+        # id of a cached object => [the object, the number of cache entries holding it]
+        self._cached_objects: Dict[int, list] = {}
+        if self._cache is not None:
+            self._cache.on_put, self._cache.on_evict = self._hold_cached, self._release_cached
+
+    def _hold_cached(self, value):
+        for obj in value if isinstance(value, list) else [value]:
+            if obj is not None:
+                self._cached_objects.setdefault(id(obj), [obj, 0])[1] += 1
+
+    def _release_cached(self, value):
+        """ Detach the objects that are no longer held by any cache entry from the session,
+        so that its identity map does not keep them (and the relations loaded through them) """
+        for obj in value if isinstance(value, list) else [value]:
+            entry = self._cached_objects.get(id(obj))
+            if entry is None:
+                continue
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._cached_objects[id(obj)]
+                session = object_session(obj)
+                if session is not None:
+                    session.expunge(obj)
+
+    def cache_clear(self):
+        super().cache_clear()
+        self._cached_objects.clear()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._engine = get_default_engine(self._filename, read_only=self._read_only, pool_size=self._pool_size)
+        factory = sessionmaker(bind=self._engine)
+        if self._instrumentation is not None:
+            self._instrumentation.attach(self._engine, factory)
+        self._session = scoped_session(factory) if self._concurrency == 'thread' else factory()
+        self.cache_clear()
+
+    @property
+    def session(self) -> Session:
+        """ The SQLAlchemy session for the current thread and process """
+        if self._pid is not None and self._pid != os.getpid():
+            # the connections inherited from the parent process are left to the parent
+            self._engine.dispose(close=False)
+            self._connect()
+        if isinstance(self._session, scoped_session):
+            return self._session()
+        return self._session
+
+    @session.setter
+    def session(self, session: Session):
+        self._pid = None
+        self._session = session
+        if self._instrumentation is not None:
+            self._instrumentation.attach(session.get_bind(), session)
+        self.cache_clear()
+
+    def close(self):
+        """ Close the session of the current thread, returning its connection to the pool.
+        In the "thread" mode, it is worth calling at the end of each thread or request. """
+        if isinstance(self._session, scoped_session):
+            self._session.remove()
+        else:
+            self._session.close()
+
+    def stats(self) -> Stats:
+        """ The numbers of calls, queries and rows, and the time of the queries, in total and by public method
+        and by relationship, together with the slowest queries and the N+1 patterns (if `instrument` is enabled) """
+        return self._require_instrumentation().stats()
+
+    def measure(self) -> ContextManager[Measurement]:
+        """ Measure the queries of one block of code in the current thread (if `instrument` is enabled):
+        `with wn.measure() as measurement: ...`, and then `measurement.stats()` """
+        return self._require_instrumentation().measure()
+
+    def _require_instrumentation(self) -> Instrumentation:
+        if self._instrumentation is None:
+            raise ValueError('The instrumentation is disabled; please create RuWordNet with instrument=True.')
+        return self._instrumentation
+
+    @property
+    @traced
+    def synsets(self) -> List[Synset]:
+        """ List of all available synsets, loaded with the default profile """
+        return self.session.query(Synset).options(*self._loading_options(Synset)).all()
+
+    @property
+    @traced
+    def senses(self) -> List[Sense]:
+        """ List of all available senses, loaded with the default profile """
+        return self.session.query(Sense).options(*self._loading_options(Sense)).all()
+
+    @traced
+    def _lemma_counts(self, lang: str):
+        """ Pairs of a lemma and its number of senses, for the autocompletion """
+        column = Sense.lemma if lang == 'ru' else WNSense.name
+        return self.session.query(column, func.count()).group_by(column).all()
+
+    @traced
+    def taxonomy(self, instances: bool = False) -> Taxonomy:
+        """ Load a snapshot of the thesaurus and build the reachability index of its hypernymy hierarchy,
+        for is-a checks and transitive hypernyms and hyponyms without queries. It takes a while, so keep the result.
+        If the information content was computed for the database file (see `ruwordnet ic`), it is loaded as well. """
+        taxonomy = self.snapshot().taxonomy(instances=instances)
+        if self._engine is not None:
+            filename = information_content.default_filename(self._filename)
+            if os.path.exists(filename):
+                taxonomy.load_information_content(filename)
+        return taxonomy
+
+    @traced
+    def annotator(self, lemmatize: Optional[Callable[[str], str]] = None) -> Annotator:
+        """ Create an annotator that finds the lemmas of all senses, including multiword ones, in texts """
+        return Annotator(self.session.query(Sense.lemma, Sense.id, Sense.synset_id).order_by(Sense.id), lemmatize)
+
+    @traced
+    def snapshot(self) -> RuWordNetGraph:
+        """ Load the whole thesaurus into memory, for fast traversal of relations without SQL queries """
+        return RuWordNetGraph.from_session(self.session)
+
+    @traced
+    @cached()
+    def __getitem__(self, item: str) -> Union[Synset, Sense, List[Sense], WNSynset, WNSense, List[WNSense]]:
+        """ Retrieve sense or synset by its id or name (first try Russian, then English).
+        Raise KeyError if nothing is found. """
+        if self._has_key_index is None:
+            # the read-only engine does not create the tables, so the `key_index` table may be missing
+            self._has_key_index = self.session.execute(
+                text('SELECT 1 FROM sqlite_master WHERE type = :type AND name = :name'),
+                dict(type='table', name=KeyIndex.__tablename__),
+            ).first() is not None and self.session.query(KeyIndex.key).first() is not None
+        if not self._has_key_index:
+            return self._getitem_sequentially(item)
+
+        kind = self.session.query(KeyIndex.kind).filter(or_(
+            and_(KeyIndex.key == item, KeyIndex.kind.in_(
+                [KeyKind.SYNSET, KeyKind.SENSE, KeyKind.EN_SYNSET, KeyKind.EN_SENSE]
+            )),
+            and_(KeyIndex.key == normalize_lemma(item), KeyIndex.kind == KeyKind.LEMMA),
+            and_(KeyIndex.key == normalize_en_lemma(item), KeyIndex.kind == KeyKind.EN_LEMMA),
+        )).order_by(KeyIndex.kind).limit(1).scalar()
+        if kind is None:
+            raise KeyError(item)
+        getters = {
+            KeyKind.SYNSET: self.get_synset_by_id,
+            KeyKind.SENSE: lambda id: self._get_by_key(Sense, id=id),
+            KeyKind.LEMMA: self.get_senses,
+            KeyKind.EN_SYNSET: self.get_en_synset_by_id,
+            KeyKind.EN_SENSE: lambda key: self._get_by_key(WNSense, key=key),
+            KeyKind.EN_LEMMA: self.get_en_senses,
+        }
+        return getters[kind](item)
+
+    def _getitem_sequentially(self, item: str):
+        """ Try all kinds of keys one by one; used for the databases without the `key_index` table """
+        synset = self.get_synset_by_id(item)
+        if synset:
+            return synset
+        sense = self._get_by_key(Sense, id=item)
+        if sense:
+            return sense
+
+        senses = self.get_senses(item)
+        if senses:
+            return senses
+
+        en_synset = self.get_en_synset_by_id(item)
+        if en_synset:
+            return en_synset
+
+        en_sense = self._get_by_key(WNSense, key=item)
+        if en_sense:
+            return en_sense
+
+        en_senses = self.get_en_senses(item)
+        if en_senses:
+            return en_senses
+
+        raise KeyError(item)
+
+    @traced
+    @cached(normalize_lemma)
+    def get_senses(self, lemma: str, profile: Optional[str] = None) -> List[Sense]:
+        """ Retrieve a list of senses by a given lemma """
+        q = normalize_lemma(lemma)
+        return self.session.query(Sense).options(*self._loading_options(Sense, profile)).filter_by(lemma=q).all()
+
+    @traced
+    def get_synsets(self, lemma: str, profile: Optional[str] = None) -> List[Synset]:
+        """ Retrieve a list of synsets by a given lemma """
+        return [sense.synset for sense in self.get_senses(lemma, profile=profile) if sense.synset]
+
+    @traced
+    @cached()
+    def get_synset_by_id(self, id: str, profile: Optional[str] = None) -> Optional[Synset]:
+        """ Retrieve a synset by id or return None """
+        return self._get_by_key(Synset, profile, id=id)
+
+    @traced
+    @cached()
+    def get_en_synset_by_id(self, id: str, profile: Optional[str] = None) -> Optional[WNSynset]:
+        """ Retrieve a synset by id or return None (English WordNet) """
+        return self._get_by_key(WNSynset, profile, id=id)
+
+    @traced
+    @cached(normalize_en_lemma)
+    def get_en_senses(self, lemma: str, profile: Optional[str] = None) -> List[WNSense]:
+        """ Retrieve a list of senses by a given lemma (English WordNet) """
+        q = normalize_en_lemma(lemma)
+        return self.session.query(WNSense).options(*self._loading_options(WNSense, profile)).filter_by(name=q).all()
+
+    @traced
+    def get_en_synsets(self, lemma: str, profile: Optional[str] = None) -> List[WNSynset]:
+        """ Retrieve a list of synsets by a given lemma (English WordNet) """
+        return [sense.synset for sense in self.get_en_senses(lemma, profile=profile) if sense.synset]
+
+    def _get_by_key(self, model, profile: Optional[str] = None, **key):
+        return self.session.query(model).options(*self._loading_options(model, profile)).filter_by(**key).first()
+
+    def _loading_options(self, model, profile: Optional[str] = None) -> list:
+        """ The query options that load the relationships of the profile together with the objects of the model.
+        The collections are loaded with one extra query each, and the single objects with a join;
+        for the latter (e.g. the synset of a sense), the collections of the profile are loaded as well. """
+        profile = profile or self.profile
+        if profile not in LOADING_PROFILES:
+            raise ValueError(f'Unknown loading profile "{profile}"; please use one of {list(LOADING_PROFILES)}.')
+        names = LOADING_PROFILES[profile]
+        options = []
+        for relationship in model.__mapper__.relationships:
+            if names is not None and relationship.key not in names:
+                continue
+            attribute = getattr(model, relationship.key)
+            if relationship.uselist:
+                options.append(selectinload(attribute))
+                continue
+            options.append(joinedload(attribute))
+            target = relationship.mapper.class_
+            for nested in target.__mapper__.relationships:
+                if nested.uselist and (names is None or nested.key in names):
+                    options.append(joinedload(attribute).selectinload(getattr(target, nested.key)))
+        return options
+
+    @traced
+    def get_senses_many(self, lemmas: Iterable[str], profile: Optional[str] = None) -> Dict[str, List[Sense]]:
+        """ Retrieve lists of senses for many lemmas at once, with their synsets preloaded """
+        return self._get_many(lemmas, normalize_lemma, Sense, Sense.lemma, profile, Sense.synset)
+
+    @traced
+    def get_synsets_many(self, lemmas: Iterable[str], profile: Optional[str] = None) -> Dict[str, List[Synset]]:
+        """ Retrieve lists of synsets for many lemmas at once """
+        return {
+            lemma: [sense.synset for sense in senses if sense.synset]
+            for lemma, senses in self.get_senses_many(lemmas, profile=profile).items()
+        }
+
+    @traced
+    def get_synsets_by_ids(self, ids: Iterable[str], profile: Optional[str] = None) -> Dict[str, Optional[Synset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None """
+        return {
+            id: synsets[0] if synsets else None
+            for id, synsets in self._get_many(ids, str, Synset, Synset.id, profile).items()
+        }
+
+    @traced
+    def get_en_senses_many(self, lemmas: Iterable[str], profile: Optional[str] = None) -> Dict[str, List[WNSense]]:
+        """ Retrieve lists of senses for many lemmas at once, with their synsets preloaded (English WordNet) """
+        return self._get_many(lemmas, normalize_en_lemma, WNSense, WNSense.name, profile, WNSense.synset)
+
+    @traced
+    def get_en_synsets_many(self, lemmas: Iterable[str], profile: Optional[str] = None) -> Dict[str, List[WNSynset]]:
+        """ Retrieve lists of synsets for many lemmas at once (English WordNet) """
+        return {
+            lemma: [sense.synset for sense in senses if sense.synset]
+            for lemma, senses in self.get_en_senses_many(lemmas, profile=profile).items()
+        }
+
+    @traced
+    def get_en_synsets_by_ids(
+            self, ids: Iterable[str], profile: Optional[str] = None,
+    ) -> Dict[str, Optional[WNSynset]]:
+        """ Retrieve many synsets by their ids at once; the missing ones are mapped to None (English WordNet) """
+        return {
+            id: synsets[0] if synsets else None
+            for id, synsets in self._get_many(ids, str, WNSynset, WNSynset.id, profile).items()
+        }
+
+    @traced
+    def translate_many(self, lemmas: Iterable[str], src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate many lemmas at once through the interlingual index, from English to Russian (by default)
+        or from Russian to English: each lemma is mapped to the synsets of the other language matched
+        to its synsets, with the lemmas of their senses. It takes a few queries for any number of lemmas. """
+        return translate_many(self._execute, lemmas, src, dst)
+
+    @traced
+    def ili_mapping(self, src: str = 'en', dst: str = 'ru') -> Dict[str, List[Translation]]:
+        """ Translate all the lemmas of the source language at once, e.g. to keep the whole mapping in memory """
+        return group_translations(self._execute(translation_query(src, dst)))
+
+    def _execute(self, query: str, parameters: list = ()):
+        """ Run a raw SQL query with `?` parameters on the connection of the session """
+        return self.session.connection().exec_driver_sql(query, tuple(parameters))
+
+    def traverse(
+            self, start: Union[Synset, str], relations: Iterable[str] = ('hypernyms',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Synset, int, Tuple[str, ...]]]:
+        """ Walk the relations of a synset (or of a synset id) transitively with one recursive query,
+        e.g. relations=['hypernyms', 'classes'], and yield the reached synsets breadth-first,
+        with their depth and path (the ids from the start to the synset), as they are fetched.
+        direction="backward" follows the relations in reverse. Every simple path is yielded, so a synset
+        reachable in several ways is yielded several times; cycles are not followed. With `unique`, each synset
+        is yielded once, with the first of its shortest paths, and the walk goes level by level with batched queries,
+        so it never enumerates the paths. max_depth and max_nodes limit the depth of the walk and the number
+        of the results; the walk stops as soon as the results are no longer consumed. """
+        return self._traverse(Synset, lite.Synset, start, relations, direction, max_depth, max_nodes, unique)
+
+    def traverse_senses(
+            self, start: Union[Sense, str], relations: Iterable[str] = ('derivations',), direction: str = 'forward',
+            max_depth: Optional[int] = None, max_nodes: Optional[int] = None, unique: bool = False,
+    ) -> Iterator[Tuple[Sense, int, Tuple[str, ...]]]:
+        """ The same as `traverse`, for the relations of senses, e.g. relations=['derivations'] """
+        return self._traverse(Sense, lite.Sense, start, relations, direction, max_depth, max_nodes, unique)
+
+    def _traverse(self, model, record_class, start, relations, direction, max_depth, max_nodes, unique):
+        start = getattr(start, 'id', start)
+        associations = traversal_associations(record_class, relations, direction)
+        if recursive_traversal(associations, unique):
+            statement = text(traversal_query(record_class, relations, direction)).columns(
+                *model.__table__.columns, column('depth', Integer), column('path', String),
+            )
+            query = select(model, statement.selected_columns.depth, statement.selected_columns.path)
+            parameters = dict(start=start, max_depth=max_depth, max_nodes=-1 if max_nodes is None else max_nodes)
+            rows = self.session.execute(
+                query.from_statement(statement).execution_options(stream_results=True, yield_per=BATCH_SIZE),
+                parameters,
+            )
+            return traversal_results(rows)
+
+        query = traversal_edges_query(associations, BATCH_SIZE)
+
+        def edges(ids):
+            return self._execute(query, (ids + [None] * (BATCH_SIZE - len(ids))) * len(associations))
+
+        def records(ids):
+            return {id: items[0] for id, items in self._get_many(ids, str, model, model.id, None).items() if items}
+        return islice(walk_levels(edges, records, start, max_depth, unique), max_nodes)
+
+    @traced
+    def search_definitions(
+            self, query: str, limit: int = 10, pos: Optional[str] = None, lang: Optional[str] = None,
+    ) -> List[Tuple[Union[Synset, WNSynset], float]]:
+        """ Find the synsets whose titles or definitions contain all the words of the query
+        (a word ending with * matches as a prefix), and return them with their BM25 scores, the most relevant first.
+        pos: the part of speech of Russian synsets, e.g. "N"; lang: "ru" or "en" to search in one language only. """
+        sql, parameters = definition_search_query(query, limit, pos=pos, lang=lang)
+        if not parameters['match']:
+            return []
+        if self._has_definition_index is None:
+            self._has_definition_index = self.session.execute(
+                text('SELECT 1 FROM sqlite_master WHERE name = :name'), dict(name=DEFINITION_INDEX)
+            ).first() is not None
+        if not self._has_definition_index:
+            raise MissingIndexError(
+                'The database has no full-text index; please rebuild it with conversion.py '
+                'or create the index with ruwordnet.utils.build_definition_index.'
+            )
+        rows = self.session.execute(text(sql), parameters).fetchall()
+        synsets = self.get_synsets_by_ids([id for id, lang, _ in rows if lang == 'ru'])
+        en_synsets = self.get_en_synsets_by_ids([id for id, lang, _ in rows if lang == 'en'])
+        return [((synsets if lang == 'ru' else en_synsets)[id], score) for id, lang, score in rows]
+
+    def _get_many(
+            self, keys: Iterable[str], normalize: Callable[[str], str], model, column, profile: Optional[str], *eager,
+    ) -> Dict[str, list]:
+        """ Look up many keys with a few `IN (...)` queries, and group the results by the original keys """
+        normalized = {key: normalize(key) for key in keys}
+        options = [joinedload(attribute) for attribute in eager] + self._loading_options(model, profile)
+        found = defaultdict(list)
+        for chunk in chunked(sorted(set(normalized.values())), BATCH_SIZE):
+            query = self.session.query(model).options(*options)
+            for item in query.filter(column.in_(chunk)):
+                found[getattr(item, column.key)].append(item)
+        return {key: list(found.get(value, [])) for key, value in normalized.items()}
@@ -1,78 +1,81 @@
-from typing import List, Optional, Union
-from .models import Sense, Synset, WNSynset, WNSense
-from .utils import get_default_session
+"""
+The entry point of the thesaurus, which opens it with one of the backends.
+"""
+from .compiled import CompiledRuWordNet, is_compiled
+from .lite import LiteRuWordNet
+
+# the options of the ORM backend with their default values, in the order of the positional arguments
+OPTIONS = dict(
+    concurrency=None, read_only=False, pool_size=None, backend='orm', cache_size=None, cache_ttl=None,
+    profile='minimal', instrument=False,
+)
+# the options supported by the other backends
+LITE_OPTIONS = ('cache_size', 'cache_ttl', 'read_only')
+COMPILED_OPTIONS = ('cache_size', 'cache_ttl')
 
 
 class RuWordNet:
-    def __init__(self, filename_or_session=None):
-        if filename_or_session is None:
-            session = get_default_session()
-        elif isinstance(filename_or_session, str):
-            session = get_default_session(filename_or_session)
-        else:
-            session = filename_or_session
-        self.session = session
-
-    @property
-    def synsets(self) -> List[Sense]:
-        """ List of all available synsets """
-        return self.session.query(Synset).all()
-
-    @property
-    def senses(self) -> List[Sense]:
-        """ List of all available senses """
-        return self.session.query(Sense).all()
-
-    def __getitem__(self, item: str) -> Union[Synset, Sense, List[Sense], WNSynset, WNSense, List[WNSense]]:
-        """ Retrieve sense or synset by its id or name (first try Russian, then English).
-        Raise KeyError if nothing is found. """
-        synset = self.get_synset_by_id(item)
-        if synset:
-            return synset
-        sense = self.session.query(Sense).filter_by(id=item).first()
-        if sense:
-            return sense
-
-        senses = self.get_senses(item)
-        if senses:
-            return senses
-
-        en_synset = self.get_en_synset_by_id(item)
-        if en_synset:
-            return en_synset
-
-        en_sense = self.session.query(WNSense).filter_by(key=item).first()
-        if en_sense:
-            return en_sense
-
-        en_senses = self.get_en_senses(item)
-        if en_senses:
-            return en_senses
-
-        raise KeyError()
-
-    def get_senses(self, lemma: str) -> List[Sense]:
-        """ Retrieve a list of senses by a given lemma """
-        q = lemma.upper().strip()
-        return self.session.query(Sense).filter_by(lemma=q).all()
-
-    def get_synsets(self, lemma: str) -> List[Synset]:
-        """ Retrieve a list of synsets by a given lemma """
-        return [sense.synset for sense in self.get_senses(lemma) if sense.synset]
-
-    def get_synset_by_id(self, id: str) -> Optional[Synset]:
-        """ Retrieve a synset by id or return None """
-        return self.session.query(Synset).filter_by(id=id).first()
-
-    def get_en_synset_by_id(self, id: str) -> Optional[WNSynset]:
-        """ Retrieve a synset by id or return None (English WordNet) """
-        return self.session.query(WNSynset).filter_by(id=id).first()
-
-    def get_en_senses(self, lemma: str) -> List[WNSense]:
-        """ Retrieve a list of senses by a given lemma (English WordNet) """
-        q = lemma.lower().strip().replace(' ', '_')
-        return self.session.query(WNSense).filter_by(name=q).all()
-
-    def get_en_synsets(self, lemma: str) -> List[WNSynset]:
-        """ Retrieve a list of synsets by a given lemma (English WordNet) """
-        return [sense.synset for sense in self.get_en_senses(lemma) if sense.synset]
+    """ The thesaurus, opened from a database file (the downloaded one by default) or from a SQLAlchemy session.
+    Creating it returns the implementation of the backend: an `OrmRuWordNet`, which is a subclass of RuWordNet,
+    or a `LiteRuWordNet` or a `CompiledRuWordNet`, which are not, but have the same lookup methods.
+    The options that the backend does not support raise a ValueError, unless they keep their default values.
+
+    backend: "orm" to use SQLAlchemy, or "sqlite" to use the lightweight `LiteRuWordNet`, which does not import
+        SQLAlchemy at all, returns plain records and always opens the file read-only with a connection per thread.
+        A compiled file (see `ruwordnet compile`) is always opened as a memory-mapped `CompiledRuWordNet`,
+        with the same records as the "sqlite" backend, whatever the backend.
+
+    concurrency: None to use one session, or "thread" to use a separate session in each thread.
+    read_only: open the file as an immutable read-only SQLite database, which needs no locks,
+        but must not be changed while it is open.
+    pool_size: the number of connections kept open (by default, 5 in the "thread" mode and none otherwise).
+
+    If the database is opened from a file, the engine is re-created in the child processes after a fork,
+    so that the parent's connections are never reused.
+
+    cache_size: the number of lookup results kept in an LRU cache (no caching by default).
+        The cached objects keep their loaded relations, so the relation accessors are not repeated either.
+        With the ORM backend, the objects of the discarded results are detached from the session,
+        unless another cached result holds them.
+    cache_ttl: the number of seconds after which a cached result is discarded (never by default).
+
+    profile: the default loading profile of the lookup methods, one of `orm.LOADING_PROFILES`:
+        "minimal" loads the relationships lazily, one query per attribute per object when it is accessed;
+        "taxonomy" loads the synsets, senses, hypernyms and hyponyms of the found objects in advance;
+        "full" loads all the relationships of the found objects, so that they can be serialized
+        with their neighbourhood in a fixed number of queries.
+        Most lookup methods also accept a profile for one call.
+
+    instrument: True or an `Instrumentation` object to collect the statistics of the SQL queries
+        of each public method and relationship, and to log the slow queries and the N+1 patterns;
+        see `stats` and `measure`.
+    """
+
+    def __new__(cls, filename_or_session=None, *args, **kwargs):
+        if cls is not RuWordNet:
+            return super().__new__(cls)
+        if len(args) > len(OPTIONS):
+            raise TypeError(f'RuWordNet takes at most {len(OPTIONS) + 1} positional arguments.')
+        options = dict(zip(OPTIONS, args))
+        for name, value in kwargs.items():
+            if name not in OPTIONS or name in options:
+                raise TypeError(f'RuWordNet got an unexpected or repeated argument "{name}".')
+            options[name] = value
+        backend = options.pop('backend', 'orm')
+        if isinstance(filename_or_session, str) and is_compiled(filename_or_session):
+            return CompiledRuWordNet(filename_or_session, **_backend_options('compiled', options, COMPILED_OPTIONS))
+        if backend == 'sqlite':
+            return LiteRuWordNet(filename_or_session, **_backend_options(backend, options, LITE_OPTIONS))
+        if backend != 'orm':
+            raise ValueError(f'Unknown backend "{backend}"; please use "orm" or "sqlite".')
+        # SQLAlchemy is imported only here; the object is a subclass, so its __init__ gets the same arguments
+        from .orm import OrmRuWordNet
+        return super().__new__(OrmRuWordNet)
+
+
+def _backend_options(backend: str, options: dict, supported) -> dict:
+    """ The options passed to the backend; the other options must keep their default values """
+    ignored = [name for name, value in options.items() if name not in supported and value != OPTIONS[name]]
+    if ignored:
+        raise ValueError(f'The options {ignored} are not supported by the "{backend}" backend.')
+    return {name: value for name, value in options.items() if name in supported}
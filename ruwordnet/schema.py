@@ -0,0 +1,106 @@
+"""
+The version of the database schema, the in-place migration of older databases, and the check of the query plans.
+
+The version is stored in `PRAGMA user_version`: 0 is the original schema, where the association tables
+were ordinary tables indexed only by their primary key, and `models.SCHEMA_VERSION` is the current one.
+"""
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import event, select, text
+from sqlalchemy.schema import CreateTable
+
+from .lite import Sense as LiteSense, Synset as LiteSynset, WNSense as LiteWNSense, WNSynset as LiteWNSynset
+from .models import SCHEMA_VERSION, Base, Sense, Synset, WNSense, WNSynset
+
+
+class QueryPlan(NamedTuple):
+    backend: str
+    relationship: str
+    statement: str
+    plan: List[str]
+
+    @property
+    def full_scans(self) -> List[str]:
+        """ The steps of the plan that read a whole table or index """
+        return [step for step in self.plan if step.startswith('SCAN ') and step != 'SCAN CONSTANT ROW']
+
+
+def get_version(connection) -> int:
+    return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def migrate(connection, log: Callable[[str], None] = print) -> int:
+    """ Upgrade the schema of a database to the current version in place, within the transaction of the connection.
+    Return the version of the database before the migration. """
+    version = get_version(connection)
+    if version > SCHEMA_VERSION:
+        raise ValueError(
+            f'The database has the schema version {version}, which is newer than this library supports '
+            f'({SCHEMA_VERSION}); please upgrade ruwordnet.'
+        )
+    if version < 1:
+        for table in Base.metadata.sorted_tables:
+            if table.dialect_options['sqlite']['with_rowid'] is not False:
+                continue
+            sql = connection.execute(
+                text('SELECT sql FROM sqlite_master WHERE type = :type AND name = :name'),
+                {'type': 'table', 'name': table.name},
+            ).scalar()
+            if sql is None or 'WITHOUT ROWID' in sql.upper():
+                continue
+            # SQLite cannot change a table into a WITHOUT ROWID one, so the table is rebuilt
+            connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO old_{table.name}')
+            connection.execute(CreateTable(table))
+            connection.exec_driver_sql(f'INSERT INTO {table.name} SELECT * FROM old_{table.name}')
+            connection.exec_driver_sql(f'DROP TABLE old_{table.name}')
+            log(f'rebuilt {table.name} as a WITHOUT ROWID table')
+    Base.metadata.create_all(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    connection.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    if version < SCHEMA_VERSION:
+        log(f'migrated the database from the schema version {version} to {SCHEMA_VERSION}')
+    return version
+
+
+def explain(connection, statement: str, parameters=()) -> List[str]:
+    """ The steps of the query plan of a statement """
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+
+
+def check_query_plans(session) -> List[QueryPlan]:
+    """ Explain the query of each relationship of the ORM models, as it is loaded lazily,
+    and of each relation of the records of the sqlite3 backend. The relationships of the models
+    with no rows cannot be loaded, so they are skipped. """
+    connection = session.connection()
+    plans = []
+    for model in (Synset, Sense, WNSynset, WNSense):
+        key = session.execute(select(model.__mapper__.primary_key[0]).limit(1)).scalar()
+        if key is None:
+            continue
+        for relationship_property in model.__mapper__.relationships:
+            session.expunge_all()
+            instance = session.get(model, key)
+            statements = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                statements.append((statement, parameters))
+
+            event.listen(session.bind, 'before_cursor_execute', capture)
+            try:
+                getattr(instance, relationship_property.key)
+            finally:
+                event.remove(session.bind, 'before_cursor_execute', capture)
+            for statement, parameters in statements:
+                plans.append(QueryPlan(
+                    'orm', f'{model.__name__}.{relationship_property.key}', statement,
+                    explain(connection, statement, parameters),
+                ))
+
+    for record_class in (LiteSynset, LiteSense, LiteWNSynset, LiteWNSense):
+        for name, (statement, _, _, _) in record_class.relations.items():
+            plans.append(QueryPlan(
+                'sqlite', f'{record_class.__name__}.{name}', statement, explain(connection, statement, ('',)),
+            ))
+    return plans
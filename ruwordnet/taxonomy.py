@@ -0,0 +1,371 @@
+"""
+A reachability index over the hypernymy hierarchy, and the similarity measures based on it.
+
+For each synset, all its (transitive) hypernyms are precomputed together with their distances,
+and stored in the CSR format sorted by index, so is-a checks are binary searches and never walk the graph.
+The index is built with one breadth-first search per synset, so it also tolerates cycles in the data.
+
+The similarity of two synsets is computed from their common hypernyms (a synset counts as its own hypernym here).
+For many pairs at once, the scores are accumulated in a NumPy matrix, one common hypernym at a time.
+The measures based on the information content (Resnik, Lin and Jiang-Conrath) need the corpus frequencies
+of the synsets, computed in advance (see `information_content`).
+"""
+import math
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .graph import Adjacency, RuWordNetGraph, SynsetView
+from .information_content import InformationContent
+
+MEASURES = ('path', 'wup', 'lch', 'resnik', 'lin', 'jcn')
+# the number of elements in the temporary arrays of `similarity_matrix`, which is computed block by block
+CHUNK_SIZE = 1 << 20
+
+
+class Taxonomy:
+    """ The transitive closure of the hypernymy relation (and optionally of the instance relation) of a snapshot """
+    def __init__(self, graph: RuWordNetGraph, instances: bool = False):
+        """ instances: treat the classes of an instance (e.g. a country for a particular country) as its hypernyms """
+        self.graph = graph
+        self.instances = instances
+        relations = [graph.adjacency('hypernyms')]
+        if instances:
+            relations.append(graph.adjacency('classes'))
+        self.size = len(relations[0].offsets) - 1
+        self._ancestors = _closure(self.size, relations)
+        self._descendants = _transpose(self.size, *self._ancestors)
+        self._depths = None
+        self._max_depths = None
+        self._information_content: Optional[array] = None
+
+    def index(self, synset: Union[str, SynsetView, object]) -> int:
+        """ The index of a synset given by its id, as a snapshot view, or as any object with the `id` attribute """
+        if isinstance(synset, SynsetView) and synset._graph is self.graph:
+            return synset.index
+        index = self.graph.index_of(synset if isinstance(synset, str) else synset.id)
+        if index is None:
+            raise KeyError(synset)
+        return index
+
+    def ancestors(self, index: int) -> Tuple[array, array]:
+        """ The indices of all the hypernyms of a synset (sorted), and the lengths of the shortest paths to them """
+        offsets, targets, distances = self._ancestors
+        return targets[offsets[index]:offsets[index + 1]], distances[offsets[index]:offsets[index + 1]]
+
+    def descendants(self, index: int) -> Tuple[array, array]:
+        """ The indices of all the hyponyms of a synset (sorted), and the lengths of the shortest paths to them """
+        offsets, targets, distances = self._descendants
+        return targets[offsets[index]:offsets[index + 1]], distances[offsets[index]:offsets[index + 1]]
+
+    def is_hyponym_of(self, synset, hypernym) -> bool:
+        """ Whether the first synset is a direct or transitive hyponym of the second one (but not the same synset) """
+        offsets, targets, _ = self._ancestors
+        index, target = self.index(synset), self.index(hypernym)
+        position = bisect_left(targets, target, offsets[index], offsets[index + 1])
+        return position < offsets[index + 1] and targets[position] == target
+
+    def is_hypernym_of(self, synset, hyponym) -> bool:
+        """ Whether the first synset is a direct or transitive hypernym of the second one (but not the same synset) """
+        return self.is_hyponym_of(hyponym, synset)
+
+    def all_hypernyms(self, synset) -> List[SynsetView]:
+        """ All the direct and transitive hypernyms of a synset, the closest first """
+        return self._views(*self.ancestors(self.index(synset)))
+
+    def all_hyponyms(self, synset) -> List[SynsetView]:
+        """ All the direct and transitive hyponyms of a synset, the closest first """
+        return self._views(*self.descendants(self.index(synset)))
+
+    def _views(self, indices: array, distances: array) -> List[SynsetView]:
+        return [SynsetView(self.graph, index) for _, index in sorted(zip(distances, indices))]
+
+    @property
+    def depths(self) -> array:
+        """ The depth of each synset: 1 for the synsets without hypernyms, and 1 + the distance to the farthest
+        of its hypernyms (along the shortest path to it) otherwise """
+        if self._depths is None:
+            offsets, _, distances = self._ancestors
+            self._depths = array('i', [
+                1 + max(distances[offsets[i]:offsets[i + 1]], default=0) for i in range(self.size)
+            ])
+        return self._depths
+
+    def _max_depth(self, index: int) -> int:
+        """ The maximal depth of the synsets with the same part of speech """
+        if self._max_depths is None:
+            self._max_depths = defaultdict(int)
+            for i, depth in enumerate(self.depths):
+                part_of_speech = self.graph.view(i).part_of_speech
+                self._max_depths[part_of_speech] = max(self._max_depths[part_of_speech], depth)
+        return self._max_depths[self.graph.view(index).part_of_speech]
+
+    def _hypernym_distances(self, index: int) -> Dict[int, int]:
+        indices, distances = self.ancestors(index)
+        result = dict(zip(indices, distances))
+        result[index] = 0
+        return result
+
+    def _common_hypernyms(self, synset, other) -> List[Tuple[int, int, int]]:
+        """ (index, distance from the first synset, distance from the second synset) of each common hypernym """
+        first = self._hypernym_distances(self.index(synset))
+        second = self._hypernym_distances(self.index(other))
+        return [(index, distance, second[index]) for index, distance in first.items() if index in second]
+
+    def lowest_common_hypernyms(self, synset, other) -> List[SynsetView]:
+        """ The deepest of the common hypernyms of two synsets (one of them if it is a hypernym of the other) """
+        common = self._common_hypernyms(synset, other)
+        if not common:
+            return []
+        deepest = max(self.depths[index] for index, _, _ in common)
+        return [SynsetView(self.graph, index) for index, _, _ in sorted(common) if self.depths[index] == deepest]
+
+    def shortest_path_distance(self, synset, other) -> Optional[int]:
+        """ The length of the shortest path between two synsets through a common hypernym, or None """
+        return min((first + second for _, first, second in self._common_hypernyms(synset, other)), default=None)
+
+    def path_similarity(self, synset, other) -> Optional[float]:
+        """ 1 / (1 + the length of the shortest path between the synsets through a common hypernym), or None """
+        distance = self.shortest_path_distance(synset, other)
+        return None if distance is None else 1 / (distance + 1)
+
+    def wup_similarity(self, synset, other) -> Optional[float]:
+        """ The Wu-Palmer similarity: 2 * depth(c) / (distance(a, c) + distance(b, c) + 2 * depth(c)),
+        maximized over the common hypernyms c, or None if there are none """
+        return max((
+            _wup(self.depths[index], first, second) for index, first, second in self._common_hypernyms(synset, other)
+        ), default=None)
+
+    def lch_similarity(self, synset, other) -> Optional[float]:
+        """ The Leacock-Chodorow similarity: -log((1 + the shortest path length) / (2 * the maximal depth)),
+        where the maximal depth is taken over the synsets with the same part of speech as the first one """
+        distance = self.shortest_path_distance(synset, other)
+        if distance is None:
+            return None
+        return -math.log((distance + 1) / (2 * self._max_depth(self.index(synset))))
+
+    def set_information_content(self, information_content: InformationContent):
+        """ Use the given corpus frequencies for the Resnik, Lin and Jiang-Conrath similarities """
+        self._information_content = array('d', [
+            information_content[self.graph.view(index).id] for index in range(self.size)
+        ])
+
+    def load_information_content(self, filename: str):
+        """ Use the corpus frequencies saved by `ruwordnet ic` or `InformationContent.save` """
+        self.set_information_content(InformationContent.load(filename))
+
+    def information_content(self, synset) -> float:
+        """ -log(the probability of a synset or any of its hyponyms in the corpus) """
+        return self._ic()[self.index(synset)]
+
+    def _ic(self) -> array:
+        if self._information_content is None:
+            raise ValueError('The information content is not loaded; please use `load_information_content`.')
+        return self._information_content
+
+    def resnik_similarity(self, synset, other) -> Optional[float]:
+        """ The Resnik similarity: the information content of the most informative common hypernym, or None """
+        ic = self._ic()
+        return max((ic[index] for index, _, _ in self._common_hypernyms(synset, other)), default=None)
+
+    def lin_similarity(self, synset, other) -> Optional[float]:
+        """ The Lin similarity: 2 * IC(the most informative common hypernym) / (IC(first) + IC(second)), or None """
+        resnik = self.resnik_similarity(synset, other)
+        if resnik is None:
+            return None
+        return _lin(resnik, self.information_content(synset) + self.information_content(other))
+
+    def jcn_similarity(self, synset, other) -> Optional[float]:
+        """ The Jiang-Conrath similarity: 1 / (IC(first) + IC(second) - 2 * IC(the most informative common hypernym)),
+        or None; it is infinite for the synsets that are indistinguishable by the corpus (e.g. for the same synset) """
+        resnik = self.resnik_similarity(synset, other)
+        if resnik is None:
+            return None
+        return _jcn(resnik, self.information_content(synset) + self.information_content(other))
+
+    def similarity_matrix(
+            self, synsets_a: Sequence, synsets_b: Optional[Sequence] = None, measure: str = 'path',
+            default: float = 0.0,
+    ):
+        """ Compute a similarity measure ("path", "wup", "lch", "resnik", "lin" or "jcn") between all pairs of synsets
+        as a NumPy array, with the rows for `synsets_a` and the columns for `synsets_b` (the same synsets by default).
+        The pairs without common hypernyms get the `default` value. The scores are single-precision floats. """
+        if measure not in MEASURES:
+            raise ValueError(f'Unknown similarity measure "{measure}"; please use one of {MEASURES}.')
+        np = _import_numpy()
+        rows = [self.index(synset) for synset in synsets_a]
+        columns = rows if synsets_b is None else [self.index(synset) for synset in synsets_b]
+        row_groups, column_groups = self._group_by_hypernyms(rows), self._group_by_hypernyms(columns)
+        common = row_groups.keys() & column_groups.keys()
+        # the distances are short, so the smallest integer type holding the sum of two of them is used
+        longest = max((max(group[1]) for groups in (row_groups, column_groups) for group in groups.values()), default=0)
+        dtype = np.int16 if 2 * longest < np.iinfo(np.int16).max else np.int32
+        row_groups = {index: _group_arrays(np, row_groups[index], dtype) for index in common}
+        column_groups = {index: _group_arrays(np, column_groups[index], dtype) for index in common}
+
+        if measure in {'resnik', 'lin', 'jcn'}:
+            return self._ic_matrix(np, rows, columns, row_groups, column_groups, common, measure, default)
+        if measure == 'wup':
+            scores = np.full((len(rows), len(columns)), -np.inf, dtype=np.float32)
+            for index in common:
+                (row_positions, row_distances), (column_positions, column_distances) = \
+                    row_groups[index], column_groups[index]
+                depth = np.float32(2 * self.depths[index])
+                for chunk in _chunks(len(row_positions), len(column_positions)):
+                    block = np.ix_(row_positions[chunk], column_positions)
+                    values = np.add(row_distances[chunk, None], column_distances[None, :], dtype=np.float32)
+                    values += depth
+                    np.divide(depth, values, out=values)
+                    np.maximum(values, scores[block], out=values)
+                    scores[block] = values
+            for chunk in _chunks(len(rows), len(columns)):
+                view = scores[chunk]
+                view[np.isinf(view)] = default
+            return scores
+
+        no_path = np.iinfo(dtype).max
+        distances = np.full((len(rows), len(columns)), no_path, dtype=dtype)
+        for index in common:
+            (row_positions, row_distances), (column_positions, column_distances) = \
+                row_groups[index], column_groups[index]
+            for chunk in _chunks(len(row_positions), len(column_positions)):
+                block = np.ix_(row_positions[chunk], column_positions)
+                values = np.add(row_distances[chunk, None], column_distances[None, :], dtype=dtype)
+                np.minimum(values, distances[block], out=values)
+                distances[block] = values
+        scores = np.full(distances.shape, default, dtype=np.float32)
+        if measure == 'lch':
+            max_depths = np.array([2 * self._max_depth(index) for index in rows], dtype=np.float32)
+        # the scores are computed from the distances a few rows at a time, to keep the temporary arrays small
+        for chunk in _chunks(len(rows), len(columns)):
+            values = distances[chunk].astype(np.float32)
+            found = distances[chunk] != no_path
+            values += 1
+            if measure == 'path':
+                np.reciprocal(values, out=values)
+            else:
+                values /= max_depths[chunk, None]
+                np.log(values, out=values)
+                np.negative(values, out=values)
+            np.copyto(scores[chunk], values, where=found)
+        return scores
+
+    def _ic_matrix(self, np, rows, columns, row_groups, column_groups, common, measure, default):
+        ic = np.frombuffer(self._ic(), dtype=np.float64).astype(np.float32)
+        resnik = np.full((len(rows), len(columns)), -np.inf, dtype=np.float32)
+        for index in common:
+            row_positions, column_positions = row_groups[index][0], column_groups[index][0]
+            for chunk in _chunks(len(row_positions), len(column_positions)):
+                block = np.ix_(row_positions[chunk], column_positions)
+                resnik[block] = np.maximum(resnik[block], ic[index])
+        # the scores replace the Resnik similarities in place, a few rows at a time
+        row_ic, column_ic = ic[rows], ic[columns]
+        for chunk in _chunks(len(rows), len(columns)):
+            scores = resnik[chunk]
+            found = scores != -np.inf
+            if measure != 'resnik':
+                sums = np.add.outer(row_ic[chunk], column_ic)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if measure == 'lin':
+                        values = np.where(sums == 0, np.float32(1), 2 * scores / sums)
+                    else:
+                        values = np.where(sums - 2 * scores == 0, np.float32(np.inf), 1 / (sums - 2 * scores))
+                values[np.isinf(sums)] = 0
+                scores[...] = values
+            scores[~found] = default
+        return resnik
+
+    def _group_by_hypernyms(self, indices: Iterable[int]) -> Dict[int, Tuple[list, list]]:
+        """ For each hypernym of the synsets (including themselves): their positions and distances to it """
+        groups = defaultdict(lambda: ([], []))
+        for position, index in enumerate(indices):
+            for hypernym, distance in self._hypernym_distances(index).items():
+                positions, distances = groups[hypernym]
+                positions.append(position)
+                distances.append(distance)
+        return groups
+
+
+def _group_arrays(np, group: Tuple[list, list], dtype):
+    positions, distances = group
+    return np.array(positions, dtype=np.intp), np.array(distances, dtype=dtype)
+
+
+def _chunks(rows: int, columns: int) -> Iterator[slice]:
+    """ Split the rows of a matrix into the slices of at most `CHUNK_SIZE` elements (and at least one row) """
+    step = max(1, CHUNK_SIZE // max(columns, 1))
+    for start in range(0, rows, step):
+        yield slice(start, start + step)
+
+
+def _wup(depth: int, first: int, second: int) -> float:
+    return 2 * depth / (first + second + 2 * depth)
+
+
+def _lin(resnik: float, sum_ic: float) -> float:
+    if sum_ic == 0:
+        return 1.0
+    return 0.0 if math.isinf(sum_ic) else 2 * resnik / sum_ic
+
+
+def _jcn(resnik: float, sum_ic: float) -> float:
+    if math.isinf(sum_ic):
+        return 0.0
+    distance = sum_ic - 2 * resnik
+    return math.inf if distance == 0 else 1 / distance
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required for the similarity matrices; please install it with `pip install numpy`.')
+    return numpy
+
+
+def _closure(size: int, relations: List[Adjacency]) -> Tuple[array, array, array]:
+    """ Find all the nodes reachable from each node, with the shortest distances, in the CSR format """
+    offsets = array('i', [0])
+    targets = array('i')
+    distances = array('i')
+    for node in range(size):
+        reached = {node: 0}
+        frontier = [node]
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier = []
+            for current in frontier:
+                for relation in relations:
+                    for i in range(relation.offsets[current], relation.offsets[current + 1]):
+                        target = relation.targets[i]
+                        if target not in reached:
+                            reached[target] = distance
+                            next_frontier.append(target)
+            frontier = next_frontier
+        del reached[node]
+        for target in sorted(reached):
+            targets.append(target)
+            distances.append(reached[target])
+        offsets.append(len(targets))
+    return offsets, targets, distances
+
+
+def _transpose(size: int, offsets: array, targets: array, distances: array) -> Tuple[array, array, array]:
+    """ Reverse the direction of a relation in the CSR format; the sources of each target stay sorted """
+    counts = array('i', [0]) * (size + 1)
+    for target in targets:
+        counts[target + 1] += 1
+    for i in range(size):
+        counts[i + 1] += counts[i]
+    positions = counts[:-1]
+    sources = array('i', [0]) * len(targets)
+    reversed_distances = array('i', [0]) * len(targets)
+    for source in range(size):
+        for i in range(offsets[source], offsets[source + 1]):
+            position = positions[targets[i]]
+            sources[position] = source
+            reversed_distances[position] = distances[i]
+            positions[targets[i]] += 1
+    return counts, sources, reversed_distances
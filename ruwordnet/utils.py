@@ -1,12 +1,14 @@
 import os
+import re
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+from urllib.parse import quote
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+# SQLAlchemy and the models are imported inside the functions that need them,
+# because this module is also used by the lightweight sqlite3 backend, which should start fast.
 
-from .models import Base
 
-
-def get_default_session(filename=None):
+def get_default_filename(filename=None) -> str:
     if filename is None:
         dir = os.path.join(os.path.dirname(__file__), 'static')
         filename = os.path.join(dir, 'ruwordnet-2021.db')
@@ -17,11 +19,131 @@ def get_default_session(filename=None):
             f'The file {filename} was not found. '
             f'Please make sure you have provided a correct database filename.'
         )
+    return filename
+
+
+def get_default_engine(filename=None, read_only=False, pool_size=None):
+    """ Create an engine for a database file.
+    With `read_only`, the file is opened as an immutable read-only SQLite URI, so no locks are taken.
+    With `pool_size`, up to this number of idle connections are kept open, and they may be shared between threads;
+    more connections are opened when needed, so that threads never wait for each other. """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+    from .models import Base
+
+    filename = get_default_filename(filename)
+    url = f'sqlite:///{filename}'
+    if read_only:
+        url = f'sqlite:///file:{quote(os.path.abspath(filename))}?mode=ro&immutable=1&uri=true'
+    options = {}
+    if pool_size:
+        options = dict(
+            poolclass=QueuePool, pool_size=pool_size, max_overflow=-1, connect_args={'check_same_thread': False}
+        )
+    engine = create_engine(url, echo=False, **options)
+    if not read_only:
+        Base.metadata.create_all(engine)
+    return engine
+
+
+def get_default_session(filename=None, read_only=False, instrumentation=None):
+    """ Create a session for a database file; with an `Instrumentation`, its queries are instrumented """
+    from sqlalchemy.orm import sessionmaker
 
-    engine = create_engine(f'sqlite:///{filename}', echo=False)
-    Base.metadata.create_all(engine)
+    engine = get_default_engine(filename, read_only=read_only)
 
     Session = sessionmaker()
     Session.configure(bind=engine)
     session = Session()
+    if instrumentation is not None:
+        instrumentation.attach(engine, session)
     return session
+
+
+def normalize_lemma(lemma: str) -> str:
+    """ Convert a Russian word or phrase to the form in which it is stored in `Sense.lemma` """
+    return lemma.upper().strip()
+
+
+def normalize_en_lemma(lemma: str) -> str:
+    """ Convert an English word or phrase to the form in which it is stored in `WNSense.name` """
+    return lemma.lower().strip().replace(' ', '_')
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    """ Split an iterable into lists of at most `size` elements """
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def build_key_index(connection):
+    """ Fill the `key_index` table used by `RuWordNet.__getitem__` from the other tables.
+    The argument may be a SQLAlchemy connection or session. """
+    from sqlalchemy import literal, select
+    from .models import KeyIndex, KeyKind, Sense, Synset, WNSense, WNSynset
+
+    sources = [
+        (KeyKind.SYNSET, Synset.id),
+        (KeyKind.SENSE, Sense.id),
+        (KeyKind.LEMMA, Sense.lemma),
+        (KeyKind.EN_SYNSET, WNSynset.id),
+        (KeyKind.EN_SENSE, WNSense.key),
+        (KeyKind.EN_LEMMA, WNSense.name),
+    ]
+    table = KeyIndex.__table__
+    connection.execute(table.delete())
+    for kind, column in sources:
+        query = select(column, literal(int(kind))).where(column.isnot(None)).distinct()
+        connection.execute(table.insert().prefix_with('OR IGNORE').from_select(['key', 'kind'], query))
+
+
+# the full-text index of synset titles and definitions; the first three columns are only stored, not indexed
+DEFINITION_INDEX = 'definition_index'
+DEFINITION_INDEX_SCHEMA = (
+    f'CREATE VIRTUAL TABLE {DEFINITION_INDEX} USING fts5('
+    f'synset_id UNINDEXED, lang UNINDEXED, part_of_speech UNINDEXED, title, definition, '
+    f"tokenize = 'unicode61 remove_diacritics 2')"
+)
+# BM25 weights of the columns: the matches in titles count twice as much as the ones in definitions
+DEFINITION_RANK = f'bm25({DEFINITION_INDEX}, 0, 0, 0, 2.0, 1.0)'
+
+
+class MissingIndexError(RuntimeError):
+    """ The thesaurus has no full-text index for `search_definitions` """
+
+
+def build_definition_index(connection):
+    """ (Re)create the FTS5 index of Russian synset titles and definitions and English synset definitions,
+    used by `RuWordNet.search_definitions`. The argument may be a SQLAlchemy connection or session. """
+    from sqlalchemy import text
+
+    connection.execute(text(f'DROP TABLE IF EXISTS {DEFINITION_INDEX}'))
+    connection.execute(text(DEFINITION_INDEX_SCHEMA))
+    # the rows are inserted in a fixed order, so that the same data always produces the same index
+    connection.execute(text(
+        f"INSERT INTO {DEFINITION_INDEX} SELECT id, 'ru', part_of_speech, title, definition FROM synset ORDER BY id"
+    ))
+    connection.execute(text(
+        f"INSERT INTO {DEFINITION_INDEX} SELECT id, 'en', NULL, NULL, definition FROM wn_synset ORDER BY id"
+    ))
+
+
+def definition_search_query(query: str, limit: int, pos: Optional[str] = None, lang: Optional[str] = None):
+    """ Make an SQL query, with its named parameters, that finds the best matching (synset id, language, score) """
+    words = re.findall(r'(\w+)(\*?)', query)
+    conditions = [f'{DEFINITION_INDEX} MATCH :match']
+    parameters = dict(match=' '.join(f'"{word}"{star}' for word, star in words), limit=limit)
+    if pos is not None:
+        conditions.append('part_of_speech = :pos')
+        parameters['pos'] = pos
+    if lang is not None:
+        conditions.append('lang = :lang')
+        parameters['lang'] = lang
+    sql = (
+        f'SELECT synset_id, lang, -{DEFINITION_RANK} FROM {DEFINITION_INDEX} '
+        f'WHERE {" AND ".join(conditions)} ORDER BY {DEFINITION_RANK} LIMIT :limit'
+    )
+    return sql, parameters
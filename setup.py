@@ -25,7 +25,12 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    install_requires=['sqlalchemy<2.0'],
+    install_requires=['sqlalchemy>=1.4.33,<2.0'],
+    extras_require={
+        'similarity': ['numpy'],
+        'export': ['numpy', 'scipy', 'networkx', 'pyarrow'],
+        'download': ['zstandard>=0.18'],
+    },
     entry_points={
         "console_scripts": [
             "ruwordnet=ruwordnet.__main__:main",
@@ -1,7 +1,20 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
-from ruwordnet import RuWordNet
+from conversion import load_from_xml, update_from_xml
+from ruwordnet import AsyncRuWordNet, RuWordNet
 from ruwordnet.models import Synset, WNSynset, Sense, WNSense
+from ruwordnet.utils import build_key_index
 
 
 def test_thesaurus():
@@ -63,3 +76,831 @@ def test_indexing():
     assert isinstance(wn['electric_potential%1:19:00::'], WNSense)
     assert isinstance(wn['потенциал'][0], Sense)
     assert isinstance(wn['potential'][0], WNSense)
+
+
+def test_snapshot():
+    wn = RuWordNet(filename_or_session='ruwordnet/static/ruwordnet-2021.db')
+    graph = wn.snapshot()
+    asparagus = graph.get_senses('спаржа')[0].synset
+    assert asparagus.id == wn.get_senses('спаржа')[0].synset.id
+    assert {s.id for s in asparagus.hypernyms} == {s.id for s in wn[asparagus.id].hypernyms}
+    vegetables = graph['348-N']
+    assert asparagus in vegetables.hyponyms
+    assert graph['овощехранилище'][0].synset in vegetables.related
+    assert [s.name for s in vegetables.senses] == [s.name for s in wn['348-N'].senses]
+    assert graph['11493827-n'] in graph['134045-N'].ili
+
+
+def test_taxonomy():
+    wn = RuWordNet()
+    taxonomy = wn.taxonomy()
+    asparagus = wn.get_senses('спаржа')[0].synset
+    vegetables = wn.get_synset_by_id('348-N')
+    assert taxonomy.is_hyponym_of(asparagus, vegetables)
+    assert taxonomy.is_hypernym_of('348-N', asparagus.id)
+    assert not taxonomy.is_hyponym_of(vegetables, asparagus)
+    assert not taxonomy.is_hyponym_of(asparagus, asparagus)
+
+    hypernyms = taxonomy.all_hypernyms(asparagus)
+    assert {synset.id for synset in hypernyms[:len(asparagus.hypernyms)]} == {h.id for h in asparagus.hypernyms}
+    # the same result as a recursive walk over the ORM relations
+    expected, frontier = set(), [asparagus]
+    while frontier:
+        frontier = [h for synset in frontier for h in synset.hypernyms if h.id not in expected]
+        expected.update(h.id for h in frontier)
+    assert {synset.id for synset in hypernyms} == expected
+    assert asparagus.id in {synset.id for synset in taxonomy.all_hyponyms(vegetables)}
+
+
+def test_similarity(monkeypatch):
+    taxonomy = RuWordNet().taxonomy()
+    asparagus, artichoke, vegetables = '108482-N', '107993-N', '348-N'
+    assert taxonomy.path_similarity(asparagus, asparagus) == 1
+    assert taxonomy.path_similarity(asparagus, vegetables) == 1 / 2
+    lowest = taxonomy.lowest_common_hypernyms(asparagus, artichoke)
+    assert lowest and all(taxonomy.is_hyponym_of(asparagus, synset) for synset in lowest)
+    assert all(taxonomy.is_hyponym_of(artichoke, synset) for synset in lowest)
+    assert 0 < taxonomy.wup_similarity(asparagus, vegetables) < taxonomy.wup_similarity(asparagus, asparagus) == 1
+    assert taxonomy.lch_similarity(asparagus, artichoke) < taxonomy.lch_similarity(asparagus, vegetables)
+
+    pytest.importorskip('numpy')
+    synsets = [asparagus, artichoke, vegetables, '134045-N']
+    matrices = {}
+    for measure, function in [
+        ('path', taxonomy.path_similarity), ('wup', taxonomy.wup_similarity), ('lch', taxonomy.lch_similarity),
+    ]:
+        matrix = matrices[measure] = taxonomy.similarity_matrix(synsets, synsets[::-1], measure=measure)
+        for i, first in enumerate(synsets):
+            for j, second in enumerate(synsets[::-1]):
+                assert matrix[i, j] == pytest.approx(function(first, second) or 0, rel=1e-5)
+
+    # the same scores are computed with the temporary arrays of a single row
+    monkeypatch.setattr('ruwordnet.taxonomy.CHUNK_SIZE', 1)
+    for measure in ['path', 'wup', 'lch']:
+        assert (taxonomy.similarity_matrix(synsets, synsets[::-1], measure=measure) == matrices[measure]).all()
+
+
+def test_information_content(tmp_path):
+    from ruwordnet.information_content import InformationContent, count_synsets
+    wn = RuWordNet()
+    taxonomy = wn.taxonomy()
+    asparagus, artichoke, vegetables = '108482-N', '107993-N', '348-N'
+    lemmas = [wn.get_synset_by_id(synset_id).senses[0].lemma for synset_id in (asparagus, artichoke, vegetables)]
+    corpus = [' '.join(lemmas), lemmas[0].lower() + ', ' + lemmas[2].lower(), 'ничего такого'] * 10
+    counts = count_synsets(corpus, wn.annotator())
+    assert counts[asparagus] > 0 and counts[vegetables] > 0
+    assert count_synsets(corpus, wn.annotator(), processes=2, chunksize=7) == pytest.approx(counts)
+
+    filename = str(tmp_path / 'ruwordnet.db.ic.tsv')
+    InformationContent.from_counts(taxonomy, counts).save(filename)
+    taxonomy.load_information_content(filename)
+    assert taxonomy.information_content(asparagus) > taxonomy.information_content(vegetables) > 0
+    assert taxonomy.resnik_similarity(asparagus, asparagus) == taxonomy.information_content(asparagus)
+    assert taxonomy.resnik_similarity(asparagus, vegetables) == taxonomy.information_content(vegetables)
+    assert taxonomy.resnik_similarity(asparagus, artichoke) >= taxonomy.information_content(vegetables)
+    assert taxonomy.lin_similarity(asparagus, asparagus) == 1
+    assert 0 < taxonomy.lin_similarity(asparagus, vegetables) < 1
+    assert taxonomy.jcn_similarity(asparagus, asparagus) == math.inf
+    assert 0 < taxonomy.jcn_similarity(asparagus, vegetables) < math.inf
+
+    pytest.importorskip('numpy')
+    synsets = [asparagus, artichoke, vegetables, '134045-N']
+    for measure, function in [
+        ('resnik', taxonomy.resnik_similarity), ('lin', taxonomy.lin_similarity), ('jcn', taxonomy.jcn_similarity),
+    ]:
+        matrix = taxonomy.similarity_matrix(synsets, measure=measure)
+        assert matrix.dtype.itemsize == 4
+        for i, first in enumerate(synsets):
+            for j, second in enumerate(synsets):
+                assert matrix[i, j] == pytest.approx(function(first, second) or 0, rel=1e-5)
+
+
+def test_export(tmp_path):
+    from ruwordnet import export
+    wn = RuWordNet()
+    graph = wn.snapshot()
+    hypernyms = graph.adjacency('hypernyms')
+    ids = export.node_ids(wn.session)
+    assert ids == {synset.id: synset.index for synset in graph.synsets}
+
+    pytest.importorskip('scipy')
+    matrices, ids = export.to_scipy(wn.session)
+    assert 'hypernyms' in matrices and 'hyponyms' not in matrices
+    assert list(matrices['hypernyms'].indptr) == list(hypernyms.offsets)
+    assert sorted(matrices['hypernyms'].indices) == sorted(hypernyms.targets)
+    hyponyms = export.to_scipy(wn.session, relations=['hyponyms'])[0]['hyponyms']
+    assert (hyponyms != matrices['hypernyms'].T).nnz == 0
+    with pytest.raises(ValueError):
+        export.to_scipy(wn.session, relations=['no such relation'])
+
+    networkx = pytest.importorskip('networkx')
+    digraph = export.to_networkx(wn.session)
+    assert digraph.nodes['348-N']['title'] == 'ОВОЩИ'
+    assert digraph.edges['108482-N', '348-N']['relation'] == 'hypernyms'
+    assert isinstance(digraph, networkx.DiGraph) and len(digraph) == len(ids)
+
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+    nodes, edges = export.to_arrow(wn.session)
+    assert nodes.column('id').to_pylist() == list(ids)
+    assert edges.num_rows == sum(matrix.nnz for matrix in matrices.values())
+    export.to_parquet(wn.session, str(tmp_path / 'nodes.parquet'), str(tmp_path / 'edges.parquet'))
+    assert pyarrow.parquet.read_table(str(tmp_path / 'nodes.parquet')).equals(nodes)
+    assert pyarrow.parquet.read_table(str(tmp_path / 'edges.parquet')).equals(edges)
+
+
+def test_instrumentation(caplog):
+    from ruwordnet.instrumentation import BLOCK, Instrumentation
+    wn = RuWordNet(instrument=Instrumentation(slow_query_threshold=0, n_plus_one_threshold=2))
+    wn.get_synsets('спаржа')[0].hypernyms
+    stats = wn.stats()
+    assert stats.methods['get_synsets'].calls == 1 and stats.methods['get_synsets'].queries >= 1
+    assert stats.relationships['Synset.hypernyms'].queries == 1 and stats.relationships['Synset.hypernyms'].rows >= 1
+    assert stats.total.queries == sum(counts.queries for counts in stats.methods.values()) == len(stats.slow_queries)
+    assert 'slow query' in caplog.text
+
+    with wn.measure() as measurement:
+        synsets = wn.get_synsets('замок')
+        assert len(synsets) == 2
+        for synset in synsets:
+            synset.senses
+    block = measurement.stats()
+    assert block.methods['get_synsets'].calls == 1 and block.relationships['Synset.senses'].queries == 2
+    assert any(pattern.method == BLOCK and 'FROM sense' in pattern.statement for pattern in block.n_plus_one)
+    assert wn.stats().total.queries == stats.total.queries + block.total.queries
+
+    with pytest.raises(ValueError):
+        RuWordNet().stats()
+
+
+def test_batch_lookup():
+    wn = RuWordNet()
+    synsets = wn.get_synsets_many(['потенциал', 'Замок', 'нет такого'])
+    assert set(synsets['потенциал']) == set(wn.get_synsets('потенциал'))
+    assert set(synsets['Замок']) == set(wn.get_synsets('замок'))
+    assert synsets['нет такого'] == []
+    by_id = wn.get_synsets_by_ids(['134045-N', 'no-such-id'])
+    assert by_id['134045-N'] == wn.get_synset_by_id('134045-N')
+    assert by_id['no-such-id'] is None
+    assert set(wn.get_en_synsets_many(['potential'])['potential']) == set(wn.get_en_synsets('potential'))
+
+
+def test_loading_profiles():
+    from sqlalchemy import event
+
+    def neighbourhood(synset):
+        return (
+            [sense.name for sense in synset.senses], [hypernym.title for hypernym in synset.hypernyms],
+            [hyponym.title for hyponym in synset.hyponyms], [en_synset.id for en_synset in synset.ili],
+        )
+
+    expected = [neighbourhood(synset) for synset in RuWordNet().get_synsets('замок')]
+    for profile in ['minimal', 'taxonomy', 'full']:
+        wn = RuWordNet(profile=profile)
+        queries = []
+        event.listen(wn._engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+        assert [neighbourhood(synset) for synset in wn.get_synsets('замок')] == expected
+        if profile == 'full':
+            # the number of queries does not depend on the number of synsets
+            assert len(queries) <= len(Sense.__mapper__.relationships) + len(Synset.__mapper__.relationships) + 1
+    wn = RuWordNet()
+    synset = wn.get_synset_by_id('134045-N', profile='taxonomy')
+    assert 'hypernyms' in synset.__dict__ and 'ili' not in synset.__dict__
+    with pytest.raises(ValueError):
+        RuWordNet(profile='everything')
+
+
+def test_key_index(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    shutil.copy('ruwordnet/static/ruwordnet-2021.db', filename)
+    wn = RuWordNet(filename_or_session=filename)
+    build_key_index(wn.session)
+    wn.session.commit()
+
+    wn = RuWordNet(filename_or_session=filename)
+    for key in ['134045-N', '11493827-n', '134045-N-189287', 'electric_potential%1:19:00::', 'потенциал', 'potential']:
+        assert wn[key] == wn._getitem_sequentially(key)
+    with pytest.raises(KeyError):
+        _ = wn['нет такого']
+
+
+def test_missing_key_index(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    # the published databases have no key index, and a read-only engine does not create it
+    with sqlite3.connect(filename) as connection:
+        connection.execute('DROP TABLE key_index')
+    for wn in [RuWordNet(filename, read_only=True), RuWordNet(filename, backend='sqlite')]:
+        assert [sense.id for sense in wn['спаржа']] == ['2-N-2']
+        assert wn['1-N'].title == 'ОВОЩИ'
+        with pytest.raises(KeyError):
+            _ = wn['нет такого']
+
+    async def run():
+        async with AsyncRuWordNet(filename) as wn:
+            assert (await wn['7-n']).id == '7-n'
+    asyncio.run(run())
+    with sqlite3.connect(filename) as connection:
+        assert connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'key_index'").fetchone() is None
+
+
+def test_backend_options(tmp_path):
+    from ruwordnet.compiled import CompiledRuWordNet, compile_database
+    from ruwordnet.lite import LiteRuWordNet
+    from ruwordnet.orm import OrmRuWordNet
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    assert isinstance(RuWordNet(filename, profile='taxonomy'), OrmRuWordNet)
+    assert isinstance(RuWordNet(filename, profile='taxonomy'), RuWordNet)
+    lite = RuWordNet(filename, None, True, backend='sqlite', cache_size=10, profile='minimal')
+    assert isinstance(lite, LiteRuWordNet) and lite.read_only
+    with pytest.raises(ValueError):
+        RuWordNet(filename, backend='sqlite', instrument=True)
+    with pytest.raises(ValueError):
+        RuWordNet(filename, backend='sqlite', concurrency='thread')
+    with pytest.raises(TypeError):
+        RuWordNet(filename, backend='sqlite', no_such_option=1)
+    compiled = compile_database(filename, str(tmp_path / 'ruwordnet.rwnc'))
+    assert isinstance(RuWordNet(compiled, cache_size=10), CompiledRuWordNet)
+    with pytest.raises(ValueError):
+        RuWordNet(compiled, read_only=True)
+
+
+def test_lite_backend_sees_updates(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    wn = RuWordNet(filename, backend='sqlite')
+    assert wn.get_synset_by_id('2-N').title == 'СПАРЖА'
+    # the file is not opened as immutable by default, so the changes made in place are seen
+    with sqlite3.connect(filename) as connection:
+        connection.execute("UPDATE synset SET title = 'СПАРЖА ОВОЩНАЯ' WHERE id = '2-N'")
+    assert wn.get_synset_by_id('2-N').title == 'СПАРЖА ОВОЩНАЯ'
+    assert RuWordNet(filename, backend='sqlite', read_only=True).get_synset_by_id('2-N').title == 'СПАРЖА ОВОЩНАЯ'
+
+
+def test_cache_eviction(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    wn = RuWordNet(filename, cache_size=2)
+    # the synsets are derived from the cached senses, and take no entries of their own
+    assert [synset.id for synset in wn.get_synsets('спаржа')] == ['2-N']
+    assert wn.cache_info().currsize == 1
+    sense = wn['2-N-2']
+    assert wn.get_senses('спаржа') == [sense]
+    vegetables = wn.get_synset_by_id('1-N')
+    # the sense is still held by the entry of wn['2-N-2']
+    assert sense in wn.session and vegetables in wn.session
+    wn.get_synset_by_id('3-N')
+    assert sense not in wn.session and vegetables in wn.session
+    assert wn.get_senses('спаржа')[0] is not sense
+    wn.cache_clear()
+    assert wn.prewarm(['спаржа', 'овощи']) == 2
+    assert [synset.id for synset in wn.get_synsets('овощи')] == ['1-N']
+    assert wn.cache_info().misses == 0
+
+
+XML_FIXTURE = {
+    'senses.N.xml': """<senses>
+  <sense id="1-N-1" synset_id="1-N" name="ОВОЩИ" lemma="ОВОЩИ"/>
+  <sense id="2-N-2" synset_id="2-N" name="СПАРЖА" lemma="СПАРЖА"/>
+  <sense id="3-N-3" synset_id="3-N" name="ЗЕЛЕНЫЙ ГОРОШЕК" lemma="ЗЕЛЕНЫЙ ГОРОШЕК"/>
+</senses>""",
+    'senses.V.xml': """<senses>
+  <sense id="4-V-4" synset_id="4-V" name="ЗЕЛЕНЕТЬ" lemma="ЗЕЛЕНЕТЬ"/>
+</senses>""",
+    'synsets.N.xml': """<synsets>
+  <synset id="1-N" ruthes_name="ОВОЩИ" definition="" part_of_speech="N"><sense id="1-N-1">ОВОЩИ</sense></synset>
+  <synset id="2-N" ruthes_name="СПАРЖА" definition="" part_of_speech="N"><sense id="2-N-2">СПАРЖА</sense></synset>
+  <synset id="3-N" ruthes_name="ГОРОШЕК" definition="" part_of_speech="N"><sense id="3-N-3">ГОРОШЕК</sense></synset>
+</synsets>""",
+    'synsets.V.xml': """<synsets>
+  <synset id="4-V" ruthes_name="ЗЕЛЕНЕТЬ" definition="" part_of_speech="V"><sense id="4-V-4">ЗЕЛЕНЕТЬ</sense></synset>
+</synsets>""",
+    'synset_relations.N.xml': """<relations>
+  <relation name="hypernym" child_id="1-N" parent_id="2-N"/>
+  <relation name="hypernym" child_id="1-N" parent_id="3-N"/>
+  <relation name="hyponym" child_id="2-N" parent_id="1-N"/>
+  <relation name="POS-synonymy" child_id="4-V" parent_id="1-N"/>
+</relations>""",
+    'synset_relations.V.xml': """<relations>
+  <relation name="POS-synonymy" child_id="1-N" parent_id="4-V"/>
+</relations>""",
+    'ili.xml': """<ili>
+  <match>
+    <rwn-synset id="1-N"/>
+    <wn-synset id="7-n" definition="edible plants"><lemma key="vegetable%1:13:00::" name="vegetable"/></wn-synset>
+  </match>
+</ili>""",
+    'composed_of.xml': """<senses>
+  <sense id="3-N-3"><composed_of><sense id="2-N-2"/></composed_of></sense>
+</senses>""",
+    'derived_from.xml': """<senses>
+  <sense id="1-N-1"><derived_from><sense id="4-V-4"/></derived_from></sense>
+</senses>""",
+}
+
+
+def write_xml_fixture(directory):
+    directory.mkdir(exist_ok=True)
+    for name, text in XML_FIXTURE.items():
+        (directory / name).write_text(text, encoding='utf-8')
+    return str(directory)
+
+
+def read_tables(filename):
+    with sqlite3.connect(filename) as connection:
+        names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {name: sorted(connection.execute(f'SELECT * FROM "{name}"').fetchall()) for name in names}
+
+
+def test_parallel_conversion(tmp_path):
+    source = write_xml_fixture(tmp_path / 'xml')
+    load_from_xml(root=source, parts='NV', file_name=str(tmp_path / 'serial.db'))
+    load_from_xml(root=source, parts='NV', file_name=str(tmp_path / 'parallel.db'), jobs=3)
+    serial, parallel = read_tables(str(tmp_path / 'serial.db')), read_tables(str(tmp_path / 'parallel.db'))
+    assert serial == parallel
+    # the senses of both files get the same rowids
+    rows = []
+    for filename in ['serial.db', 'parallel.db']:
+        with sqlite3.connect(str(tmp_path / filename)) as connection:
+            rows.append(connection.execute('SELECT rowid, id FROM sense ORDER BY rowid').fetchall())
+    assert rows[0] == rows[1]
+    assert len(serial['hypernym_relation']) == 2
+    assert len(serial['pos_synonymy_relation']) == 2
+
+    wn = RuWordNet(filename_or_session=str(tmp_path / 'parallel.db'))
+    assert [s.id for s in wn['спаржа'][0].synset.hypernyms] == ['1-N']
+
+
+def _killed_parser(filename):
+    os.kill(os.getpid(), signal.SIGKILL)
+    yield
+
+
+def test_parallel_conversion_dead_worker():
+    from sqlalchemy import create_engine
+    from conversion import write_in_parallel
+    from ruwordnet.models import Base
+    with create_engine('sqlite://').begin() as connection:
+        with pytest.raises(RuntimeError):
+            write_in_parallel(connection, [('killed', _killed_parser, 'senses.N.xml')], Base.metadata.tables, jobs=2)
+
+
+def test_incremental_update(tmp_path):
+    old_source = write_xml_fixture(tmp_path / 'old')
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=old_source, parts='NV', file_name=filename)
+
+    new_source = write_xml_fixture(tmp_path / 'new')
+    (tmp_path / 'new' / 'synsets.V.xml').write_text(
+        XML_FIXTURE['synsets.V.xml'].replace('ruthes_name="ЗЕЛЕНЕТЬ"', 'ruthes_name="СТАНОВИТЬСЯ ЗЕЛЕНЫМ"'),
+        encoding='utf-8',
+    )
+    (tmp_path / 'new' / 'synset_relations.N.xml').write_text(
+        XML_FIXTURE['synset_relations.N.xml'].replace('parent_id="3-N"', 'parent_id="4-N"'),
+        encoding='utf-8',
+    )
+    changelog = update_from_xml(root=new_source, parts='NV', file_name=filename)
+    assert changelog['synset'] == dict(added=[], removed=[], modified=['4-V'])
+    assert changelog['hypernym_relation'] == dict(added=[['4-N', '1-N']], removed=[['3-N', '1-N']], modified=[])
+    assert changelog['sense'] == dict(added=[], removed=[], modified=[])
+
+    load_from_xml(root=new_source, parts='NV', file_name=str(tmp_path / 'fresh.db'))
+    assert read_tables(filename) == read_tables(str(tmp_path / 'fresh.db'))
+
+
+def test_schema_migration(tmp_path):
+    from ruwordnet.models import SCHEMA_VERSION
+    from ruwordnet.schema import check_query_plans, migrate
+    from ruwordnet.utils import get_default_engine, get_default_session
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    expected = read_tables(filename)
+    assert not [plan for plan in check_query_plans(get_default_session(filename)) if plan.full_scans]
+
+    # recreate the original schema: ordinary association tables without the reverse indexes
+    connection = sqlite3.connect(filename)
+    for table in ['hypernym_relation', 'interlingual_index_relation']:
+        columns = [row[1] for row in connection.execute(f'PRAGMA table_info({table})')]
+        connection.execute(f'ALTER TABLE {table} RENAME TO old')
+        connection.execute(f'CREATE TABLE {table} ({columns[0]}, {columns[1]}, PRIMARY KEY ({", ".join(columns)}))')
+        connection.execute(f'INSERT INTO {table} SELECT * FROM old')
+        connection.execute('DROP TABLE old')
+    connection.execute('DROP INDEX ix_sense_synset_id')
+    connection.execute('PRAGMA user_version = 0')
+    connection.commit()
+    connection.close()
+    scans = {plan.relationship for plan in check_query_plans(get_default_session(filename)) if plan.full_scans}
+    assert {'Synset.hyponyms', 'Synset.senses', 'WNSynset.ili'} <= scans
+
+    engine = get_default_engine(filename)
+    with engine.begin() as connection:
+        assert migrate(connection, log=lambda message: None) == 0
+    with engine.begin() as connection:
+        assert migrate(connection, log=lambda message: None) == SCHEMA_VERSION
+    engine.dispose()
+    assert read_tables(filename) == expected
+    assert not [plan for plan in check_query_plans(get_default_session(filename)) if plan.full_scans]
+    assert 'WITHOUT ROWID' in sqlite3.connect(filename).execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'hypernym_relation'"
+    ).fetchone()[0]
+
+
+def test_instrumented_traverse(tmp_path, monkeypatch):
+    from sqlalchemy.engine.result import Result
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    wn = RuWordNet(filename, instrument=True)
+    # the rows of the raw SQL queries are counted too, as they are fetched
+    for unique in [False, True]:
+        with wn.measure() as measurement:
+            expected = list(wn.traverse('1-N', ['hypernyms', 'hyponyms'], unique=unique))
+        assert len(expected) >= 2 and measurement.stats().total.rows >= len(expected)
+
+    # the walk is streamed rather than fetched entirely to count its rows
+    def freeze(result):
+        raise AssertionError('the results are materialized')
+    monkeypatch.setattr(Result, 'freeze', freeze)
+    synset, depth, path = next(wn.traverse('1-N', ['hypernyms', 'hyponyms']))
+    assert (synset.id, depth, path) == (expected[0][0].id, expected[0][1], expected[0][2])
+
+
+def test_search_definitions(tmp_path):
+    from ruwordnet.compiled import compile_database
+    from ruwordnet.utils import DEFINITION_INDEX, MissingIndexError
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    for backend in ['orm', 'sqlite']:
+        wn = RuWordNet(filename, backend=backend)
+        (synset, score), = wn.search_definitions('горошек')
+        assert synset.id == '3-N' and score > 0
+        assert [synset.id for synset, _ in wn.search_definitions('зелен*')] == ['4-V']
+        assert wn.search_definitions('зелен*', pos='N') == []
+        assert [synset.id for synset, _ in wn.search_definitions('Edible plants')] == ['7-n']
+        assert wn.search_definitions('edible', lang='ru') == []
+        assert wn.search_definitions('" OR *') == []
+
+    compiled = RuWordNet(compile_database(filename, str(tmp_path / 'ruwordnet.rwnc')))
+    with pytest.raises(MissingIndexError):
+        compiled.search_definitions('горошек')
+    with sqlite3.connect(filename) as connection:
+        connection.execute(f'DROP TABLE {DEFINITION_INDEX}')
+    for backend in ['orm', 'sqlite']:
+        with pytest.raises(MissingIndexError):
+            RuWordNet(filename, backend=backend).search_definitions('горошек')
+
+
+def test_annotator(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    for backend in ['orm', 'sqlite']:
+        annotator = RuWordNet(filename, backend=backend).annotator()
+        text = 'Зеленый горошек и спаржа — это овощи, а горошек просто зеленый.'
+        spans = annotator.annotate(text)
+        assert [(span.text, span.synset_ids) for span in spans] == [
+            ('Зеленый горошек', ('3-N',)), ('спаржа', ('2-N',)), ('овощи', ('1-N',)),
+        ]
+        assert text[spans[0].start:spans[0].end] == 'Зеленый горошек'
+        assert spans[0].sense_ids == ('3-N-3',)
+
+    documents = [text, 'ничего', 'овощи'] * 50
+    expected = [annotator.annotate(document) for document in documents]
+    assert list(annotator.annotate_documents(iter(documents))) == expected
+    assert list(annotator.annotate_documents(iter(documents), processes=2, chunksize=7)) == expected
+
+
+def test_benchmark_fixture(tmp_path):
+    from benchmarks.fixture import write_fixture
+    from benchmarks.run import deepest_synsets, traverse_hypernyms
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_fixture(str(tmp_path / 'xml'), scale=50), file_name=filename)
+    wn = RuWordNet(filename)
+    assert len(wn.synsets) == 150 and wn.get_en_synset_by_id('10000000-n') is not None
+    deepest = wn.get_synset_by_id(deepest_synsets(filename, 1)[0])
+    assert traverse_hypernyms(deepest) == len(wn.taxonomy().all_hypernyms(deepest.id)) > 1
+
+
+def _lookup_in_child(wn, results):
+    results.put([synset.id for synset in wn.get_synsets('замок')])
+
+
+def test_concurrency():
+    wn = RuWordNet(concurrency='thread', read_only=True)
+    expected = sorted(synset.id for synset in wn.get_synsets('замок'))
+
+    def lookup(_):
+        return sorted(synset.id for synset in wn.get_synsets('замок')), id(wn.session)
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lookup, range(20)))
+    assert all(ids == expected for ids, _ in results)
+    assert len({session_id for _, session_id in results}) > 1
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=_lookup_in_child, args=(wn, results))
+    process.start()
+    assert sorted(results.get(timeout=30)) == expected
+    process.join()
+    assert sorted(synset.id for synset in wn.get_synsets('замок')) == expected
+
+
+def test_lite_backend():
+    orm = RuWordNet()
+    lite = RuWordNet(backend='sqlite')
+    assert repr(lite['134045-N']) == repr(orm['134045-N'])
+    assert sorted(map(repr, lite['потенциал'])) == sorted(map(repr, orm['потенциал']))
+    assert sorted(map(repr, lite.get_synsets('замок'))) == sorted(map(repr, orm.get_synsets('замок')))
+    asparagus = lite.get_senses('спаржа')[0].synset
+    assert len(asparagus.hypernyms) == 3
+    assert repr(lite.get_en_synset_by_id('11493827-n').ili[0]) == repr(orm.get_en_synset_by_id('11493827-n').ili[0])
+
+    # the relations of the lite records must follow the same association tables as the ORM models
+    from ruwordnet import lite as lite_module
+    from ruwordnet.models import Sense, Synset, relation_columns
+    for model, relations in [(Synset, lite_module.SYNSET_RELATIONS), (Sense, lite_module.SENSE_RELATIONS)]:
+        for name, (table, owner_column, related_column) in relations.items():
+            expected = relation_columns(model)[name]
+            assert (table, owner_column, related_column) == (expected[0].name, expected[1].name, expected[2].name)
+
+
+def test_compiled(tmp_path):
+    from ruwordnet.compiled import CompiledRuWordNet, compile_database
+    lite = RuWordNet(backend='sqlite')
+    compiled = RuWordNet(compile_database(output=str(tmp_path / 'ruwordnet.rwnc')))
+    assert isinstance(compiled, CompiledRuWordNet)
+    assert repr(compiled['134045-N']) == repr(lite['134045-N'])
+    assert sorted(map(repr, compiled['потенциал'])) == sorted(map(repr, lite['потенциал']))
+    assert sorted(map(repr, compiled.get_synsets('замок'))) == sorted(map(repr, lite.get_synsets('замок')))
+    asparagus = compiled.get_senses('спаржа')[0].synset
+    assert sorted(map(repr, asparagus.hypernyms)) == sorted(map(repr, lite.get_senses('спаржа')[0].synset.hypernyms))
+    en_synset = compiled.get_en_synset_by_id('11493827-n')
+    assert repr(en_synset.ili[0]) == repr(lite.get_en_synset_by_id('11493827-n').ili[0])
+    assert compiled.get_senses('нет такого слова') == []
+    with pytest.raises(KeyError):
+        compiled['нет такого слова']
+    assert len(compiled.synsets) == len(lite.synsets)
+    compiled.close()
+
+
+def test_traverse():
+    for wn in [RuWordNet(), RuWordNet(backend='sqlite')]:
+        asparagus = wn.get_senses('спаржа')[0].synset
+        direct = [synset.id for synset, depth, path in wn.traverse(asparagus, ['hypernyms'], max_depth=1)]
+        assert sorted(direct) == sorted(synset.id for synset in asparagus.hypernyms)
+
+        ancestors, frontier = set(), [asparagus]
+        while frontier:
+            frontier = [parent for synset in frontier for parent in synset.hypernyms if parent.id not in ancestors]
+            ancestors.update(hypernym.id for hypernym in frontier)
+        results = list(wn.traverse(asparagus.id, ['hypernyms'], unique=True))
+        assert {synset.id for synset, _, _ in results} == ancestors
+        assert [depth for _, depth, _ in results] == sorted(depth for _, depth, _ in results)
+        for synset, depth, path in results:
+            assert path[0] == asparagus.id and path[-1] == synset.id and len(path) == depth + 1
+        parent = asparagus.hypernyms[0]
+        hyponyms = wn.traverse(parent, ['hypernyms'], direction='backward', max_depth=1)
+        assert asparagus.id in {synset.id for synset, _, _ in hyponyms}
+
+        # the mixed relations have cycles, which are not followed
+        mixed = list(wn.traverse(asparagus, ['hypernyms', 'hyponyms'], max_depth=3))
+        limited = list(wn.traverse(asparagus, ['hypernyms', 'hyponyms'], max_depth=3, max_nodes=10))
+        assert len(limited) == min(10, len(mixed))
+        assert all(len(set(path)) == len(path) for _, _, path in mixed)
+
+        sense = wn.get_senses('спаржа')[0]
+        phrases = [phrase.id for phrase, _, _ in wn.traverse_senses(sense, ['phrases'], max_depth=1)]
+        assert sorted(phrases) == sorted(phrase.id for phrase in sense.phrases)
+        with pytest.raises(ValueError):
+            wn.traverse(asparagus, ['hypernym'])
+
+
+def test_traverse_dag(tmp_path, monkeypatch):
+    import ruwordnet.lite
+    from ruwordnet.compiled import compile_database
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+    # a hierarchy of 12 levels under "1-N", where each synset has two hypernyms on the previous level
+    levels = [['1-N']] + [[f'{level}-{i}-N' for i in range(3)] for level in range(1, 13)]
+    with sqlite3.connect(filename) as connection:
+        connection.executemany(
+            'INSERT INTO synset (id, title, part_of_speech) VALUES (?, ?, ?)',
+            [(id, id, 'N') for level in levels[1:] for id in level],
+        )
+        connection.executemany('INSERT INTO hypernym_relation (hyponym_id, hypernym_id) VALUES (?, ?)', [
+            (id, parent) for above, level in zip(levels, levels[1:]) for i, id in enumerate(level)
+            for parent in {above[i % len(above)], above[(i + 1) % len(above)]}
+        ])
+    expected = {id for level in levels[1:] for id in level} | {'2-N', '3-N'}
+    compiled = RuWordNet(compile_database(filename, str(tmp_path / 'ruwordnet.rwnc')))
+    for wn in [RuWordNet(filename), RuWordNet(filename, backend='sqlite'), compiled]:
+        results = list(wn.traverse('1-N', ['hyponyms', 'hypernyms'], unique=True))
+        assert sorted(synset.id for synset, _, _ in results) == sorted(expected)
+        depths = {synset.id: depth for synset, depth, path in results}
+        assert depths['12-0-N'] == 12 and depths['2-N'] == 1
+        assert all(len(path) == depth + 1 and path[0] == '1-N' for _, depth, path in results)
+        assert len(list(wn.traverse('1-N', ['hyponyms'], unique=True, max_nodes=5))) == 5
+
+        paths = list(wn.traverse('1-N', ['hyponyms'], max_depth=4))
+        assert len(paths) > len({synset.id for synset, _, _ in paths})
+        # without the recursive query of several tables (before SQLite 3.34), the walk goes level by level
+        mixed = sorted((synset.id, depth, path) for synset, depth, path in wn.traverse(
+            '1-N', ['hyponyms', 'domains'], max_depth=4,
+        ))
+        monkeypatch.setattr(ruwordnet.lite, 'MULTIPLE_RECURSIVE_SELECTS', False)
+        assert sorted((synset.id, depth, path) for synset, depth, path in wn.traverse(
+            '1-N', ['hyponyms', 'domains'], max_depth=4,
+        )) == mixed == sorted((synset.id, depth, path) for synset, depth, path in paths)
+        monkeypatch.undo()
+
+
+def test_translate_many():
+    for wn in [RuWordNet(), RuWordNet(backend='sqlite')]:
+        translations = wn.translate_many(['potential', 'no such word'])
+        assert translations['no such word'] == []
+        expected = {
+            (sense.synset.id, synset.id, tuple(dict.fromkeys(ru_sense.lemma for ru_sense in synset.senses)))
+            for sense in wn.get_en_senses('potential') for synset in sense.synset.ili
+        }
+        assert expected and set(translations['potential']) == expected
+
+        reverse = wn.translate_many(['потенциал'], src='ru', dst='en')['потенциал']
+        expected = {
+            (sense.synset.id, synset.id, tuple(dict.fromkeys(en_sense.name for en_sense in synset.senses)))
+            for sense in wn.get_senses('потенциал') for synset in sense.synset.ili
+        }
+        assert set(reverse) == expected
+
+        assert wn.ili_mapping()['potential'] == translations['potential']
+        assert wn.ili_mapping(src='ru', dst='en').get('потенциал', []) == reverse
+        with pytest.raises(ValueError):
+            wn.translate_many(['potential'], src='en', dst='en')
+
+
+def test_download(tmp_path):
+    import hashlib
+    import lzma
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from ruwordnet.download import ChecksumError, download, install, install_release
+
+    database = bytes(range(256)) * 4000
+    artifact = lzma.compress(database)
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            offset = int(self.headers.get('Range', 'bytes=0-')[len('bytes='):].rstrip('-'))
+            requests.append(offset)
+            self.send_response(206 if offset else 200)
+            self.send_header('Content-Length', str(len(artifact) - offset))
+            self.end_headers()
+            # the first response is interrupted in the middle
+            self.wfile.write(artifact[offset:len(artifact) // 2] if len(requests) == 1 else artifact[offset:])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/ruwordnet-2021.db.xz'
+    try:
+        destination = str(tmp_path / 'ruwordnet.db')
+        digest = download(url, destination, sha256=hashlib.sha256(database).hexdigest(), progress=False)
+        assert digest == hashlib.sha256(database).hexdigest()
+        assert (tmp_path / 'ruwordnet.db').read_bytes() == database
+        assert requests == [0, len(artifact) // 2]
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['ruwordnet.db']
+
+        # a mismatching checksum leaves the installed file untouched
+        with pytest.raises(ChecksumError):
+            download(url, destination, sha256='0' * 64, progress=False)
+        assert (tmp_path / 'ruwordnet.db').read_bytes() == database
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['ruwordnet.db']
+    finally:
+        server.shutdown()
+
+    mirror = tmp_path / 'mirror'
+    mirror.mkdir()
+    (mirror / 'ruwordnet-2021.db.xz').write_bytes(artifact)
+    installed = install_release('2021', destination=str(tmp_path / 'installed.db'), mirror=str(mirror))
+    assert open(installed, 'rb').read() == database
+    assert install_release('2020', file=str(mirror / 'ruwordnet-2021.db.xz'), destination=installed) == installed
+
+    # a truncated or padded artifact is never installed
+    for name, content in [('truncated.db.xz', artifact[:-100]), ('padded.db.xz', artifact + b'\0')]:
+        (tmp_path / name).write_bytes(content)
+        with pytest.raises(ValueError):
+            install(str(tmp_path / name), str(tmp_path / 'broken.db'))
+        assert not (tmp_path / 'broken.db').exists() and not (tmp_path / 'broken.db.tmp').exists()
+
+
+def test_download_zstd(tmp_path):
+    import hashlib
+    from ruwordnet.download import install
+    zstandard = pytest.importorskip('zstandard')
+    database = bytes(range(256)) * 4000
+    compressed = zstandard.ZstdCompressor().compress(database)
+    for name, content in [('ruwordnet.db.zst', compressed), ('truncated.db.zst', compressed[:-100])]:
+        (tmp_path / name).write_bytes(content)
+    digest = install(str(tmp_path / 'ruwordnet.db.zst'), str(tmp_path / 'ruwordnet.db'))
+    assert digest == hashlib.sha256(database).hexdigest()
+    with pytest.raises(ValueError):
+        install(str(tmp_path / 'truncated.db.zst'), str(tmp_path / 'broken.db'))
+    assert not (tmp_path / 'broken.db').exists()
+
+
+def test_lite_backend_without_sqlalchemy():
+    code = (
+        'import sys\n'
+        'from ruwordnet import RuWordNet\n'
+        'assert RuWordNet(backend="sqlite").get_senses("замок")\n'
+        'print("sqlalchemy" in sys.modules)\n'
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ['False']
+
+
+def test_cache():
+    for backend in ['orm', 'sqlite']:
+        wn = RuWordNet(backend=backend, cache_size=2)
+        first = wn.get_synsets('замок')
+        assert wn.get_synsets('Замок ') == first
+        assert wn.cache_info().hits == 1
+        wn.get_senses('потенциал')
+        wn.get_senses('спаржа')
+        assert wn.cache_info().currsize == 2
+        assert wn.cache_info().evictions > 0
+
+        wn = RuWordNet(backend=backend, cache_size=100)
+        assert wn.prewarm(['замок', 'потенциал', 'no such word']) == 2
+        misses = wn.cache_info().misses
+        assert list(map(repr, wn.get_synsets('замок'))) == list(map(repr, first))
+        assert wn.cache_info().misses == misses
+    with pytest.raises(ValueError):
+        RuWordNet(concurrency='thread', cache_size=10)
+
+
+def test_completion(tmp_path):
+    for backend in ['orm', 'sqlite']:
+        wn = RuWordNet(backend=backend)
+        suggestions = wn.complete('зам', limit=5)
+        assert 0 < len(suggestions) <= 5
+        assert all(lemma.startswith('ЗАМ') for lemma in suggestions)
+        assert 'ЗАМОК' in wn.complete('замо', limit=100)
+        counts = [len(wn.get_senses(lemma)) for lemma in suggestions]
+        assert counts == sorted(counts, reverse=True)
+        assert 'electric_potential' in wn.complete('electric p', limit=100, lang='en')
+        assert wn.complete('щщщщщ') == []
+
+    wn.completion_index().save(tmp_path / 'completion.tsv')
+    loaded = RuWordNet()
+    loaded.load_completion_index(tmp_path / 'completion.tsv')
+    assert loaded.complete('п', limit=20) == wn.complete('п', limit=20)
+
+
+def test_async():
+    async def run():
+        async with AsyncRuWordNet(pool_size=2) as wn:
+            # identical requests running at the same time share a single query
+            results = await asyncio.gather(*[wn.get_synsets('замок') for _ in range(10)])
+            assert all(result == results[0] and result is not results[0] for result in results[1:])
+            synset = await wn['134045-N']
+            assert repr(synset) == 'Synset(id="134045-N", title="ПОТЕНЦИАЛ (ФИЗИЧЕСКАЯ ВЕЛИЧИНА)")'
+            asparagus = (await wn.get_senses('спаржа'))[0].synset
+            assert len(await wn.get_related(asparagus, 'hypernyms')) == 3
+            assert set(await wn.get_synsets_many(['замок', 'потенциал'])) == {'замок', 'потенциал'}
+            with pytest.raises(KeyError):
+                await wn['no such word']
+    asyncio.run(run())
+
+
+def test_async_close(tmp_path):
+    filename = str(tmp_path / 'ruwordnet.db')
+    load_from_xml(root=write_xml_fixture(tmp_path / 'xml'), parts='NV', file_name=filename)
+
+    async def run():
+        wn = AsyncRuWordNet(filename, pool_size=2)
+        await asyncio.gather(*[wn.get_senses(lemma) for lemma in ['овощи', 'спаржа', 'зеленеть']])
+        # the callers of a shared query get separate copies of its result
+        first, second = await asyncio.gather(wn.get_senses_many(['спаржа']), wn.get_senses_many(['спаржа']))
+        first['спаржа'].clear()
+        assert [sense.id for sense in second['спаржа']] == ['2-N-2']
+        connections = [connection for _, connection in wn.wordnet._connections]
+        assert connections
+        # the event loop keeps running while the threads are stopped
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+        ticker = asyncio.ensure_future(tick())
+        await wn.aclose()
+        ticker.cancel()
+        assert ticks > 0
+        return connections
+    for connection in asyncio.run(run()):
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')